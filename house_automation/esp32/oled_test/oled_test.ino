@@ -2,6 +2,7 @@
  * ONO Display - ESP32 + 0.91" Blue OLED
  * ESP-NOW only. Pi sends price (0x70), text (0x60), rainbow (0x50), color (0x51).
  * Pi health: no packet from Pi (via Master) for NO_DATA_MS -> show "PI down" + rainbow.
+ * On boot: sends a hello (03 01) to the master so the Pi pushes the price at once.
  * Wiring: Display VCC/GND/SCK->22 SDA->21. RGB common anode R->27 G->14 B->12.
  */
 
@@ -25,9 +26,10 @@
 #define CHANGE_DISPLAY_MS  1000
 #define RGB_DIM_LEVEL      20
 #define RGB_RAINBOW_LEVEL  25
-#define NO_DATA_MS        90000   // No packet from Pi this long -> PI down
+#define NO_DATA_MS        420000  // No packet from Pi this long -> PI down (Pi refreshes price every 150 s)
 #define MAX_TEXT_LEN      81
 #define SCROLL_SPEED_MS   120
+#define HELLO_RETRY_MS    30000   // Re-send hello until the first price arrives
 
 Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, OLED_RESET);
 
@@ -90,6 +92,17 @@ void OnEspNowRecv(const esp_now_recv_info_t* info, const uint8_t* data, int len)
   }
 }
 
+// Master gateway MAC (same as hydration slave Config.h). Hello tells the Pi we (re)booted,
+// so it pushes the price right away instead of us waiting for the next change.
+uint8_t masterMAC[] = {0xF0, 0x24, 0xF9, 0x0D, 0x90, 0xA4};
+unsigned long lastHelloAt = 0;
+
+void sendHello() {
+  uint8_t pkt[6] = {3, 0x01, 0, 0, 0, 0};   // Type 3, Cmd 0x01 (hello), float 0
+  esp_now_send(masterMAC, pkt, sizeof(pkt));
+  lastHelloAt = millis();
+}
+
 void setup() {
   Serial.begin(115200);
   delay(500);
@@ -116,7 +129,15 @@ void setup() {
     Serial.println("ESP-NOW init failed");
   } else {
     esp_now_register_recv_cb(OnEspNowRecv);
+    esp_now_peer_info_t peerInfo = {};
+    memcpy(peerInfo.peer_addr, masterMAC, 6);
+    peerInfo.channel = 0;
+    peerInfo.encrypt = false;
+    if (esp_now_add_peer(&peerInfo) != ESP_OK) {
+      Serial.println("Failed to add master peer");
+    }
     Serial.println("ESP-NOW ready");
+    sendHello();
   }
   Serial.print("MAC: ");
   Serial.println(WiFi.macAddress());
@@ -245,6 +266,10 @@ void showPiText(const char* txt) {
 }
 
 void loop() {
+  if (!dataValid && millis() - lastHelloAt >= HELLO_RETRY_MS) {
+    sendHello();
+  }
+
   if (overrideUntil > millis()) {
     if (overrideTextMode) {
       rgbOff();
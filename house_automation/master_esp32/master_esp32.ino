@@ -4,6 +4,30 @@
 // Global buffer for serial input
 String inputBuffer = "";
 
+// Advertised to the Pi on boot and on "CAPS?":
+//   TXM = one "TXM:<MAC>,<MAC>,...:<HEX>" line fans out to several peers
+//   DLV = per-peer delivery lines "OK:Delivered:<MAC>" / "ERR:Delivery:<MAC>"
+//   BIN = binary frames accepted; "BIN:1" switches RX/delivery output to frames
+#define MASTER_CAPS "CAPS:TXM,DLV,BIN"
+
+// Binary framing (pi_controller/serial_framing.py):
+//   0x00 | len (2 bytes LE) | kind | body | crc16 (2 bytes BE)
+//   len counts kind + body + crc; CRC-16/CCITT-FALSE over len + kind + body
+//   (big endian, so the CRC over everything after the marker comes out 0).
+// Text lines keep working alongside; a 0x00 byte is never part of a text line.
+#define FRAME_TX 0x01              // Pi -> master: MAC[6] + payload
+#define FRAME_TXM 0x02             // Pi -> master: n + MAC[6]*n + payload
+#define FRAME_RX 0x81              // master -> Pi: MAC[6] + payload
+#define FRAME_DELIVERED 0x82       // master -> Pi: MAC[6]
+#define FRAME_DELIVERY_FAILED 0x83 // master -> Pi: MAC[6]
+#define FRAME_MAX 512
+
+volatile bool binaryOut = false; // set by "BIN:1" from the Pi, cleared on boot / "BIN:0"
+uint8_t frameBuf[2 + FRAME_MAX]; // length field + frame
+int frameLen = 0;                // bytes collected after the 0x00 marker
+int frameNeed = 0;               // total expected once the length is known
+bool inFrame = false;
+
 // Function to convert MAC address array to String
 String macToString(const uint8_t *macAddr) {
   char macStr[18];
@@ -41,9 +65,43 @@ void hexToBytes(String hex, uint8_t *bytes, int maxLen) {
   }
 }
 
+uint16_t crc16(const uint8_t *data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int b = 0; b < 8; b++)
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+  }
+  return crc;
+}
+
+// One frame to the Pi in a single Serial.write so callbacks cannot split it.
+void sendFrame(uint8_t kind, const uint8_t *mac, const uint8_t *payload, int len) {
+  uint8_t out[1 + 2 + 1 + 6 + 250 + 2];
+  if (len > 250)
+    len = 250;
+  uint16_t size = 1 + 6 + len + 2;
+  out[0] = 0;
+  out[1] = size & 0xFF;
+  out[2] = size >> 8;
+  out[3] = kind;
+  memcpy(out + 4, mac, 6);
+  if (len > 0)
+    memcpy(out + 10, payload, len);
+  size_t n = 10 + len;
+  uint16_t crc = crc16(out + 1, n - 1);
+  out[n++] = crc >> 8;
+  out[n++] = crc & 0xFF;
+  Serial.write(out, n);
+}
+
 // Callback when data is received via ESP-NOW (ESP32 Core v3.0 compatible)
 void OnDataRecv(const esp_now_recv_info_t *info, const uint8_t *incomingData,
                 int len) {
+  if (binaryOut) {
+    sendFrame(FRAME_RX, info->src_addr, incomingData, len);
+    return;
+  }
   // Format: "RX:<MAC>:<HEX_DATA>"
   String macStr = macToString(info->src_addr);
 
@@ -60,13 +118,30 @@ void OnDataRecv(const esp_now_recv_info_t *info, const uint8_t *incomingData,
   Serial.println();
 }
 
-// Callback when data is sent
+// Callback when data is sent: report MAC-level delivery (ACK) per peer
 void OnDataSent(const wifi_tx_info_t *info, esp_now_send_status_t status) {
+  if (binaryOut) {
+    sendFrame(status == ESP_NOW_SEND_SUCCESS ? FRAME_DELIVERED : FRAME_DELIVERY_FAILED,
+              info->des_addr, NULL, 0);
+    return;
+  }
+  String macStr = macToString(info->des_addr);
   if (status == ESP_NOW_SEND_SUCCESS) {
-    Serial.println("OK:Sent");
+    Serial.print("OK:Delivered:");
   } else {
-    Serial.println("ERR:Send Failed");
+    Serial.print("ERR:Delivery:");
   }
+  Serial.println(macStr);
+}
+
+bool ensurePeer(const uint8_t *peerAddr) {
+  if (esp_now_is_peer_exist(peerAddr))
+    return true;
+  esp_now_peer_info_t peerInfo = {};
+  memcpy(peerInfo.peer_addr, peerAddr, 6);
+  peerInfo.channel = 0;
+  peerInfo.encrypt = false;
+  return esp_now_add_peer(&peerInfo) == ESP_OK;
 }
 
 void setup() {
@@ -85,6 +160,7 @@ void setup() {
   esp_now_register_send_cb(OnDataSent);
 
   Serial.println("Master Gateway Started (Transparent Mode)");
+  Serial.println(MASTER_CAPS);
 }
 
 void loop() {
@@ -96,9 +172,34 @@ void loop() {
   }
 
   // Listen for data from Pi
-  // Format expected: "TX:<TARGET_MAC>:<DATA>\n"
+  // Format expected: "TX:<TARGET_MAC>:<DATA>\n" or a binary frame (0x00 + length + ...)
   while (Serial.available()) {
-    char c = Serial.read();
+    uint8_t b = Serial.read();
+    if (inFrame) {
+      frameBuf[frameLen++] = b;
+      if (frameLen == 2) {
+        int size = frameBuf[0] | (frameBuf[1] << 8);
+        if (size < 3 || size > FRAME_MAX) {
+          Serial.println("ERR:Format");
+          inFrame = false; // bad length: back to text, the next 0x00 starts a frame
+          continue;
+        }
+        frameNeed = 2 + size;
+      }
+      if (frameLen >= 2 && frameLen == frameNeed) {
+        processBinaryFrame(frameBuf, frameLen);
+        inFrame = false;
+      }
+      continue;
+    }
+    if (b == 0) {
+      inFrame = true;
+      frameLen = 0;
+      frameNeed = 0;
+      inputBuffer = "";
+      continue;
+    }
+    char c = (char)b;
     if (c == '\n') {
       processSerialCommand(inputBuffer);
       inputBuffer = "";
@@ -110,6 +211,19 @@ void loop() {
 
 void processSerialCommand(String cmd) {
   cmd.trim();
+  if (cmd == "CAPS?") {
+    Serial.println(MASTER_CAPS);
+    return;
+  }
+  if (cmd == "BIN:1" || cmd == "BIN:0") {
+    binaryOut = (cmd == "BIN:1");
+    Serial.println(binaryOut ? "OK:BIN" : "OK:TEXT");
+    return;
+  }
+  if (cmd.startsWith("TXM:")) {
+    processMulticastCommand(cmd);
+    return;
+  }
   if (!cmd.startsWith("TX:"))
     return;
 
@@ -128,15 +242,9 @@ void processSerialCommand(String cmd) {
   uint8_t peerAddr[6];
   stringToMac(macStr, peerAddr);
 
-  if (!esp_now_is_peer_exist(peerAddr)) {
-    esp_now_peer_info_t peerInfo = {};
-    memcpy(peerInfo.peer_addr, peerAddr, 6);
-    peerInfo.channel = 0;
-    peerInfo.encrypt = false;
-    if (esp_now_add_peer(&peerInfo) != ESP_OK) {
-      Serial.println("ERR:PeerAdd");
-      return;
-    }
+  if (!ensurePeer(peerAddr)) {
+    Serial.println("ERR:PeerAdd");
+    return;
   }
 
   // Convert Hex string back to bytes
@@ -152,3 +260,87 @@ void processSerialCommand(String cmd) {
     Serial.println("ERR:Send Failed");
   }
 }
+
+// Format: TXM:<MAC>,<MAC>,...:<HEX_DATA>
+// Same payload to every listed peer, sent back-to-back from here so all of them
+// update at (nearly) the same moment. Delivery is reported per peer by OnDataSent.
+void processMulticastCommand(String cmd) {
+  int firstColon = cmd.indexOf(':');
+  int lastColon = cmd.lastIndexOf(':');
+  if (lastColon <= firstColon) {
+    Serial.println("ERR:Format");
+    return;
+  }
+
+  String macList = cmd.substring(firstColon + 1, lastColon);
+  String hexPayload = cmd.substring(lastColon + 1);
+  int payloadLen = hexPayload.length() / 2;
+  uint8_t buffer[payloadLen];
+  hexToBytes(hexPayload, buffer, payloadLen);
+
+  int total = 0, sent = 0;
+  int start = 0;
+  while (start < (int)macList.length()) {
+    int comma = macList.indexOf(',', start);
+    if (comma < 0)
+      comma = macList.length();
+    String macStr = macList.substring(start, comma);
+    start = comma + 1;
+
+    uint8_t peerAddr[6];
+    stringToMac(macStr, peerAddr);
+    total++;
+    if (!ensurePeer(peerAddr)) {
+      Serial.print("ERR:PeerAdd:");
+      Serial.println(macStr);
+      continue;
+    }
+    if (esp_now_send(peerAddr, buffer, payloadLen) == ESP_OK)
+      sent++;
+  }
+  Serial.printf("OK:SentM:%d/%d\n", sent, total);
+}
+
+// Binary frame from the Pi: length field .. CRC (the 0x00 marker already consumed).
+// Success is not echoed (delivery frames follow from OnDataSent); errors stay text.
+void processBinaryFrame(const uint8_t *frame, int len) {
+  if (crc16(frame, len) != 0) {
+    Serial.println("ERR:CRC");
+    return;
+  }
+  const uint8_t *raw = frame + 2; // kind + body
+  size_t n = len - 2 - 2;
+  if (raw[0] == FRAME_TX && n >= 7) {
+    const uint8_t *peerAddr = raw + 1;
+    if (!ensurePeer(peerAddr)) {
+      Serial.println("ERR:PeerAdd");
+      return;
+    }
+    if (esp_now_send(peerAddr, raw + 7, n - 7) != ESP_OK)
+      Serial.println("ERR:Send Failed");
+    return;
+  }
+  if (raw[0] == FRAME_TXM && n >= 2) {
+    int total = raw[1];
+    size_t payloadAt = 2 + 6 * total;
+    if (payloadAt > n) {
+      Serial.println("ERR:Format");
+      return;
+    }
+    int sent = 0;
+    for (int i = 0; i < total; i++) {
+      const uint8_t *peerAddr = raw + 2 + 6 * i;
+      if (!ensurePeer(peerAddr)) {
+        Serial.print("ERR:PeerAdd:");
+        Serial.println(macToString(peerAddr));
+        continue;
+      }
+      if (esp_now_send(peerAddr, raw + payloadAt, n - payloadAt) == ESP_OK)
+        sent++;
+    }
+    if (sent < total)
+      Serial.printf("ERR:SentM:%d/%d\n", sent, total);
+    return;
+  }
+  Serial.println("ERR:Format");
+}
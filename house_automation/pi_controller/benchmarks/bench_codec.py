@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark + round-trip check for codec.py.
+
+First verifies every encoder: decode(encode(x)) gives x back, and the bytes
+are identical to the hex strings the handlers used to build by hand (so the
+slaves see the same frames). Exits non-zero on any mismatch.
+
+Then times encode / decode per message type against the old path
+("0213" + struct.pack(...).hex(), then bytes.fromhex in send_command; RX
+decode via bytes.fromhex + struct.unpack).
+
+Usage (from house_automation/pi_controller):
+    python3 benchmarks/bench_codec.py
+    python3 benchmarks/bench_codec.py --n 500000 --json
+"""
+import argparse
+import json
+import math
+import os
+import struct
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import codec  # noqa: E402
+
+
+# --- Legacy hand-built payloads (as they were in the handlers / web_server) ---
+
+def legacy_led_on():
+    return "02100000803F"
+
+
+def legacy_led_rgb(code):
+    return "0212" + struct.pack('<f', code).hex()
+
+
+def legacy_led_mode(mode, speed):
+    return "0213" + struct.pack('<I', (mode << 8) | speed).hex()
+
+
+def legacy_ir_nec(hex_code):
+    return "0331" + struct.pack('<I', int(hex_code, 16)).hex()
+
+
+def legacy_hydration_time(epoch):
+    return "0131" + struct.pack('<I', epoch).hex()
+
+
+def legacy_hydration_presence(is_home):
+    return "0141" + ("0000803F" if is_home else "00000000")
+
+
+def legacy_display_color(r, g, b, d):
+    return "03" + "51" + f"{r:02x}{g:02x}{b:02x}" + struct.pack('<f', float(d)).hex()
+
+
+def legacy_display_text(text, d):
+    raw = text.encode('utf-8')[:80]
+    return "03" + "60" + struct.pack('<f', float(d)).hex() + f"{len(raw):02x}" + raw.hex()
+
+
+def legacy_display_price(p, c):
+    return "03" + "70" + struct.pack('<f', p).hex() + struct.pack('<f', c).hex()
+
+
+def _close(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-6)
+    return a == b
+
+
+def round_trip_checks():
+    """List of failure messages (empty = all good)."""
+    cases = [
+        # (name, encoded, legacy hex or None, expected (type, cmd, fields))
+        ("led_on", codec.LED_ON, legacy_led_on(), (2, 0x10, (1.0,))),
+        ("led_off", codec.LED_OFF, "021000000000", (2, 0x10, (0.0,))),
+        ("led_rgb", codec.led_rgb(7), legacy_led_rgb(7), (2, 0x12, (7.0,))),
+        ("led_mode", codec.led_mode(37, 100), legacy_led_mode(37, 100), (2, 0x13, ((37 << 8) | 100,))),
+        ("ir_nec", codec.ir_nec("F7C03F"), legacy_ir_nec("F7C03F"), (3, 0x31, (0xF7C03F,))),
+        ("ir_nec_int", codec.ir_nec(0xF7A05F), legacy_ir_nec("F7A05F"), (3, 0x31, (0xF7A05F,))),
+        ("hyd_time", codec.hydration_time(1_760_000_000), legacy_hydration_time(1_760_000_000),
+         (1, 0x31, (1_760_000_000,))),
+        ("hyd_home", codec.hydration_presence(True), legacy_hydration_presence(True), (1, 0x41, (1.0,))),
+        ("hyd_away", codec.hydration_presence(False), legacy_hydration_presence(False), (1, 0x41, (0.0,))),
+        ("hyd_tare", codec.HYD_TARE_MSG, "012200000000", (1, 0x22, (0.0,))),
+        ("hyd_weight", codec.HYD_GET_WEIGHT_MSG, "012000000000", (1, 0x20, (0.0,))),
+        ("hyd_generic", codec.hydration(0x12, 3), "0112" + struct.pack('<f', 3).hex(), (1, 0x12, (3.0,))),
+        ("rainbow", codec.display_rainbow(10), "0350" + struct.pack('<f', 10.0).hex(), (3, 0x50, (10.0,))),
+        ("color", codec.display_color(255, 16, 0, 10), legacy_display_color(255, 16, 0, 10),
+         (3, 0x51, (255, 16, 0, 10.0))),
+        ("color_clamped", codec.display_color(300, -5, 12, 1), legacy_display_color(255, 0, 12, 1),
+         (3, 0x51, (255, 0, 12, 1.0))),
+        ("text", codec.display_text("250 ml", 3), legacy_display_text("250 ml", 3), (3, 0x60, (3.0, "250 ml"))),
+        ("text_utf8", codec.display_text("Grüße", 5), legacy_display_text("Grüße", 5), (3, 0x60, (5.0, "Grüße"))),
+        ("text_long", codec.display_text("x" * 120, 5), legacy_display_text("x" * 120, 5),
+         (3, 0x60, (5.0, "x" * 80))),
+        ("price", codec.display_price(0.0123, -2.5), legacy_display_price(0.0123, -2.5),
+         (3, 0x70, (0.0123, -2.5))),
+    ]
+    failures = []
+    for name, encoded, legacy_hex, expected in cases:
+        if not isinstance(encoded, bytes):
+            failures.append(f"{name}: encoder returned {type(encoded).__name__}, not bytes")
+            continue
+        if legacy_hex is not None and encoded != bytes.fromhex(legacy_hex):
+            failures.append(f"{name}: {encoded.hex()} != legacy {legacy_hex.lower()}")
+        ctype, cmd, fields = codec.decode(encoded)
+        et, ec, ef = expected
+        if (ctype, cmd) != (et, ec) or len(fields) != len(ef) or not all(map(_close, fields, ef)):
+            failures.append(f"{name}: decode -> {(ctype, cmd, fields)}, expected {expected}")
+    # Slave reports (6-byte <BBf) through the RX decoder.
+    for ctype, cmd, val in [(1, 0x21, 512.5), (1, 0x30, 0.0), (3, 0x01, 0.0), (2, 0x10, 1.0)]:
+        got = codec.decode_report(codec.encode_float(ctype, cmd, val))
+        if got[:2] != (ctype, cmd) or not _close(got[2], val):
+            failures.append(f"report {ctype}/{cmd:#x}: {got}")
+    return failures
+
+
+def _rate(stmt, n):
+    sec = min(timeit.repeat(stmt, number=n, repeat=3))
+    return n / sec
+
+
+def throughput(n):
+    rx_hex = codec.encode_float(1, 0x21, 512.5).hex()
+    rx_bytes = bytes.fromhex(rx_hex)
+    price = codec.display_price(0.0123, -2.5)
+    rows = [
+        # (message, legacy encode incl. send_command's bytes.fromhex, codec encode)
+        ("led_mode",
+         lambda: bytes.fromhex(legacy_led_mode(37, 5)),
+         lambda: codec.led_mode(37, 5)),
+        ("ir_nec",
+         lambda: bytes.fromhex(legacy_ir_nec("F7C03F")),
+         lambda: codec.ir_nec(0xF7C03F)),
+        ("display_color",
+         lambda: bytes.fromhex(legacy_display_color(255, 16, 0, 10)),
+         lambda: codec.display_color(255, 16, 0, 10)),
+        ("display_text",
+         lambda: bytes.fromhex(legacy_display_text("250 ml", 3)),
+         lambda: codec.display_text("250 ml", 3)),
+        ("display_price",
+         lambda: bytes.fromhex(legacy_display_price(0.0123, -2.5)),
+         lambda: codec.display_price(0.0123, -2.5)),
+    ]
+    out = {"encode": {}, "decode": {}}
+    for name, legacy, new in rows:
+        old_rate, new_rate = _rate(legacy, n), _rate(new, n)
+        out["encode"][name] = {
+            "legacy_ops_per_sec": round(old_rate),
+            "codec_ops_per_sec": round(new_rate),
+            "speedup": round(new_rate / old_rate, 2),
+        }
+    old_rate = _rate(lambda: struct.unpack('<BBf', bytes.fromhex(rx_hex)), n)
+    new_rate = _rate(lambda: codec.decode_report(rx_bytes), n)
+    out["decode"]["report"] = {
+        "legacy_ops_per_sec": round(old_rate),
+        "codec_ops_per_sec": round(new_rate),
+        "speedup": round(new_rate / old_rate, 2),
+    }
+    out["decode"]["display_price"] = {"codec_ops_per_sec": round(_rate(lambda: codec.decode(price), n))}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=200000, help="operations per timing run")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    failures = round_trip_checks()
+    if failures:
+        for f in failures:
+            print("FAIL", f)
+        return 1
+    results = throughput(args.n)
+    if args.json:
+        print(json.dumps(dict(results, round_trip="ok"), indent=2))
+        return 0
+    print("round-trip + legacy wire format: ok")
+    for kind in ("encode", "decode"):
+        for name, r in results[kind].items():
+            legacy = r.get("legacy_ops_per_sec")
+            extra = f" legacy={legacy:>10,}/s  x{r['speedup']}" if legacy else ""
+            print(f"{kind:6s} {name:14s} codec={r['codec_ops_per_sec']:>10,}/s{extra}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ONO price frames sent to the displays over a simulated day,
+change-driven pushes vs. the old fixed 15 s re-push.
+
+Replays a random-walk price (one CoinGecko fetch per minute) through
+OledHandler.update_price with a fake controller, injects a few display
+reboots (hello packets) and counts ESP-NOW frames.
+
+Usage (from house_automation/pi_controller):
+    python3 benchmarks/bench_ono_price_push.py
+    python3 benchmarks/bench_ono_price_push.py --hours 24 --volatility 0.3 --reboots 3
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import config  # noqa: E402
+from handlers.ono import OledHandler, LEGACY_PUSH_INTERVAL_SEC  # noqa: E402
+
+FETCH_SEC = 60
+
+
+class FakeController:
+    def __init__(self):
+        self.frames = 0
+        self.shadow = None
+
+    def send_command(self, mac, hex_data, force=False, frames=1):
+        # Group sends return the number of members written, like SerialController.send_group.
+        n = len(config.DEVICE_GROUPS[mac]) if mac in config.DEVICE_GROUPS else 1
+        self.frames += n
+        return n
+
+
+def simulate(hours, volatility_pct, reboots, seed):
+    rng = random.Random(seed)
+    ctrl = FakeController()
+    ono = OledHandler(ctrl)
+    macs = ono._display_macs()
+    t0 = 1_700_000_000.0
+    end = t0 + hours * 3600
+    reboot_at = sorted(rng.uniform(t0, end) for _ in range(reboots))
+    price, change = 0.02, 0.0
+    t = t0
+    while t < end:
+        # Per-minute random walk; the 24h change drifts with it.
+        step = rng.gauss(0, volatility_pct / 100.0)
+        price *= 1 + step
+        change += step * 100 + rng.gauss(0, 0.02)
+        ono.update_price(price, change, now=t)
+        while reboot_at and reboot_at[0] <= t:
+            reboot_at.pop(0)
+            ono.handle_packet(0x01, 0.0, rng.choice(macs))
+        t += FETCH_SEC
+    legacy = int(hours * 3600 // LEGACY_PUSH_INTERVAL_SEC) * len(macs)
+    return ctrl.frames, legacy, ono.price_push_stats(now=end)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--hours", type=float, default=24)
+    ap.add_argument("--volatility", type=float, default=0.2, help="per-minute price std dev (%%)")
+    ap.add_argument("--reboots", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    frames, legacy, stats = simulate(args.hours, args.volatility, args.reboots, args.seed)
+    print(f"simulated {args.hours:g} h, pushes by reason: {stats['pushes']}")
+    print(f"frames sent: change-driven={frames}  fixed 15 s re-push={legacy}  "
+          f"saved={legacy - frames} ({100.0 * (legacy - frames) / legacy:.1f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
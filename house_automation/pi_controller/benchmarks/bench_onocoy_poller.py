@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Onocoy poll cycle time, sequential vs bounded-concurrent, against a
+local mock API (no network needed).
+
+Usage (from house_automation/pi_controller):
+    python3 benchmarks/bench_onocoy_poller.py
+    python3 benchmarks/bench_onocoy_poller.py --stations 300 --latency 0.05 --slow-every 20 --workers 1 8 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from onocoy_station_store import OnocoyStationStore  # noqa: E402
+from onocoy_poller import OnocoyPoller  # noqa: E402
+from mock_onocoy_server import MockOnocoyServer  # noqa: E402
+
+
+def make_store(tmpdir, n):
+    store = OnocoyStationStore(
+        stations_path=os.path.join(tmpdir, "stations.json"),
+        settings_path=os.path.join(tmpdir, "settings.json"),
+    )
+    for i in range(n):
+        store.add_station(f"station-{i:04d}", nickname=f"S{i}")
+    return store
+
+
+def run(stations, latency, slow_every, slow_latency, workers_list, jitter):
+    server = MockOnocoyServer(latency_sec=latency, slow_every=slow_every, slow_latency_sec=slow_latency).start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = make_store(tmpdir, stations)
+            for workers in workers_list:
+                poller = OnocoyPoller(
+                    store,
+                    url_tmpl=server.url_tmpl,
+                    max_workers=workers,
+                    jitter_sec=jitter if workers > 1 else 0.0,
+                    # Generous deadline so the sequential baseline finishes and is measurable.
+                    cycle_deadline_sec=3600,
+                )
+                stats = poller.poll_cycle()
+                results.append((workers, stats))
+                print(
+                    f"workers={workers:3d} stations={stats['stations']} ok={stats['ok']} "
+                    f"errors={stats['errors']} late={stats['late']} cycle={stats['duration_sec']:.2f}s"
+                )
+    finally:
+        server.stop()
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stations", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.05, help="normal station latency (s)")
+    ap.add_argument("--slow-every", type=int, default=20, help="every Nth station is slow (0 = none)")
+    ap.add_argument("--slow-latency", type=float, default=1.0)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 8, 16])
+    ap.add_argument("--jitter", type=float, default=0.5)
+    args = ap.parse_args()
+    run(args.stations, args.latency, args.slow_every, args.slow_latency, args.workers, args.jitter)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
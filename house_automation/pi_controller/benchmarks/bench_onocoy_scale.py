@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Onocoy poller + station store at growing station counts, against
+the local mock API (benchmarks/mock_onocoy_server.py, run as a subprocess so
+its CPU does not count against the poller).
+
+For each station count the service is started the way web_server does it
+(`start_onocoy_poller` when Flask/pyserial are importable, otherwise the same
+store + flusher + poller wiring with the same config values), left running
+for `--duration` seconds and measured:
+
+- first cycle: time until every station has been checked once
+- CPU: process CPU time / wall time while running (100% = one core)
+- memory: RSS growth over the run
+- staleness: age of each station's last check (p50 / p95 / max, sampled
+  every second) and the share of stations whose cached status disagrees
+  with the mock's ground truth at the end
+- detection latency: poller's own p50 / p95 (needs --flip-mean)
+
+Usage (from house_automation/pi_controller):
+    python3 benchmarks/bench_onocoy_scale.py
+    python3 benchmarks/bench_onocoy_scale.py --sizes 100 1000 3000 --duration 30 --interval 10 \\
+        --latency 0.05 --error-rate 0.02 --flip-mean 120 --workers 16
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..")))
+
+import config  # noqa: E402
+from onocoy_station_store import OnocoyStationStore  # noqa: E402
+from onocoy_poller import OnocoyPoller, info_url_tmpl, _percentile  # noqa: E402
+
+
+def start_mock(args):
+    cmd = [
+        sys.executable, os.path.join(HERE, "mock_onocoy_server.py"),
+        "--port", "0",
+        "--latency", str(args.latency),
+        "--latency-jitter", str(args.latency_jitter),
+        "--error-rate", str(args.error_rate),
+        "--not-found-every", str(args.not_found_every),
+        "--flip-mean", str(args.flip_mean),
+        "--seed", "1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()   # "Mock Onocoy API on http://127.0.0.1:NNNN (...)"
+    base_url = line.split(" on ", 1)[1].split()[0]
+    return proc, base_url
+
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def start_service(tmpdir, base_url, workers):
+    """Start store + poller like web_server.start_onocoy_poller; returns (store, poller, wakeup_event)."""
+    config.ONOCOY_API_BASE_URL = base_url
+    config.ONOCOY_POLL_CONCURRENCY = workers
+    try:
+        import web_server
+    except ImportError:
+        web_server = None
+    if web_server is not None:
+        web_server.onocoy_store = None
+        poller = web_server.start_onocoy_poller(data_dir=tmpdir)
+        return web_server.onocoy_store, poller, web_server.onocoy_poll_wakeup_event
+
+    import threading
+    wakeup = threading.Event()
+    store = OnocoyStationStore(
+        stations_path=os.path.join(tmpdir, "onocoy_stations.json"),
+        settings_path=os.path.join(tmpdir, "onocoy_settings.json"),
+        min_poll_interval_sec=5,
+        default_poll_interval_sec=60,
+    )
+    store.start_flusher(config.ONOCOY_MIN_FLUSH_INTERVAL_SEC)
+    poller = OnocoyPoller(
+        store,
+        url_tmpl=info_url_tmpl(config.ONOCOY_API_BASE_URL),
+        max_workers=config.ONOCOY_POLL_CONCURRENCY,
+        connect_timeout_sec=config.ONOCOY_CONNECT_TIMEOUT_SEC,
+        read_timeout_sec=config.ONOCOY_READ_TIMEOUT_SEC,
+        jitter_sec=config.ONOCOY_POLL_JITTER_SEC,
+        wakeup_event=wakeup,
+    )
+    poller.start()
+    return store, poller, wakeup
+
+
+def _age_sec(iso, now):
+    if not iso:
+        return None
+    return now - datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp()
+
+
+def run_size(n, base_url, args):
+    tmpdir = tempfile.mkdtemp(prefix=f"onocoy_scale_{n}_")
+    rss0 = rss_kb()
+    cpu0, wall0 = time.process_time(), time.monotonic()
+    store, poller, wakeup = start_service(tmpdir, base_url, args.workers)
+    store.set_polling_interval(args.interval)
+    for i in range(n):
+        store.add_station(f"station-{i:05d}", nickname=f"S{i}")
+    wakeup.set()
+
+    first_cycle = None
+    ages = []
+    deadline = wall0 + args.duration
+    while time.monotonic() < deadline:
+        time.sleep(1.0)
+        now = time.time()
+        snap = store.get_snapshot()
+        sample = [_age_sec(s.get("last_checked"), now) for s in snap.values()]
+        if first_cycle is None and all(a is not None for a in sample):
+            first_cycle = time.monotonic() - wall0
+        if first_cycle is not None:
+            ages.extend(a for a in sample if a is not None)
+    cpu = time.process_time() - cpu0
+    wall = time.monotonic() - wall0
+
+    with urllib.request.urlopen(base_url + "/_mock/truth", timeout=10) as r:
+        truth = json.loads(r.read())
+    snap = store.get_snapshot()
+    compared = [sid for sid in snap if sid in truth]
+    wrong = sum(1 for sid in compared if (snap[sid].get("status") == "Online") != truth[sid][0])
+
+    pstats = poller.stats()
+    poller.stop()
+    store.flush(force=True)
+    rss1 = rss_kb()
+    ages.sort()
+    return {
+        "stations": n,
+        "first_cycle_sec": round(first_cycle, 1) if first_cycle is not None else None,
+        "cpu_pct": round(100.0 * cpu / wall, 1),
+        "rss_delta_mb": round((rss1 - rss0) / 1024.0, 1),
+        "requests": pstats["requests"],
+        "staleness_sec": {
+            "p50": round(_percentile(ages, 50), 1) if ages else None,
+            "p95": round(_percentile(ages, 95), 1) if ages else None,
+            "max": round(ages[-1], 1) if ages else None,
+        },
+        "wrong_status_pct": round(100.0 * wrong / len(compared), 2) if compared else None,
+        "detection_latency_sec": pstats["detection_latency_sec"],
+        "store_writes": store.write_stats(),
+        "_tmpdir": tmpdir,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 3000])
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds to run each size")
+    ap.add_argument("--interval", type=int, default=10, help="global poll interval (s)")
+    ap.add_argument("--workers", type=int, default=config.ONOCOY_POLL_CONCURRENCY)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--latency-jitter", type=float, default=0.02)
+    ap.add_argument("--error-rate", type=float, default=0.01)
+    ap.add_argument("--not-found-every", type=int, default=0)
+    ap.add_argument("--flip-mean", type=float, default=300.0, help="mean seconds between status flips per station")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    proc, base_url = start_mock(args)
+    results = []
+    try:
+        for n in args.sizes:
+            res = run_size(n, base_url, args)
+            shutil.rmtree(res.pop("_tmpdir"), ignore_errors=True)
+            results.append(res)
+            if not args.json:
+                st = res["staleness_sec"]
+                det = res["detection_latency_sec"]
+                print(
+                    f"stations={n:5d} first_cycle={res['first_cycle_sec']}s cpu={res['cpu_pct']}% "
+                    f"rss+={res['rss_delta_mb']}MB requests={res['requests']} "
+                    f"staleness p50/p95/max={st['p50']}/{st['p95']}/{st['max']}s "
+                    f"wrong={res['wrong_status_pct']}% detect p50/p95={det['p50']}/{det['p95']}s",
+                    flush=True,
+                )
+    finally:
+        proc.terminate()
+        proc.wait(timeout=5)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
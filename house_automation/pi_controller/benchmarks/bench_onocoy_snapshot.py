@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: OnocoyStationStore.get_snapshot cost at 10 / 100 / 1000 stations.
+
+Compares the old JSON round-trip deep copy with the copy-on-write snapshot,
+both for repeated reads with no changes (the /api/onocoy/status case) and
+for a read right after one station was updated (the poller case).
+
+Usage (from house_automation/pi_controller):
+    python3 benchmarks/bench_onocoy_snapshot.py
+    python3 benchmarks/bench_onocoy_snapshot.py --sizes 10 100 1000 5000 --reads 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from onocoy_station_store import OnocoyStationStore  # noqa: E402
+
+INFO = {"status": {"is_up": True, "since": "2026-01-01T00:00:00+00:00"}}
+
+
+def make_store(tmpdir, n):
+    store = OnocoyStationStore(
+        stations_path=os.path.join(tmpdir, f"stations_{n}.json"),
+        settings_path=os.path.join(tmpdir, f"settings_{n}.json"),
+    )
+    for i in range(n):
+        store.add_station(f"station-{i:05d}", nickname=f"Station {i}")
+        store.update_station_from_onocoy_info(f"station-{i:05d}", INFO)
+    return store
+
+
+def per_call_us(fn, reads):
+    t0 = time.perf_counter()
+    for _ in range(reads):
+        fn()
+    return (time.perf_counter() - t0) / reads * 1e6
+
+
+def bench(sizes, reads):
+    rows = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in sizes:
+            store = make_store(tmpdir, n)
+
+            def json_roundtrip():
+                with store._lock:
+                    return json.loads(json.dumps(store.stations))
+
+            store.get_snapshot()
+            unchanged = per_call_us(store.get_snapshot, reads)
+
+            ids = list(store.stations)
+            counter = [0]
+
+            def update_then_read():
+                sid = ids[counter[0] % len(ids)]
+                counter[0] += 1
+                store.update_station_from_onocoy_info(sid, INFO)
+                return store.get_snapshot()
+
+            def update_only():
+                sid = ids[counter[0] % len(ids)]
+                counter[0] += 1
+                store.update_station_from_onocoy_info(sid, INFO)
+
+            after_update = per_call_us(update_then_read, reads) - per_call_us(update_only, reads)
+            old = per_call_us(json_roundtrip, max(1, reads // 10))
+            rows.append((n, old, unchanged, max(0.0, after_update)))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    ap.add_argument("--reads", type=int, default=1000)
+    args = ap.parse_args()
+    print(f"{'stations':>8} {'json deep copy':>16} {'cow unchanged':>15} {'cow after 1 update':>20}   (us/call)")
+    for n, old, unchanged, after in bench(args.sizes, args.reads):
+        print(f"{n:>8} {old:>16.2f} {unchanged:>15.3f} {after:>20.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Benchmark: text hex lines vs. binary length-prefixed frames on the Pi <-> master UART.
+
+1. Wire size: bytes per TX / RX / delivery message in both framings and what
+   that means at 115200 baud (10 bits per byte).
+2. Parse cost: Pi-side CPU per received slave report, from raw serial bytes to
+   the decoded (type, cmd, value): stream splitting + regex + hex decode for
+   text, stream splitting + length/CRC check + slicing for frames.
+3. Over a pty: the simulated master (benchmarks/master_sim.py) streams
+   `--reports` hydration weight reports, paced at `--baud`, after negotiating
+   text or binary framing. The Pi side is SerialController's reader thread when
+   pyserial is installed, otherwise a reader loop doing the same work on the
+   raw tty. Reports end-to-end report rate and reader-thread CPU per report.
+
+Also round-trips random frames (encode -> split in odd-sized chunks -> parse)
+and checks that a corrupted frame is dropped without losing the lines after it.
+
+Usage (from house_automation/pi_controller):
+    python3 benchmarks/bench_serial_framing.py
+    python3 benchmarks/bench_serial_framing.py --reports 5000 --baud 0 --json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import re
+import select
+import sys
+import threading
+import time
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..")))
+sys.path.insert(0, HERE)
+
+import codec  # noqa: E402
+import serial_framing  # noqa: E402
+from master_sim import MasterSimulator  # noqa: E402
+
+MAC = "F0:24:F9:0C:AB:B0"
+# Same pattern as SerialController.process_incoming_data.
+RX_RE = re.compile(r'RX:([0-9A-Fa-f:]+):([0-9A-Fa-f\s]+)')
+
+
+def round_trip_checks(n=2000, seed=1):
+    rng = random.Random(seed)
+    splitter = serial_framing.StreamSplitter()
+    failures = []
+    stream, expected = bytearray(), []
+    for i in range(n):
+        payload = bytes(rng.choice((0, 0, rng.randrange(256))) for _ in range(rng.randrange(0, 250)))
+        mac = ":".join(f"{rng.randrange(256):02X}" for _ in range(6))
+        stream += serial_framing.encode_rx(mac, payload)
+        expected.append((mac, payload))
+        if i % 7 == 0:
+            stream += b"HEARTBEAT\r\n"
+    got = []
+    for k in range(0, len(stream), 97):     # odd chunk size: frames split across reads
+        for is_frame, item in splitter.feed(bytes(stream[k:k + 97])):
+            if is_frame:
+                _kind, mac, payload = serial_framing.parse_frame(item)
+                got.append((mac, payload))
+            elif item != b"HEARTBEAT":
+                failures.append(f"unexpected line {item[:40]!r}")
+    if got != expected:
+        failures.append(f"{len(got)} frames decoded, {sum(a == b for a, b in zip(got, expected))} match of {n}")
+    # Corrupted payload / corrupted length, followed by a frame or by text: the bad
+    # frame is dropped, what comes after it survives.
+    good = serial_framing.encode_rx(MAC, b"ok")
+    for offset in (8, 1):
+        for tail in (good + b"HEARTBEAT\r\n" * 8, b"HEARTBEAT\r\n" * 8 + good):
+            bad = bytearray(serial_framing.encode_rx(MAC, b"\x01\x21abcd"))
+            bad[offset] ^= 0x40
+            splitter = serial_framing.StreamSplitter()
+            items = splitter.feed(bytes(bad) + tail)
+            frames = [serial_framing.parse_frame(i)[2] for f, i in items if f]
+            if splitter.crc_errors < 1 or frames != [b"ok"] or (False, b"HEARTBEAT") not in items:
+                failures.append(f"corrupted byte {offset}: {items}")
+    return failures
+
+
+def wire_sizes(baud):
+    msgs = {
+        "led_mode (6 B)": codec.led_mode(37, 5),
+        "weight report (6 B)": codec.encode_float(1, 0x21, 512.5),
+        "display_price (10 B)": codec.display_price(0.0123, -2.5),
+        "display_text 20 chars": codec.display_text("Drink: 250 ml today!", 3),
+    }
+    rows = {}
+    for name, payload in msgs.items():
+        text_tx = len(f"TX:{MAC}:{payload.hex().upper()}\n")
+        text_rx = len(f"RX:{MAC}:{payload.hex().upper()}\r\n")
+        bin_tx = len(serial_framing.encode_tx(MAC, payload))
+        bin_rx = len(serial_framing.encode_rx(MAC, payload))
+        rows[name] = {
+            "text_tx": text_tx, "binary_tx": bin_tx,
+            "text_rx": text_rx, "binary_rx": bin_rx,
+            "ratio": round(text_rx / bin_rx, 2),
+        }
+    rows["delivery report"] = {
+        "text_rx": len(f"OK:Delivered:{MAC}\r\n"),
+        "binary_rx": len(serial_framing.encode_frame(serial_framing.FRAME_DELIVERED, serial_framing.mac_bytes(MAC))),
+    }
+    rows["delivery report"]["ratio"] = round(rows["delivery report"]["text_rx"] / rows["delivery report"]["binary_rx"], 2)
+    w = rows["weight report (6 B)"]
+    return {
+        "messages": rows,
+        "max_reports_per_sec": {
+            "text": round(baud / 10.0 / w["text_rx"]),
+            "binary": round(baud / 10.0 / w["binary_rx"]),
+        },
+    }
+
+
+def parse_cost(n):
+    payload = codec.encode_float(1, 0x21, 512.5)
+    text_chunk = f"RX:{MAC}:{payload.hex().upper()}\r\n".encode() * 64
+    bin_chunk = serial_framing.encode_rx(MAC, payload) * 64
+
+    def text_path():
+        splitter = serial_framing.StreamSplitter()
+        for _is_frame, item in splitter.feed(text_chunk):
+            line = item.decode("utf-8", errors="ignore").strip()
+            m = RX_RE.search(line)
+            codec.decode_report(bytes.fromhex(m.group(2).replace(" ", "").strip()))
+
+    def binary_path():
+        splitter = serial_framing.StreamSplitter()
+        for _is_frame, item in splitter.feed(bin_chunk):
+            _kind, _mac, data = serial_framing.parse_frame(item)
+            codec.decode_report(data)
+
+    reps = max(1, n // 64)
+    out = {}
+    for name, fn in (("text", text_path), ("binary", binary_path)):
+        sec = min(timeit.repeat(fn, number=reps, repeat=3))
+        out[name] = {"us_per_report": round(sec / (reps * 64) * 1e6, 2)}
+    out["speedup"] = round(out["text"]["us_per_report"] / out["binary"]["us_per_report"], 2)
+    return out
+
+
+def _thread_cpu_sec(native_id):
+    """utime + stime of one thread from /proc (None where unavailable)."""
+    try:
+        with open(f"/proc/self/task/{native_id}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class RawReader:
+    """Reader loop for hosts without pyserial: same splitting / decoding as SerialController."""
+
+    def __init__(self, port, binary):
+        import termios
+        self.fd = os.open(port, os.O_RDWR | os.O_NOCTTY)
+        attrs = termios.tcgetattr(self.fd)
+        attrs[3] &= ~(termios.ICANON | termios.ECHO)
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+        self.binary = binary
+        self.reports = 0
+        self.bytes_in = 0
+        self._cpu = 0.0
+        self._splitter = serial_framing.StreamSplitter()
+        self._running = True
+        self._caps = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="raw-reader", daemon=True)
+        self.thread.start()
+        os.write(self.fd, b"CAPS?\n")
+        self._caps.wait(5)
+
+    def _line(self, line):
+        if line.startswith("CAPS:"):
+            if self.binary and "BIN" in line:
+                os.write(self.fd, b"BIN:1\n")
+            else:
+                self._caps.set()
+            return
+        if line == "OK:BIN":
+            self._caps.set()
+            return
+        m = RX_RE.search(line)
+        if m:
+            codec.decode_report(bytes.fromhex(m.group(2).replace(" ", "").strip()))
+            self.reports += 1
+
+    def cpu_sec(self):
+        return self._cpu
+
+    def _run(self):
+        while self._running:
+            self._cpu = time.thread_time()
+            r, _, _ = select.select([self.fd], [], [], 0.2)
+            if not r:
+                continue
+            chunk = os.read(self.fd, 4096)
+            self.bytes_in += len(chunk)
+            for is_frame, item in self._splitter.feed(chunk):
+                if is_frame:
+                    kind, _mac, data = serial_framing.parse_frame(item)
+                    if kind == serial_framing.FRAME_RX:
+                        codec.decode_report(data)
+                        self.reports += 1
+                else:
+                    line = item.decode("utf-8", errors="ignore").strip()
+                    if line:
+                        self._line(line)
+
+    def stop(self):
+        self._running = False
+        self.thread.join(timeout=2)
+        os.close(self.fd)
+
+
+class ControllerReader:
+    """SerialController's own reader thread on the pty (needs pyserial)."""
+
+    def __init__(self, port, binary):
+        import logging
+        import serial
+        import config
+        import controller
+        logging.getLogger("PiController").setLevel(logging.WARNING)
+        config.SERIAL_BINARY_FRAMING = binary
+        ctrl = controller.SerialController(port, 115200)
+        # connect() would toggle DTR, which a pty does not have.
+        ctrl.serial_conn = serial.Serial(port, 115200, timeout=1)
+        ctrl.watchdog = controller.WatchdogThread(ctrl.serial_conn)
+        ctrl.running = True
+        ctrl._query_caps()
+        ctrl.read_thread = threading.Thread(target=ctrl.reader_thread, name="serial-reader", daemon=True)
+        ctrl.read_thread.start()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and not ctrl.master_caps:
+            time.sleep(0.02)
+        time.sleep(0.2)
+        self.ctrl = ctrl
+        self.thread = ctrl.read_thread
+        self._base = self._count()
+
+    def _count(self):
+        st = self.ctrl.link_stats
+        return st["rx_frames"] + st["rx_lines"]
+
+    @property
+    def reports(self):
+        return self._count() - self._base
+
+    @property
+    def bytes_in(self):
+        return self.ctrl.link_stats["bytes_in"]
+
+    def cpu_sec(self):
+        return _thread_cpu_sec(self.thread.native_id)
+
+    def stop(self):
+        self.ctrl.running = False
+        self.thread.join(timeout=3)
+        self.ctrl._close_serial()
+
+
+def make_reader(port, binary):
+    if importlib.util.find_spec("serial") is None:
+        return RawReader(port, binary), "raw tty reader (pyserial not installed)"
+    return ControllerReader(port, binary), "SerialController.reader_thread"
+
+
+def pty_run(binary, reports, baud):
+    sim = MasterSimulator(caps=("TXM", "DLV", "BIN"), baud=baud).start(boot=False)
+    reader, kind = make_reader(sim.port, binary)
+    try:
+        if sim.binary_out != binary:
+            raise RuntimeError(f"negotiation failed (binary_out={sim.binary_out})")
+        payload = codec.encode_float(1, 0x21, 512.5)
+        cpu0 = reader.cpu_sec()
+        bytes0 = sim.stats()["bytes_out"]
+        t0 = time.monotonic()
+        sim.send_rx_burst([(MAC, payload)] * reports)
+        deadline = time.monotonic() + 30
+        while reader.reports < reports and time.monotonic() < deadline:
+            time.sleep(0.005)
+        elapsed = time.monotonic() - t0
+        time.sleep(0.3)     # let the reader loop come round once more (RawReader samples its CPU per loop)
+        cpu1 = reader.cpu_sec()
+        wire = sim.stats()["bytes_out"] - bytes0
+        got = reader.reports
+    finally:
+        reader.stop()
+        sim.stop()
+    return {
+        "reader": kind,
+        "reports": got,
+        "elapsed_sec": round(elapsed, 3),
+        "reports_per_sec": round(got / elapsed) if elapsed else None,
+        "wire_bytes": wire,
+        "reader_cpu_us_per_report": round((cpu1 - cpu0) / got * 1e6, 2) if got and cpu0 is not None else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--reports", type=int, default=2000, help="slave reports streamed over the pty")
+    ap.add_argument("--baud", type=float, default=115200, help="UART pacing for the pty run (0 = unpaced)")
+    ap.add_argument("--n", type=int, default=64000, help="reports per parse-cost timing run")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    failures = round_trip_checks()
+    if failures:
+        for f in failures:
+            print("FAIL", f)
+        return 1
+    results = {
+        "round_trip": "ok",
+        "wire": wire_sizes(args.baud or 115200),
+        "parse": parse_cost(args.n),
+        "pty": {mode: pty_run(mode == "binary", args.reports, args.baud) for mode in ("text", "binary")},
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print("frame round trip + CRC resync: ok")
+    print("wire bytes per message (text / binary):")
+    for name, r in results["wire"]["messages"].items():
+        tx = f"TX {r['text_tx']:3d}/{r['binary_tx']:3d}  " if "text_tx" in r else " " * 16
+        print(f"  {name:24s} {tx}RX {r['text_rx']:3d}/{r['binary_rx']:3d}  x{r['ratio']}")
+    mx = results["wire"]["max_reports_per_sec"]
+    print(f"  UART ceiling for weight reports: text {mx['text']}/s, binary {mx['binary']}/s")
+    p = results["parse"]
+    print(f"parse cost per report: text {p['text']['us_per_report']} us, "
+          f"binary {p['binary']['us_per_report']} us (x{p['speedup']})")
+    for mode, r in results["pty"].items():
+        print(f"pty {mode:6s} ({r['reader']}): {r['reports']} reports in {r['elapsed_sec']} s "
+              f"= {r['reports_per_sec']}/s, {r['wire_bytes']} wire bytes, "
+              f"reader CPU {r['reader_cpu_us_per_report']} us/report")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark suite for the controller hot paths (offline, no hardware).
+
+Groups (--only to pick some):
+    serial     SerialController.process_incoming_data on a mix of RX / HEARTBEAT /
+               OK:Sent / OK:Delivered lines, and StreamSplitter.feed on binary frames
+    handlers   handle_packet of the hydration, LED, IR and ONO handlers
+    payloads   LEDHandler / OledHandler / IRHandler send paths (codec + shadow + send_command)
+    store      OnocoyStationStore.get_snapshot / update_station_from_onocoy_info at 10 / 100 / 1000 stations
+    http       /api/data and /api/master/log through the Flask test client
+
+Handler and payload cases run against BenchController, a stand-in that
+records sends instead of writing to a UART, so they time the handler code
+alone. The `serial` group needs pyserial (controller imports it) and `http`
+needs Flask + pyserial; groups whose imports fail are reported as skipped.
+Logging is disabled while timing (the log handlers would dominate).
+
+Each case reports the best of --repeat runs of --n calls as ns/op.
+
+Usage (from house_automation/pi_controller):
+    python3 benchmarks/bench_suite.py --out bench.json
+    python3 benchmarks/bench_suite.py --only store payloads --n 5000
+    python3 benchmarks/bench_suite.py --compare base.json --out new.json   # run now, compare with base
+    python3 benchmarks/bench_suite.py --compare base.json new.json --threshold 15
+Compare mode exits 1 if any case got more than --threshold percent slower.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import codec  # noqa: E402
+import serial_framing  # noqa: E402
+
+HYDRATION_MAC = "F0:24:F9:0C:AB:B0"
+LED_MAC = "A0:A3:B3:2A:20:C0"
+ONO_MAC = "C0:CD:D6:85:70:CC"
+
+
+class SkipGroup(Exception):
+    """A group cannot run here (missing optional dependency)."""
+
+
+class BenchController:
+    """Just enough of SerialController for the handlers; sends are counted, not written."""
+
+    def __init__(self):
+        from device_shadow import DeviceShadow
+        self.shadow = DeviceShadow(ttl_sec=300)
+        self.sent = 0
+        self.event_sink = None
+        self.last_presence_check = {"result": True, "method": "bench", "error": "", "timestamp": time.time()}
+        self.handlers = {}
+
+    def send_command(self, mac_address, hex_data, force=False, frames=1):
+        payload = hex_data if isinstance(hex_data, bytes) else bytes.fromhex(hex_data)
+        if self.shadow.should_skip(mac_address, payload, force=force, frames=frames):
+            return False
+        self.shadow.record(mac_address, payload)
+        self.sent += 1
+        return True
+
+    def emit(self, kind, key=None, **data):
+        pass
+
+    def is_phone_home(self):
+        return True
+
+    def append_log_line(self, msg):
+        pass
+
+
+def bench_controller():
+    from handlers.hydration import HydrationHandler
+    from handlers.led import LEDHandler
+    from handlers.ir import IRHandler
+    from handlers.ono import OledHandler
+    ctrl = BenchController()
+    ctrl.handlers = {
+        'hydration': HydrationHandler(ctrl),
+        'led': LEDHandler(ctrl),
+        'ir': IRHandler(ctrl),
+        'ono': OledHandler(ctrl),
+    }
+    return ctrl
+
+
+class _NullSerial:
+    is_open = True
+    in_waiting = 0
+
+    def write(self, data):
+        return len(data)
+
+
+def serial_controller():
+    """A real SerialController (not connected) writing into a null port. Needs pyserial."""
+    try:
+        from controller import SerialController
+    except ImportError as e:
+        raise SkipGroup(f"controller not importable: {e}")
+    ctrl = SerialController("/dev/null", 115200)
+    ctrl.serial_conn = _NullSerial()
+    ctrl.master_caps = {"TXM", "DLV"}
+    return ctrl
+
+
+def _cycler(items, fn):
+    it = itertools.cycle(items)
+    return lambda: fn(next(it))
+
+
+# --- Groups: each returns [(name, callable)] or (name, callable, max calls per run) ---
+
+def group_serial():
+    ctrl = serial_controller()
+    weight = codec.encode_float(1, 0x21, 512.5).hex().upper()
+    lines = [
+        f"RX:{HYDRATION_MAC}:{weight}",
+        "HEARTBEAT",
+        "OK:Sent",
+        f"OK:Delivered:{LED_MAC}",
+        f"RX:{LED_MAC}:{codec.encode_float(2, 0x10, 1.0).hex().upper()}",
+        "HEARTBEAT",
+    ]
+    splitter = serial_framing.StreamSplitter()
+    frames = b"".join(serial_framing.encode_rx(HYDRATION_MAC, codec.encode_float(1, 0x21, 500.0 + i))
+                      for i in range(16))
+    return [
+        ("serial.process_incoming_data.mixed", _cycler(lines, ctrl.process_incoming_data)),
+        ("serial.process_incoming_data.rx_weight", lambda: ctrl.process_incoming_data(lines[0])),
+        ("serial.process_incoming_data.heartbeat", lambda: ctrl.process_incoming_data("HEARTBEAT")),
+        ("serial.splitter.feed_16_frames", lambda: splitter.feed(frames)),
+        ("serial.send_command", lambda: ctrl.send_command(LED_MAC, codec.LED_ON, force=True)),
+    ]
+
+
+def group_handlers():
+    ctrl = bench_controller()
+    hyd, led, ir, ono = (ctrl.handlers[k] for k in ("hydration", "led", "ir", "ono"))
+    weights = [400.0 + i * 0.5 for i in range(64)]
+    return [
+        ("handlers.hydration.weight_0x21", _cycler(weights, lambda w: hyd.handle_packet(0x21, w, HYDRATION_MAC))),
+        ("handlers.hydration.daily_total_0x61", lambda: hyd.handle_packet(0x61, 1250.0, HYDRATION_MAC)),
+        ("handlers.hydration.presence_0x40", lambda: hyd.handle_packet(0x40, 0.0, HYDRATION_MAC)),
+        ("handlers.led.packet", lambda: led.handle_packet(0x10, 1.0, LED_MAC)),
+        ("handlers.ir.packet", lambda: ir.handle_packet(0x31, 0.0, LED_MAC)),
+        ("handlers.ono.packet", lambda: ono.handle_packet(0x02, 0.0, ONO_MAC)),
+    ]
+
+
+def group_payloads():
+    ctrl = bench_controller()
+    led, ir, ono = (ctrl.handlers[k] for k in ("led", "ir", "ono"))
+    modes = [codec.led_mode(m, 5) for m in range(30, 40)]
+    cases = [
+        ("payloads.led.send_cmd_mode", _cycler(modes, lambda p: led.send_cmd(p, "Mode", force=True))),
+        ("payloads.led.send_cmd_unchanged", lambda: led.send_cmd(codec.LED_ON, "ON")),
+        ("payloads.ono.send_text", lambda: ono.send_text("250 ml", 3, force=True)),
+        ("payloads.ono.send_color", lambda: ono.send_color(255, 16, 0, 10, force=True)),
+        ("payloads.ono.send_price", lambda: ono.send_price(0.0123, -2.5, force=True)),
+        # Queues a 3-frame burst on the IR scheduler (frames go out in the background, 0.1 s
+        # apart): capped so the backlog stays small.
+        ("payloads.ir.send_nec", lambda: ir.send_nec("F7C03F", force=True), 500),
+    ]
+    return cases
+
+
+INFO_UP = {"status": {"is_up": True, "since": "2026-01-01T00:00:00+00:00"}}
+INFO_DOWN = {"status": {"is_up": False, "since": "2026-01-02T00:00:00+00:00"}}
+
+
+def group_store(sizes=(10, 100, 1000)):
+    from onocoy_station_store import OnocoyStationStore
+    tmp = tempfile.mkdtemp(prefix="bench_suite_")
+    cases = []
+    for n in sizes:
+        store = OnocoyStationStore(
+            stations_path=os.path.join(tmp, f"stations_{n}.json"),
+            settings_path=os.path.join(tmp, f"settings_{n}.json"),
+        )
+        for i in range(n):
+            store.add_station(f"station-{i:05d}", nickname=f"Station {i}")
+            store.update_station_from_onocoy_info(f"station-{i:05d}", INFO_UP)
+        ids = [f"station-{i:05d}" for i in range(n)]
+        flip = itertools.cycle([INFO_DOWN, INFO_UP])
+
+        def update_changed(store=store, ids=ids, flip=flip):
+            store.update_station_from_onocoy_info(ids[0], next(flip))
+
+        def update_then_snapshot(store=store, ids=ids, flip=flip):
+            store.update_station_from_onocoy_info(ids[0], next(flip))
+            store.get_snapshot()
+
+        cases += [
+            (f"store.get_snapshot.{n}", store.get_snapshot),
+            (f"store.update_unchanged.{n}", lambda store=store, ids=ids: store.update_station_from_onocoy_info(
+                ids[-1], INFO_UP)),
+            (f"store.update_changed.{n}", update_changed),
+            (f"store.update_then_snapshot.{n}", update_then_snapshot),
+        ]
+    return cases
+
+
+def group_http():
+    try:
+        import web_server
+    except ImportError as e:
+        raise SkipGroup(f"web_server not importable: {e}")
+    ctrl = serial_controller()
+    for i in range(500):
+        ctrl.append_log_line(f"RX:{HYDRATION_MAC}:{codec.encode_float(1, 0x21, 400.0 + i).hex().upper()}")
+    ctrl.handlers['hydration'].state.update(weight=512.5, status='Active', last_update=time.time())
+    web_server.controller = ctrl
+    client = web_server.app.test_client()
+    etag = client.get('/api/data').headers.get('ETag')
+    return [
+        ("http.api_data", lambda: client.get('/api/data')),
+        ("http.api_data_304", lambda: client.get('/api/data', headers={"If-None-Match": etag})),
+        ("http.api_master_log_200", lambda: client.get('/api/master/log?limit=200')),
+    ]
+
+
+GROUPS = {
+    "serial": group_serial,
+    "handlers": group_handlers,
+    "payloads": group_payloads,
+    "store": group_store,
+    "http": group_http,
+}
+
+
+def time_case(fn, n, repeat):
+    fn()   # warm caches
+    best = min(timeit.repeat(fn, number=n, repeat=repeat))
+    return best / n * 1e9
+
+
+def run(groups, n, repeat):
+    results, skipped = {}, {}
+    logging.disable(logging.CRITICAL)
+    try:
+        for group in groups:
+            try:
+                cases = GROUPS[group]()
+            except SkipGroup as e:
+                skipped[group] = str(e)
+                continue
+            for name, fn, *cap in cases:
+                # HTTP requests are ~1000x slower than the rest: fewer calls keep runs short.
+                calls = max(50, n // 20) if group == "http" else n
+                if cap:
+                    calls = min(calls, cap[0])
+                ns = time_case(fn, calls, repeat)
+                results[name] = {"ns_per_op": round(ns, 1), "ops_per_sec": round(1e9 / ns), "n": calls}
+    finally:
+        logging.disable(logging.NOTSET)
+    return {
+        "meta": {
+            "ts": time.time(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "node": platform.node(),
+            "n": n,
+            "repeat": repeat,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(base, new, threshold_pct):
+    """Print old vs new per case. Returns the names that got slower by more than threshold_pct."""
+    regressions = []
+    names = sorted(set(base["results"]) | set(new["results"]))
+    print(f"{'case':48s} {'base ns':>11s} {'new ns':>11s} {'change':>8s}")
+    for name in names:
+        a, b = base["results"].get(name), new["results"].get(name)
+        if not a or not b:
+            print(f"{name:48s} {'-' if not a else a['ns_per_op']:>11} {'-' if not b else b['ns_per_op']:>11}"
+                  f" {'only ' + ('new' if b else 'base'):>8s}")
+            continue
+        change = (b["ns_per_op"] - a["ns_per_op"]) / a["ns_per_op"] * 100.0
+        flag = ""
+        if change > threshold_pct:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:48s} {a['ns_per_op']:>11,.1f} {b['ns_per_op']:>11,.1f} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", nargs="+", choices=sorted(GROUPS), help="groups to run (default: all)")
+    ap.add_argument("--n", type=int, default=20000, help="calls per timing run")
+    ap.add_argument("--repeat", type=int, default=5, help="timing runs per case (best is kept)")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", nargs="+", metavar="JSON",
+                    help="BASE [NEW]: compare NEW (or a fresh run) against BASE")
+    ap.add_argument("--threshold", type=float, default=10.0, help="percent slowdown that counts as a regression")
+    args = ap.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        ap.error("--compare takes BASE [NEW]")
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+    else:
+        new = run(args.only or list(GROUPS), args.n, args.repeat)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(new, f, indent=2)
+        for group, reason in new["skipped"].items():
+            print(f"skipped {group}: {reason}")
+        if not args.compare:
+            for name, r in new["results"].items():
+                print(f"{name:48s} {r['ns_per_op']:>11,.1f} ns/op {r['ops_per_sec']:>12,}/s")
+            return 0
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+
+    regressions = compare(base, new, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:g}%: {', '.join(regressions)}")
+        return 1
+    print(f"no regressions over {args.threshold:g}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
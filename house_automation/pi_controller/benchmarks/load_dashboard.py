@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Load generator / soak profile for the dashboard API.
+
+Replays what one open dashboard tab does (static/app.js) for N simulated
+clients, plus bursts of commands like someone clicking through the controls:
+
+    GET  /api/data?wait=25           long poll    (If-None-Match; held until the state changes)
+    GET  /api/master/log?limit=150   every 1.5 s
+    GET  /api/onocoy/status          every 2.5 s
+    POST /api/hydration/cmd          every 60 s   ({"cmd": "request_daily_total"})
+
+Each poll runs on its own timer like setInterval (fixed rate, late ticks fire
+at once, missed ticks are dropped), clients start at random offsets. The
+/api/data long poll is re-issued as soon as it returns (2 s pause after an
+error), so its latency includes the time the server held it. Command
+bursts fire `--burst-size` requests at once every `--burst-every` seconds, drawn
+from `--burst-mix` (led, ir, ono, master; master runs the all_on / all_off
+scene, which also posts to Adafruit IO, so it is left out by default).
+
+By default the tool starts everything itself: the simulated master on a pty
+(master_sim.py, injecting hydration reports so /api/data changes), the mock
+Onocoy API (mock_onocoy_server.py), and web_server.py as a subprocess with
+SERIAL_PORT / WEB_PORT / ONOCOY_API_BASE_URL pointed at them. The server uses
+its normal data directory. With --url it only loads an already running server
+(pass --pid to still sample its memory and threads).
+
+Reported: throughput, latency p50/p95/p99/max and errors per endpoint, and a
+timeline (every --sample-every s) of req/s, window p95, errors, server RSS,
+thread count and CPU from /proc/<pid>.
+
+Usage (from house_automation/pi_controller):
+    python3 benchmarks/load_dashboard.py --clients 10 --duration 120
+    python3 benchmarks/load_dashboard.py --clients 50 --duration 1800 --burst-every 20 --out soak.json
+    python3 benchmarks/load_dashboard.py --url http://pi.local:5000 --pid 1234 --clients 5
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+sys.path.insert(0, ROOT)
+
+LONG_POLL_WAIT_SEC = 25
+
+POLLS = [
+    # (name, method, path, body, interval_sec)
+    ("data", "GET", f"/api/data?wait={LONG_POLL_WAIT_SEC}", None, 0.0),     # interval 0 = long poll
+    ("master_log", "GET", "/api/master/log?limit=150", None, 1.5),
+    ("onocoy_status", "GET", "/api/onocoy/status", None, 2.5),
+    ("daily_total", "POST", "/api/hydration/cmd", {"cmd": "request_daily_total"}, 60.0),
+]
+
+COMMANDS = {
+    "led": lambda rnd: ("POST", "/api/led/cmd", rnd.choice([{"cmd": "on"}, {"cmd": "off"},
+                                                           {"cmd": "rgb", "val": rnd.randint(1, 8)}])),
+    "ir": lambda rnd: ("POST", "/api/ir/send", {"code": "0x00FF02FD"}),
+    "ono": lambda rnd: ("POST", "/api/ono/text", {"text": f"load {rnd.randint(0, 999)}", "duration": 3}),
+    "master": lambda rnd: ("POST", "/api/master/cmd", {"action": rnd.choice(["on", "off"])}),
+}
+
+
+def _percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return None
+    idx = min(len(sorted_vals) - 1, int(round(pct / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+class Recorder:
+    """Every finished request: (t_done, endpoint, ms, status, error)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+
+    def add(self, endpoint, ms, status, error=None):
+        with self._lock:
+            self.samples.append((time.monotonic(), endpoint, ms, status, error))
+
+    def since(self, t0):
+        with self._lock:
+            return [s for s in self.samples if s[0] >= t0]
+
+
+def request(base_url, method, path, body=None, headers=None, timeout=10.0):
+    """One HTTP call. Returns (status, response headers, error string or None)."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method, headers=dict(headers or {}))
+    if data is not None:
+        req.add_header("Content-Type", "application/json")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as r:
+            r.read()
+            return r.status, r.headers, None
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, e.headers, None if e.code == 304 else f"HTTP {e.code}"
+    except Exception as e:
+        return None, {}, type(e).__name__
+
+
+def poll_stream(base_url, rec, stop, name, method, path, body, interval, offset, timeout):
+    etag = None
+    due = time.monotonic() + offset
+    while not stop.is_set():
+        wait = due - time.monotonic()
+        if wait > 0 and stop.wait(wait):
+            break
+        headers = {"If-None-Match": etag} if etag else None
+        t0 = time.perf_counter()
+        long_poll = interval <= 0
+        status, resp_headers, error = request(base_url, method, path, body, headers,
+                                              timeout + (LONG_POLL_WAIT_SEC if long_poll else 0))
+        rec.add(name, (time.perf_counter() - t0) * 1000.0, status, error)
+        etag = resp_headers.get("ETag") or etag
+        if long_poll:
+            due = time.monotonic() + (2.0 if error else 0.0)
+            continue
+        due += interval
+        now = time.monotonic()
+        if due < now:
+            due += ((now - due) // interval + 1) * interval   # setInterval drops missed ticks
+
+
+def burst_loop(base_url, rec, stop, mix, size, every, timeout, seed):
+    rnd = random.Random(seed)
+    while not stop.wait(every):
+        threads = []
+        for _ in range(size):
+            kind = rnd.choice(mix)
+            method, path, body = COMMANDS[kind](rnd)
+
+            def fire(kind=kind, method=method, path=path, body=body):
+                t0 = time.perf_counter()
+                status, _h, error = request(base_url, method, path, body, timeout=timeout)
+                rec.add("cmd_" + kind, (time.perf_counter() - t0) * 1000.0, status, error)
+
+            t = threading.Thread(target=fire, daemon=True)
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join(timeout)
+
+
+def proc_sample(pid, prev=None):
+    """RSS (MB), threads and CPU % since `prev` from /proc/<pid>. Returns (sample, state for next call)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, ValueError):
+        return None, prev
+    ticks = int(fields[11]) + int(fields[12])     # utime + stime
+    now = time.monotonic()
+    cpu = None
+    if prev is not None:
+        cpu = round(100.0 * (ticks - prev[0]) / os.sysconf("SC_CLK_TCK") / max(1e-6, now - prev[1]), 1)
+    return {
+        "rss_mb": round(int(status["VmRSS"].split()[0]) / 1024.0, 1),
+        "threads": int(status["Threads"]),
+        "cpu_pct": cpu,
+    }, (ticks, now)
+
+
+def summarise(samples, elapsed):
+    by_ep = {}
+    for _t, ep, ms, status, error in samples:
+        d = by_ep.setdefault(ep, {"ms": [], "errors": {}, "not_modified": 0})
+        d["ms"].append(ms)
+        if error:
+            d["errors"][error] = d["errors"].get(error, 0) + 1
+        elif status == 304:
+            d["not_modified"] += 1
+    out = {}
+    for ep in sorted(by_ep):
+        d = by_ep[ep]
+        lat = sorted(d["ms"])
+        out[ep] = {
+            "requests": len(lat),
+            "rps": round(len(lat) / elapsed, 2) if elapsed else None,
+            "errors": sum(d["errors"].values()),
+            "error_kinds": d["errors"],
+            "not_modified": d["not_modified"],
+            "p50_ms": round(_percentile(lat, 50), 1),
+            "p95_ms": round(_percentile(lat, 95), 1),
+            "p99_ms": round(_percentile(lat, 99), 1),
+            "max_ms": round(lat[-1], 1),
+        }
+    return out
+
+
+def start_server(args, tmpdir):
+    """Simulated master + mock Onocoy + web_server.py. Returns (base_url, server proc, cleanup)."""
+    from master_sim import MasterSimulator
+    import codec
+
+    sim = MasterSimulator(caps=[c for c in args.caps.split(",") if c])
+    sim.keep_received = False
+    sim.start()
+    stop = threading.Event()
+
+    def reports():
+        while not stop.wait(args.report_every):
+            sim.send_rx(args.report_mac, codec.encode_float(1, 0x21, 400.0 + random.random() * 200))
+            sim.heartbeat()
+
+    if args.report_every:
+        threading.Thread(target=reports, name="sim-reports", daemon=True).start()
+
+    env = dict(os.environ, SERIAL_PORT=sim.port, WEB_PORT=str(args.port), PRESENCE_TRACKING="0")
+    mock = None
+    if not args.real_onocoy:
+        mock = subprocess.Popen([sys.executable, os.path.join(HERE, "mock_onocoy_server.py"), "--port", "0"],
+                                stdout=subprocess.PIPE, text=True)
+        env["ONOCOY_API_BASE_URL"] = mock.stdout.readline().split(" on ", 1)[1].split()[0]
+    log = open(os.path.join(tmpdir, "web_server.log"), "w")
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "web_server.py")], cwd=ROOT, env=env,
+                              stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    def cleanup():
+        stop.set()
+        for p in (server, mock):
+            if p is not None and p.poll() is None:
+                p.terminate()
+                try:
+                    p.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    p.kill()
+        log.close()
+        sim.stop()
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            cleanup()
+            raise SystemExit(f"web_server.py exited with {server.returncode}, see {log.name}")
+        status, _h, _e = request(base_url, "GET", "/api/health", timeout=2)
+        if status == 200:
+            return base_url, server.pid, cleanup
+        time.sleep(0.5)
+    cleanup()
+    raise SystemExit(f"web_server.py not answering on {base_url} after {args.startup_timeout:.0f}s, see {log.name}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", type=int, default=5, help="simulated dashboard tabs")
+    ap.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    ap.add_argument("--burst-every", type=float, default=15.0, help="seconds between command bursts (0 = none)")
+    ap.add_argument("--burst-size", type=int, default=5, help="concurrent commands per burst")
+    ap.add_argument("--burst-mix", default="led,ir,ono", help=f"comma list of {','.join(COMMANDS)}")
+    ap.add_argument("--sample-every", type=float, default=5.0, help="timeline resolution (s)")
+    ap.add_argument("--timeout", type=float, default=10.0, help="per-request timeout (s)")
+    ap.add_argument("--url", help="load an already running server instead of starting one")
+    ap.add_argument("--pid", type=int, help="server pid to sample with --url")
+    ap.add_argument("--port", type=int, default=5057, help="port for the server started here")
+    ap.add_argument("--caps", default="TXM,DLV,BIN", help="CAPS of the simulated master")
+    ap.add_argument("--report-every", type=float, default=2.0, help="simulated hydration report interval (s)")
+    ap.add_argument("--report-mac", default="F0:24:F9:0C:AB:B0")
+    ap.add_argument("--real-onocoy", action="store_true", help="do not start the mock Onocoy API")
+    ap.add_argument("--startup-timeout", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write the full report as JSON here")
+    args = ap.parse_args()
+
+    mix = [m.strip() for m in args.burst_mix.split(",") if m.strip()]
+    unknown = [m for m in mix if m not in COMMANDS]
+    if unknown:
+        ap.error(f"unknown --burst-mix entries: {unknown}")
+
+    tmpdir = tempfile.mkdtemp(prefix="load_dashboard_")
+    if args.url:
+        base_url, pid, cleanup = args.url.rstrip("/"), args.pid, (lambda: None)
+    else:
+        base_url, pid, cleanup = start_server(args, tmpdir)
+    print(f"Loading {base_url} with {args.clients} client(s) for {args.duration:.0f}s"
+          + (f", bursts of {args.burst_size} every {args.burst_every:g}s ({','.join(mix)})" if args.burst_every else ""),
+          flush=True)
+
+    rnd = random.Random(args.seed)
+    rec = Recorder()
+    stop = threading.Event()
+    threads = []
+    for c in range(args.clients):
+        for name, method, path, body, interval in POLLS:
+            t = threading.Thread(target=poll_stream, name=f"client{c}-{name}", daemon=True,
+                                 args=(base_url, rec, stop, name, method, path, body, interval,
+                                       rnd.uniform(0, min(interval, 2.0)), args.timeout))
+            threads.append(t)
+    if args.burst_every and mix:
+        threads.append(threading.Thread(target=burst_loop, name="bursts", daemon=True,
+                                        args=(base_url, rec, stop, mix, args.burst_size, args.burst_every,
+                                              args.timeout, args.seed)))
+
+    timeline = []
+    _s, prev = proc_sample(pid) if pid else (None, None)
+    t_start = time.monotonic()
+    for t in threads:
+        t.start()
+    print(f"{'t':>6} {'req/s':>7} {'p95 ms':>8} {'errors':>6} {'rss MB':>7} {'threads':>7} {'cpu %':>6}")
+    try:
+        window_start = t_start
+        while True:
+            end = min(window_start + args.sample_every, t_start + args.duration)
+            stop.wait(max(0.0, end - time.monotonic()))
+            window = rec.since(window_start)
+            span = time.monotonic() - window_start
+            lat = sorted(s[2] for s in window)
+            row = {
+                "t": round(time.monotonic() - t_start, 1),
+                "rps": round(len(window) / span, 1) if span else 0.0,
+                "p95_ms": round(_percentile(lat, 95), 1) if lat else None,
+                "errors": sum(1 for s in window if s[4]),
+            }
+            if pid:
+                sample, prev = proc_sample(pid, prev)
+                row.update(sample or {"rss_mb": None, "threads": None, "cpu_pct": None})
+            timeline.append(row)
+            print(f"{row['t']:>6} {row['rps']:>7} {row['p95_ms'] if row['p95_ms'] is not None else '-':>8} "
+                  f"{row['errors']:>6} {row.get('rss_mb') or '-':>7} {row.get('threads') or '-':>7} "
+                  f"{row.get('cpu_pct') if row.get('cpu_pct') is not None else '-':>6}", flush=True)
+            window_start = time.monotonic()
+            if window_start - t_start >= args.duration:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(args.timeout)
+        elapsed = time.monotonic() - t_start
+        cleanup()
+
+    endpoints = summarise(rec.samples, elapsed)
+    total = sum(e["requests"] for e in endpoints.values())
+    errors = sum(e["errors"] for e in endpoints.values())
+    print()
+    print(f"{'endpoint':<16} {'req':>7} {'req/s':>7} {'err':>5} {'304':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>8}")
+    for ep, e in endpoints.items():
+        print(f"{ep:<16} {e['requests']:>7} {e['rps']:>7} {e['errors']:>5} {e['not_modified']:>5} "
+              f"{e['p50_ms']:>7} {e['p95_ms']:>7} {e['p99_ms']:>7} {e['max_ms']:>8}")
+    print(f"total: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s), {errors} error(s)")
+    rss = [r["rss_mb"] for r in timeline if r.get("rss_mb") is not None]
+    if rss:
+        print(f"server RSS: {rss[0]} -> {rss[-1]} MB (peak {max(rss)}), "
+              f"threads peak {max(r['threads'] for r in timeline if r.get('threads'))}")
+
+    if args.out:
+        report = {
+            "url": base_url,
+            "clients": args.clients,
+            "duration_sec": round(elapsed, 1),
+            "burst": {"every_sec": args.burst_every, "size": args.burst_size, "mix": mix},
+            "total_requests": total,
+            "total_errors": errors,
+            "rps": round(total / elapsed, 2),
+            "endpoints": endpoints,
+            "timeline": timeline,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+    return 1 if total == 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Simulated master ESP32 on a pseudo-terminal (offline benchmarks, bench rigs).
+
+Opens a pty pair and behaves like master_esp32.ino on the master side: answers
+`CAPS?`, switches to binary reports on `BIN:1`, accepts `TX:` / `TXM:` lines and
+binary frames (serial_framing), prints `OK:Sent` + delivery lines / frames, and
+can inject slave reports. `port` is a real tty path, so SerialController (or
+pyserial, or plain os.open) can be pointed at it like /dev/serial0.
+
+`baud` paces the master -> Pi direction like the UART would (10 bits per byte;
+0 = as fast as the pty goes).
+
+Usage:
+    sim = MasterSimulator(caps=("TXM", "DLV", "BIN"), baud=115200)
+    sim.start()
+    ctrl = SerialController(sim.port, 115200)
+    ...
+    sim.send_rx("F0:24:F9:0C:AB:B0", codec.encode_float(1, 0x21, 512.5))
+    sim.send_rx_burst([(mac, payload)] * 1000)   # one paced write
+    sim.stats()   # {"tx_lines": ..., "tx_frames": ..., "bytes_in": ..., "bytes_out": ...}
+    sim.stop()
+
+    # standalone, e.g. for web_server.py against a fake master:
+    python3 benchmarks/master_sim.py --caps TXM,DLV,BIN --report-every 5
+"""
+import argparse
+import os
+import pty
+import select
+import sys
+import threading
+import time
+import tty
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import serial_framing  # noqa: E402
+
+BOOT_BANNER = "Master Gateway Started (Transparent Mode)"
+
+
+class MasterSimulator:
+    def __init__(self, caps=("TXM", "DLV", "BIN"), baud=115200, ack=True, deliver_ok=True):
+        self.caps = tuple(caps)
+        self.baud = float(baud)
+        self.ack = ack
+        self.deliver_ok = deliver_ok
+        self.master_fd, self.slave_fd = pty.openpty()
+        # Raw mode: no echo, no newline translation (the Pi side must see the bytes as sent).
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.binary_out = False
+        self._splitter = serial_framing.StreamSplitter()
+        self._write_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self.received = []          # (mac, payload) handed to "ESP-NOW"
+        self.keep_received = True
+        self._stats = {"tx_lines": 0, "tx_frames": 0, "bad_frames": 0, "bytes_in": 0, "bytes_out": 0}
+
+    # --- master -> Pi ---
+
+    def _write(self, data):
+        with self._write_lock:
+            t0 = time.monotonic()
+            view = memoryview(data)
+            while view:
+                n = os.write(self.master_fd, view)
+                view = view[n:]
+            self._stats["bytes_out"] += len(data)
+            if self.baud > 0:
+                # Hold the lock for as long as the UART would need for these bytes.
+                wait = t0 + len(data) * 10.0 / self.baud - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+
+    def _line(self, text):
+        self._write((text + "\r\n").encode())
+
+    def _rx_bytes(self, mac, payload):
+        if self.binary_out:
+            return serial_framing.encode_rx(mac, payload)
+        return f"RX:{mac}:{payload.hex().upper()}\r\n".encode()
+
+    def boot(self):
+        """What the firmware prints after a reset (text mode, CAPS line)."""
+        self.binary_out = False
+        self._line(BOOT_BANNER)
+        self._line("CAPS:" + ",".join(self.caps))
+
+    def send_rx(self, mac, payload):
+        self._write(self._rx_bytes(mac, payload))
+
+    def send_rx_burst(self, items, chunk=64):
+        """Many slave reports back-to-back (written `chunk` at a time, paced by baud)."""
+        items = list(items)
+        for i in range(0, len(items), chunk):
+            self._write(b"".join(self._rx_bytes(mac, p) for mac, p in items[i:i + chunk]))
+
+    def heartbeat(self):
+        self._line("HEARTBEAT")
+
+    def _delivery(self, mac):
+        if "DLV" not in self.caps:
+            return
+        if self.binary_out:
+            kind = serial_framing.FRAME_DELIVERED if self.deliver_ok else serial_framing.FRAME_DELIVERY_FAILED
+            self._write(serial_framing.encode_frame(kind, serial_framing.mac_bytes(mac)))
+        else:
+            self._line(("OK:Delivered:" if self.deliver_ok else "ERR:Delivery:") + mac)
+
+    # --- Pi -> master ---
+
+    def _sent(self, mac, payload):
+        if self.keep_received:
+            self.received.append((mac, payload))
+        if self.ack:
+            self._delivery(mac)
+
+    def _handle_line(self, line):
+        self._stats["tx_lines"] += 1
+        if line == "CAPS?":
+            self._line("CAPS:" + ",".join(self.caps))
+        elif line in ("BIN:1", "BIN:0") and "BIN" in self.caps:
+            self.binary_out = line == "BIN:1"
+            self._line("OK:BIN" if self.binary_out else "OK:TEXT")
+        elif line.startswith("TXM:") and "TXM" in self.caps:
+            _, rest = line.split(":", 1)
+            macs, hex_payload = rest.rsplit(":", 1)
+            payload = bytes.fromhex(hex_payload)
+            macs = macs.split(",")
+            for mac in macs:
+                self._sent(mac, payload)
+            self._line(f"OK:SentM:{len(macs)}/{len(macs)}")
+        elif line.startswith("TX:"):
+            rest = line[3:]
+            mac, hex_payload = rest.rsplit(":", 1)
+            try:
+                payload = bytes.fromhex(hex_payload)
+            except ValueError:
+                self._line("ERR:Format")
+                return
+            if self.ack:
+                self._line("OK:Sent")
+            self._sent(mac, payload)
+
+    def _handle_frame(self, data):
+        try:
+            kind, mac, rest = serial_framing.parse_frame(data)
+            if kind == serial_framing.FRAME_TXM:
+                macs, payload = serial_framing.split_txm(rest)
+        except serial_framing.FrameError:
+            self._stats["bad_frames"] += 1
+            self._line("ERR:Format")
+            return
+        self._stats["tx_frames"] += 1
+        if kind == serial_framing.FRAME_TX:
+            self._sent(mac, rest)
+        elif kind == serial_framing.FRAME_TXM:
+            for m in macs:
+                self._sent(m, payload)
+        else:
+            self._line("ERR:Format")
+
+    def _run(self):
+        while self._running:
+            r, _, _ = select.select([self.master_fd], [], [], 0.2)
+            if not r:
+                continue
+            try:
+                chunk = os.read(self.master_fd, 4096)
+            except OSError:
+                break
+            self._stats["bytes_in"] += len(chunk)
+            for is_frame, item in self._splitter.feed(chunk):
+                if is_frame:
+                    self._handle_frame(item)
+                else:
+                    line = item.decode("utf-8", errors="ignore").strip()
+                    if line:
+                        self._handle_line(line)
+
+    def start(self, boot=True):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="master-sim", daemon=True)
+        self._thread.start()
+        if boot:
+            self.boot()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def stats(self):
+        return dict(self._stats, crc_errors=self._splitter.crc_errors, binary_out=self.binary_out,
+                    received=len(self.received))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--caps", default="TXM,DLV,BIN", help="comma list advertised in CAPS ('' = old firmware)")
+    ap.add_argument("--baud", type=float, default=115200)
+    ap.add_argument("--heartbeat", type=float, default=10.0, help="HEARTBEAT interval (s)")
+    ap.add_argument("--report-every", type=float, default=0.0,
+                    help="inject a hydration weight report this often (s, 0 = never)")
+    ap.add_argument("--report-mac", default="F0:24:F9:0C:AB:B0")
+    args = ap.parse_args()
+
+    import codec
+    sim = MasterSimulator(caps=[c for c in args.caps.split(",") if c], baud=args.baud)
+    sim.keep_received = False
+    sim.start()
+    print(f"Simulated master on {sim.port} (caps={args.caps or 'none'})", flush=True)
+    next_hb = next_report = time.monotonic()
+    try:
+        while True:
+            now = time.monotonic()
+            if args.heartbeat and now >= next_hb:
+                sim.heartbeat()
+                next_hb = now + args.heartbeat
+            if args.report_every and now >= next_report:
+                sim.send_rx(args.report_mac, codec.encode_float(1, 0x21, 500.0 + (now % 100)))
+                next_report = now + args.report_every
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(sim.stats())
+        sim.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+"""
+Minimal local stand-in for the Onocoy explorer API (offline benchmarks).
+
+Serves GET /api/v1/explorer/server/<station_id>/info with the same JSON shape
+the poller reads: {"status": {"is_up": bool, "since": iso}}. Any station id is
+accepted, so thousands of synthetic stations need no setup.
+
+Knobs:
+- latency_sec (+ latency_jitter_sec), slow_every / slow_latency_sec: response time
+- error_rate: fraction of requests answered with HTTP 500
+- not_found_every: every Nth station (by hash) answers 404 (unknown station)
+- flip_mean_sec: each station flips Online/Offline on average this often
+  (0 = never); `since` is the flip time, so detection latency is measurable
+
+Usage:
+    server = MockOnocoyServer(latency_sec=0.05, error_rate=0.02, flip_mean_sec=600)
+    server.start()
+    url_tmpl = server.url_tmpl     # pass to OnocoyPoller(url_tmpl=...)
+    # or: ONOCOY_API_BASE_URL=<server.base_url> python3 web_server.py
+    server.truth("station-1")      # current (is_up, since_epoch) ground truth
+                                   # (GET /_mock/truth returns it for every station seen)
+    server.stop()
+"""
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INFO_PATH_PREFIX = "/api/v1/explorer/server/"
+TRUTH_PATH = "/_mock/truth"
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256   # default 5 drops connections under a wide poller pool
+
+
+class MockOnocoyServer:
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency_sec=0.05,
+        slow_every=0,
+        slow_latency_sec=1.0,
+        latency_jitter_sec=0.0,
+        error_rate=0.0,
+        not_found_every=0,
+        flip_mean_sec=0.0,
+        seed=None,
+    ):
+        self.latency_sec = float(latency_sec)
+        # Every Nth station (by hash) answers slowly, like a few sluggish real stations.
+        self.slow_every = int(slow_every)
+        self.slow_latency_sec = float(slow_latency_sec)
+        self.latency_jitter_sec = float(latency_jitter_sec)
+        self.error_rate = float(error_rate)
+        self.not_found_every = int(not_found_every)
+        self.flip_mean_sec = float(flip_mean_sec)
+        self.requests = 0
+        self.responses = {200: 0, 404: 0, 500: 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = time.time()
+        # station_id -> [is_up, since_epoch, next_flip_epoch]; created lazily on first request.
+        self._stations = {}
+        self._httpd = _MockHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url_tmpl(self):
+        return self.base_url + INFO_PATH_PREFIX + "{station_id}/info"
+
+    def _bucket(self, station_id, every):
+        return every and sum(station_id.encode()) % every == 0
+
+    def latency_for(self, station_id):
+        base = self.slow_latency_sec if self._bucket(station_id, self.slow_every) else self.latency_sec
+        if self.latency_jitter_sec:
+            with self._lock:
+                base += self._rng.uniform(0, self.latency_jitter_sec)
+        return base
+
+    def _next_flip(self, after):
+        if self.flip_mean_sec <= 0:
+            return float("inf")
+        return after + self._rng.expovariate(1.0 / self.flip_mean_sec)
+
+    def truth(self, station_id, now=None):
+        """(is_up, since_epoch) for a station at `now`, advancing its flip timeline lazily."""
+        now = time.time() if now is None else now
+        with self._lock:
+            st = self._stations.get(station_id)
+            if st is None:
+                st = self._stations[station_id] = [True, self._started, self._next_flip(self._started)]
+            while st[2] <= now:
+                st[0] = not st[0]
+                st[1] = st[2]
+                st[2] = self._next_flip(st[2])
+            return st[0], st[1]
+
+    def all_truth(self):
+        with self._lock:
+            ids = list(self._stations)
+        return {sid: self.truth(sid) for sid in ids}
+
+    def info_for(self, station_id):
+        is_up, since = self.truth(station_id)
+        return {"status": {"is_up": is_up, "since": _iso(since)}}
+
+    def _status_for(self, station_id):
+        if self._bucket(station_id, self.not_found_every):
+            return 404
+        if self.error_rate:
+            with self._lock:
+                if self._rng.random() < self.error_rate:
+                    return 500
+        return 200
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                path = self.path.split("?", 1)[0]
+                if path == TRUTH_PATH:
+                    self._send(200, json.dumps(server.all_truth()).encode())
+                    return
+                if not (path.startswith(INFO_PATH_PREFIX) and path.endswith("/info")):
+                    self.send_error(404)
+                    return
+                station_id = path[len(INFO_PATH_PREFIX):-len("/info")]
+                time.sleep(server.latency_for(station_id))
+                code = server._status_for(station_id)
+                with server._lock:
+                    server.responses[code] += 1
+                if code == 200:
+                    body = json.dumps(server.info_for(station_id)).encode()
+                else:
+                    body = json.dumps({"error": code}).encode()
+                self._send(code, body)
+
+            def _send(self, code, body):
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-onocoy", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Mock Onocoy explorer API")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--latency-jitter", type=float, default=0.0)
+    ap.add_argument("--slow-every", type=int, default=0, help="every Nth station is slow (0 = none)")
+    ap.add_argument("--slow-latency", type=float, default=1.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    ap.add_argument("--not-found-every", type=int, default=0, help="every Nth station answers 404")
+    ap.add_argument("--flip-mean", type=float, default=0.0, help="mean seconds between status flips (0 = never)")
+    ap.add_argument("--seed", type=int, default=None)
+    args = ap.parse_args()
+    srv = MockOnocoyServer(
+        port=args.port,
+        latency_sec=args.latency,
+        latency_jitter_sec=args.latency_jitter,
+        slow_every=args.slow_every,
+        slow_latency_sec=args.slow_latency,
+        error_rate=args.error_rate,
+        not_found_every=args.not_found_every,
+        flip_mean_sec=args.flip_mean,
+        seed=args.seed,
+    ).start()
+    print(f"Mock Onocoy API on {srv.base_url} (Ctrl+C to stop)", flush=True)
+    print(f"  ONOCOY_API_BASE_URL={srv.base_url} python3 web_server.py", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        srv.stop()
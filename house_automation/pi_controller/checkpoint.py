@@ -0,0 +1,209 @@
+"""
+Write-behind checkpoint of controller state for warm restarts.
+
+Components register a named (snapshot_fn, restore_fn) pair. `mark_dirty()` is
+cheap and can be called from any thread; a background flusher writes one
+compact JSON file atomically (tmp + fsync + rename) once changes have settled
+(`debounce_sec`) and never more often than `min_interval_sec`, so the SD card
+sees at most a few small writes per minute.
+
+At startup `restore()` reads the file once and hands each section back to its
+restore_fn (target: well under 100 ms). Restored data should be treated as
+stale until fresh packets arrive.
+
+Example:
+    cp = Checkpointer("logs/checkpoint.json")
+    cp.register("hydration", handler.snapshot_checkpoint, handler.restore_checkpoint)
+    cp.restore()
+    cp.start()
+    cp.mark_dirty()   # after any change worth keeping
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import thread_registry
+
+logger = logging.getLogger("PiController")
+
+CHECKPOINT_FORMAT = 1
+
+
+def atomic_write_bytes(path, data):
+    """Write `data` to `path` so readers see either the old or the new file, never a torn one."""
+    tmp = path + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+    # fsync the directory so the rename itself survives power loss.
+    try:
+        dfd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+    except OSError:
+        pass
+
+
+class Checkpointer:
+    def __init__(self, path, debounce_sec=2.0, min_interval_sec=30.0, periodic_sec=300.0):
+        self.path = path
+        self.debounce_sec = float(debounce_sec)
+        self.min_interval_sec = float(min_interval_sec)
+        # Also checkpoint every `periodic_sec` so slow-moving data (log tail) is captured.
+        self.periodic_sec = float(periodic_sec)
+        self._sections = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._dirty_since = None
+        self._last_mark = 0.0
+        self._last_write = 0.0
+        self._running = False
+        self._thread = None
+        self.stats = {
+            "writes": 0,
+            "bytes_written": 0,
+            "last_write_ts": None,
+            "last_error": "",
+            "restored_at": None,
+            "restore_ms": None,
+            "restored_age_sec": None,
+        }
+
+    def register(self, name, snapshot_fn, restore_fn=None):
+        with self._lock:
+            self._sections[name] = (snapshot_fn, restore_fn)
+
+    def mark_dirty(self, *_args):
+        """Request a checkpoint (debounced). Accepts and ignores subscriber args."""
+        now = time.time()
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = now
+            self._last_mark = now
+        self._wake.set()
+
+    def restore(self):
+        """Load the checkpoint file and hand each section to its restore_fn. Returns restored names."""
+        t0 = time.perf_counter()
+        try:
+            with open(self.path, "rb") as f:
+                doc = json.loads(f.read())
+        except FileNotFoundError:
+            logger.info("Checkpoint: no file at %s (cold start)", self.path)
+            return []
+        except Exception as e:
+            logger.warning("Checkpoint: unreadable %s, ignoring: %s", self.path, e)
+            return []
+
+        if not isinstance(doc, dict) or doc.get("format") != CHECKPOINT_FORMAT:
+            logger.warning("Checkpoint: unknown format in %s, ignoring", self.path)
+            return []
+
+        restored = []
+        sections = doc.get("sections") or {}
+        with self._lock:
+            handlers = dict(self._sections)
+        for name, (_snap, restore_fn) in handlers.items():
+            if restore_fn is None or name not in sections:
+                continue
+            try:
+                restore_fn(sections[name])
+                restored.append(name)
+            except Exception as e:
+                logger.warning("Checkpoint: restore of '%s' failed: %s", name, e)
+
+        ms = (time.perf_counter() - t0) * 1000.0
+        saved_ts = doc.get("ts")
+        self.stats["restored_at"] = time.time()
+        self.stats["restore_ms"] = round(ms, 2)
+        self.stats["restored_age_sec"] = round(time.time() - saved_ts, 1) if saved_ts else None
+        logger.info(
+            "Checkpoint: restored %s in %.1f ms (saved %ss ago)",
+            ",".join(restored) or "nothing",
+            ms,
+            self.stats["restored_age_sec"],
+        )
+        return restored
+
+    def flush(self):
+        """Snapshot all sections and write them now. Returns True on success."""
+        with self._lock:
+            handlers = dict(self._sections)
+            self._dirty_since = None
+        sections = {}
+        for name, (snapshot_fn, _restore) in handlers.items():
+            try:
+                sections[name] = snapshot_fn()
+            except Exception as e:
+                logger.warning("Checkpoint: snapshot of '%s' failed: %s", name, e)
+        doc = {"format": CHECKPOINT_FORMAT, "ts": time.time(), "sections": sections}
+        try:
+            data = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+            atomic_write_bytes(self.path, data)
+        except Exception as e:
+            self.stats["last_error"] = str(e)
+            logger.warning("Checkpoint: write failed: %s", e)
+            return False
+        self._last_write = time.time()
+        self.stats["writes"] += 1
+        self.stats["bytes_written"] += len(data)
+        self.stats["last_write_ts"] = self._last_write
+        logger.debug("Checkpoint: wrote %d bytes", len(data))
+        return True
+
+    def _next_due(self):
+        with self._lock:
+            if self._dirty_since is None:
+                return self._last_write + self.periodic_sec
+            settled = self._last_mark + self.debounce_sec
+            # Keep debouncing from starving writes under a constant stream of marks.
+            settled = min(settled, self._dirty_since + self.min_interval_sec)
+            return max(settled, self._last_write + self.min_interval_sec)
+
+    def _run(self):
+        logger.info(
+            "Checkpoint writer started (%s, debounce %.1fs, min interval %.0fs)",
+            self.path, self.debounce_sec, self.min_interval_sec,
+        )
+        thread_registry.register()
+        while self._running:
+            wait = self._next_due() - time.time()
+            thread_registry.beat(max(0.0, wait))
+            if wait > 0:
+                self._wake.wait(timeout=wait)
+                self._wake.clear()
+                continue
+            self.flush()
+        thread_registry.unregister()
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        # Don't write immediately after a restore; the first real change starts the clock.
+        self._last_write = time.time()
+        self._thread = threading.Thread(target=self._run, name="checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self, final_flush=True, timeout=2.0):
+        self._running = False
+        self._wake.set()
+        # Let an in-progress write finish first: both would use the same .tmp file.
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        if final_flush:
+            self.flush()
+
+    def health(self):
+        out = dict(self.stats)
+        out["path"] = self.path
+        out["dirty"] = self._dirty_since is not None
+        return out
@@ -0,0 +1,220 @@
+"""
+Per-host circuit breakers for outbound HTTP (CoinGecko, Onocoy, Adafruit IO,
+servo box).
+
+Each external host gets one breaker:
+
+- closed: requests go out; `failure_threshold` consecutive failures open it,
+- open: calls fail immediately with CircuitOpenError until the reset timeout
+  (or the server's Retry-After) has passed,
+- half-open: one probe request is let through; success closes the breaker,
+  failure re-opens it with a doubled timeout (up to `max_reset_timeout_sec`).
+
+Timeouts, connection errors, HTTP 5xx and 429 count as failures; a 429 opens
+the breaker at once for Retry-After seconds. Other 4xx mean the host is up.
+
+Example:
+    r = circuit_breaker.request("post", config.AIO_FEED_URL, json={...}, timeout=5,
+                                failure_threshold=3, reset_timeout_sec=30)
+    # raises CircuitOpenError while Adafruit IO is known down
+
+    breaker = circuit_breaker.for_url(url)
+    if breaker.allow():
+        ...                       # do the call yourself
+        breaker.record_success()  # or breaker.record_failure(retry_after=...)
+
+    circuit_breaker.snapshot()    # -> {"api.coingecko.com": {"state": "open", ...}, ...}
+"""
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("WebServer")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a host whose breaker is open."""
+
+    def __init__(self, name, retry_in_sec):
+        self.name = name
+        self.retry_in_sec = retry_in_sec
+        super().__init__(f"circuit open for {name} (retry in {retry_in_sec:.0f}s)")
+
+
+def parse_retry_after(value, now=None):
+    """Retry-After header (seconds or HTTP date) -> seconds, or None."""
+    if not value:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, when - (time.time() if now is None else now))
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=3, reset_timeout_sec=30.0, max_reset_timeout_sec=600.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout_sec = float(reset_timeout_sec)
+        self.max_reset_timeout_sec = float(max_reset_timeout_sec)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        self._timeout = self.reset_timeout_sec
+        self._probe_in_flight = False
+        self.stats = {
+            "calls": 0,
+            "failures": 0,
+            "rejected": 0,
+            "opened": 0,
+            "last_error": "",
+            "last_change_ts": None,
+        }
+
+    def _set_state(self, state):
+        if state != self._state:
+            logger.warning("Circuit %s: %s -> %s", self.name, self._state, state)
+            self._state = state
+            self.stats["last_change_ts"] = time.time()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._open_until:
+                return HALF_OPEN
+            return self._state
+
+    def retry_in(self):
+        """Seconds until the breaker lets a probe through (0 when closed)."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._open_until - time.monotonic())
+
+    def allow(self):
+        """True if a call may go out now. In half-open only one probe at a time is allowed."""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() < self._open_until:
+                    self.stats["rejected"] += 1
+                    return False
+                self._set_state(HALF_OPEN)
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN:
+                if self._probe_in_flight:
+                    self.stats["rejected"] += 1
+                    return False
+                self._probe_in_flight = True
+            self.stats["calls"] += 1
+            return True
+
+    def check(self):
+        """Like allow() but raises CircuitOpenError."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._timeout = self.reset_timeout_sec
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
+
+    def record_failure(self, error="", retry_after=None):
+        """Count a failure; `retry_after` (seconds, e.g. from a 429) opens the breaker at once."""
+        with self._lock:
+            self._failures += 1
+            self.stats["failures"] += 1
+            self.stats["last_error"] = str(error)[:200]
+            was_probe = self._state == HALF_OPEN
+            self._probe_in_flight = False
+            if retry_after is not None:
+                delay = max(1.0, float(retry_after))
+            elif was_probe:
+                self._timeout = min(self.max_reset_timeout_sec, self._timeout * 2)
+                delay = self._timeout
+            elif self._failures >= self.failure_threshold:
+                delay = self._timeout
+            else:
+                return
+            self._open_until = time.monotonic() + delay
+            if self._state != OPEN:
+                self.stats["opened"] += 1
+            self._set_state(OPEN)
+
+    def as_dict(self):
+        with self._lock:
+            state = self._state
+            retry_in = max(0.0, self._open_until - time.monotonic()) if state == OPEN else 0.0
+            if state == OPEN and retry_in == 0.0:
+                state = HALF_OPEN
+            return dict(
+                self.stats,
+                state=state,
+                consecutive_failures=self._failures,
+                retry_in_sec=round(retry_in, 1),
+                failure_threshold=self.failure_threshold,
+            )
+
+
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def host_of(url):
+    return urlsplit(url).netloc or url
+
+
+def for_url(url, **settings):
+    """Breaker for the URL's host. `settings` only apply when the breaker is first created."""
+    name = host_of(url)
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **settings)
+        return breaker
+
+
+def snapshot():
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.as_dict() for b in breakers}
+
+
+def record_response(breaker, response):
+    """Classify an HTTP response: 429 / 5xx are failures, anything else means the host is up."""
+    code = response.status_code
+    if code == 429:
+        # Rate limited: back off for as long as the server asks (or the reset timeout).
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        breaker.record_failure("HTTP 429", retry_after=retry_after or breaker.reset_timeout_sec)
+    elif code >= 500:
+        breaker.record_failure(f"HTTP {code}")
+    else:
+        breaker.record_success()
+
+
+def request(method, url, session=None, failure_threshold=3, reset_timeout_sec=30.0, **kwargs):
+    """requests.<method>(url, **kwargs) behind the host's breaker. Raises CircuitOpenError when open."""
+    breaker = for_url(url, failure_threshold=failure_threshold, reset_timeout_sec=reset_timeout_sec)
+    breaker.check()
+    if session is None:
+        import requests as session
+    try:
+        r = session.request(method.upper(), url, **kwargs)
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    record_response(breaker, r)
+    return r
@@ -0,0 +1,175 @@
+"""
+Binary codec for the ESP-NOW payloads exchanged with the slaves.
+
+Every payload starts with [type][cmd]. Encoders return `bytes` built with
+precompiled `struct.Struct`s (one pack per message, no hex string
+concatenation); `controller.send_command` accepts those bytes directly.
+
+Types:  0x01 hydration, 0x02 LED strip, 0x03 displays / IR remote
+Layouts (little endian):
+    <BBf    type, cmd, float            most commands and all slave reports
+    <BBI    type, cmd, uint32           LED mode ((mode << 8) | speed), IR NEC code, time sync
+    <BBBBBf type, cmd, r, g, b, float   display color + duration
+    <BBfB   type, cmd, float, len       display text header, followed by UTF-8 text
+    <BBff   type, cmd, float, float     display price (usd, 24h change %)
+
+Example:
+    import codec
+    controller.send_command(mac, codec.led_mode(37, 5))
+    controller.send_command("displays", codec.display_text("250 ml", 3))
+    codec.decode(codec.display_price(0.0123, -2.5))   # -> (3, 0x70, (0.0123..., -2.5))
+"""
+import struct
+
+TYPE_HYDRATION = 0x01
+TYPE_LED = 0x02
+TYPE_DISPLAY = 0x03   # ONO / cam displays and the IR remote share type 3
+
+# Hydration slave (Pi -> slave)
+HYD_SET_LED = 0x10
+HYD_SET_BUZZER = 0x11
+HYD_SET_RGB = 0x12
+HYD_GET_WEIGHT = 0x20
+HYD_TARE = 0x22
+HYD_REQUEST_DAILY_TOTAL = 0x23
+HYD_TIME = 0x31
+HYD_PRESENCE = 0x41
+
+# LED strip
+LED_POWER = 0x10
+LED_RGB = 0x12
+LED_MODE = 0x13
+
+# IR remote
+IR_NEC = 0x31
+
+# Displays
+DISPLAY_HELLO = 0x01      # display -> Pi on boot
+DISPLAY_RAINBOW = 0x50
+DISPLAY_COLOR = 0x51
+DISPLAY_TEXT = 0x60
+DISPLAY_PRICE = 0x70
+
+TEXT_MAX_BYTES = 80
+
+FLOAT_MSG = struct.Struct('<BBf')
+U32_MSG = struct.Struct('<BBI')
+COLOR_MSG = struct.Struct('<BBBBBf')
+TEXT_HEAD = struct.Struct('<BBfB')
+PRICE_MSG = struct.Struct('<BBff')
+
+# Raised by the encoders for out-of-range fields (e.g. a cmd byte > 255).
+error = struct.error
+
+_pack_float = FLOAT_MSG.pack
+_pack_u32 = U32_MSG.pack
+_pack_color = COLOR_MSG.pack
+
+
+def encode_float(ctype, cmd, value=0.0):
+    return _pack_float(ctype, cmd, value)
+
+
+def encode_u32(ctype, cmd, value):
+    return _pack_u32(ctype, cmd, value & 0xFFFFFFFF)
+
+
+# --- Hydration ---
+
+def hydration(cmd, value=0.0):
+    """Generic hydration command with a float argument."""
+    return _pack_float(TYPE_HYDRATION, cmd, float(value))
+
+
+def hydration_time(epoch_sec):
+    return _pack_u32(TYPE_HYDRATION, HYD_TIME, int(epoch_sec) & 0xFFFFFFFF)
+
+
+def hydration_presence(is_home):
+    return _pack_float(TYPE_HYDRATION, HYD_PRESENCE, 1.0 if is_home else 0.0)
+
+
+# --- LED strip ---
+
+def led_power(on):
+    return _pack_float(TYPE_LED, LED_POWER, 1.0 if on else 0.0)
+
+
+def led_rgb(color_id):
+    return _pack_float(TYPE_LED, LED_RGB, float(color_id))
+
+
+def led_mode(mode, speed):
+    # Firmware reads a uint32: low byte = speed, next byte = mode.
+    return _pack_u32(TYPE_LED, LED_MODE, ((int(mode) & 0xFF) << 8) | (int(speed) & 0xFF))
+
+
+# --- IR remote ---
+
+def ir_nec(code):
+    """NEC code as int or hex string (e.g. "F7C03F")."""
+    if isinstance(code, str):
+        code = int(code, 16)
+    return _pack_u32(TYPE_DISPLAY, IR_NEC, code)
+
+
+# --- Displays ---
+
+def display_rainbow(duration_sec):
+    return _pack_float(TYPE_DISPLAY, DISPLAY_RAINBOW, float(duration_sec))
+
+
+def _byte(v):
+    v = int(v)
+    return 0 if v < 0 else 255 if v > 255 else v
+
+
+def display_color(r, g, b, duration_sec):
+    return _pack_color(TYPE_DISPLAY, DISPLAY_COLOR, _byte(r), _byte(g), _byte(b), float(duration_sec))
+
+
+def display_text(text, duration_sec):
+    raw = (text or "").encode("utf-8")[:TEXT_MAX_BYTES]
+    return TEXT_HEAD.pack(TYPE_DISPLAY, DISPLAY_TEXT, float(duration_sec), len(raw)) + raw
+
+
+def display_price(price_usd, change_24h):
+    return PRICE_MSG.pack(TYPE_DISPLAY, DISPLAY_PRICE, float(price_usd), float(change_24h))
+
+
+# Fixed payloads used on hot paths.
+LED_ON = led_power(True)
+LED_OFF = led_power(False)
+HYD_TARE_MSG = hydration(HYD_TARE)
+HYD_GET_WEIGHT_MSG = hydration(HYD_GET_WEIGHT)
+
+
+# --- Decoding ---
+
+_DECODERS = {
+    (TYPE_LED, LED_MODE): U32_MSG,
+    (TYPE_DISPLAY, IR_NEC): U32_MSG,
+    (TYPE_HYDRATION, HYD_TIME): U32_MSG,
+    (TYPE_DISPLAY, DISPLAY_COLOR): COLOR_MSG,
+    (TYPE_DISPLAY, DISPLAY_PRICE): PRICE_MSG,
+}
+
+
+def decode_report(data):
+    """Slave -> Pi report: 6-byte (type, cmd, float). Raises struct.error on other sizes."""
+    return FLOAT_MSG.unpack(data)
+
+
+def decode(data):
+    """Any known payload -> (type, cmd, fields tuple). Text decodes to (duration, text)."""
+    data = bytes(data)
+    if len(data) < 2:
+        raise ValueError("payload shorter than type + cmd")
+    key = (data[0], data[1])
+    if key == (TYPE_DISPLAY, DISPLAY_TEXT):
+        _t, _c, duration, n = TEXT_HEAD.unpack_from(data)
+        text = data[TEXT_HEAD.size:TEXT_HEAD.size + n].decode("utf-8", errors="replace")
+        return data[0], data[1], (duration, text)
+    st = _DECODERS.get(key, FLOAT_MSG)
+    values = st.unpack(data[:st.size]) if len(data) >= st.size else FLOAT_MSG.unpack(data)
+    return values[0], values[1], values[2:]
@@ -16,8 +16,32 @@ SLAVE_MACS = {
     'cam_display': '24:DC:C3:AC:B4:14',
 }
 
-# Default Port
-SERIAL_PORT = '/dev/serial0'
+# Device groups: one send reaches every member (SLAVE_MACS names or raw MACs).
+# controller.send_command('<group>', hex) sends one TXM multicast line when the
+# master supports it, else all TX lines in a single serial write.
+DEVICE_GROUPS = {
+    'displays': ['ono_display', 'cam_display'],
+}
+
+# Default Port (override e.g. with the pty of benchmarks/master_sim.py for load tests)
+SERIAL_PORT = os.getenv('SERIAL_PORT', '/dev/serial0')
+WEB_PORT = int(os.getenv('WEB_PORT', '5000'))
+
+# Binary serial framing (length-prefixed + CRC, see serial_framing.py) when the master advertises
+# BIN in its CAPS line; otherwise, or with this set to 0, the link stays on text lines.
+SERIAL_BINARY_FRAMING = os.getenv('SERIAL_BINARY_FRAMING', '1') == '1'
+
+# Presence tracker (presence_tracker.py): phones (SLAVE_MACS names or raw MACs) probed
+# concurrently in the background; HOME if any answers. AWAY needs PRESENCE_AWAY_CONFIRM misses in
+# a row (sleeping phones drop pings). Probes run at the fast interval while a change is being
+# confirmed, inside PRESENCE_FAST_WINDOWS and near the times of day recent transitions happened.
+PRESENCE_TRACKING = os.getenv('PRESENCE_TRACKING', '1') == '1'
+PRESENCE_DEVICES = ['my_phone']
+PRESENCE_INTERVAL_SEC = 60
+PRESENCE_FAST_INTERVAL_SEC = 10
+PRESENCE_HOME_CONFIRM = 1
+PRESENCE_AWAY_CONFIRM = 3
+PRESENCE_FAST_WINDOWS = [('09:45', '10:05'), ('16:45', '17:05')]   # ahead of the morning / evening rules
 
 # Adafruit IO Configuration
 AIO_USERNAME = os.getenv('AIO_USERNAME', 'babbiramithun')
@@ -32,3 +56,97 @@ LIGHT_CMDS = {
     'neon': {'on': 'SWITCHON3', 'off': 'SWITCHOFF3'},
     'spot': {'on': 'SWITCHON1', 'off': 'SWITCHOFF1'}
 }
+
+# Scenes (scenes.py): steps run in parallel unless they list `after` dependencies; the scene
+# returns per-step outcomes at its deadline at the latest. Actions: aio, ir, led, ono, servo_spray.
+SCENE_DEFAULT_DEADLINE_SEC = 8
+SCENES = {
+    'all_on': {'deadline_sec': 6, 'steps': [
+        {'id': 'neon', 'do': 'aio', 'device': 'neon', 'state': 'on'},
+        {'id': 'spot', 'do': 'aio', 'device': 'spot', 'state': 'on'},
+        {'id': 'ir', 'do': 'ir', 'code': 'F7C03F', 'force': True},
+        {'id': 'led', 'do': 'led', 'state': 'on', 'force': True},
+    ]},
+    'all_off': {'deadline_sec': 6, 'steps': [
+        {'id': 'neon', 'do': 'aio', 'device': 'neon', 'state': 'off'},
+        {'id': 'spot', 'do': 'aio', 'device': 'spot', 'state': 'off'},
+        {'id': 'ir', 'do': 'ir', 'code': 'F740BF', 'force': True},
+        {'id': 'led', 'do': 'led', 'state': 'off', 'force': True},
+    ]},
+    'morning': {'steps': [
+        {'id': 'led', 'do': 'led', 'state': 'on'},
+        {'id': 'ir', 'do': 'ir', 'code': 'F7C03F'},
+    ]},
+    'evening': {'steps': [
+        {'id': 'neon', 'do': 'aio', 'device': 'neon', 'state': 'on'},
+        {'id': 'spot', 'do': 'aio', 'device': 'spot', 'state': 'on'},
+    ]},
+}
+
+# /api/data?wait=N long poll: the dashboard's request blocks on the hydration state's
+# wait_for_change() until a new version or this many seconds (then 304).
+DATA_LONG_POLL_MAX_SEC = 25
+
+# Command latency tracing (tracing.py, /api/debug/traces): API request -> serial write -> ACKs.
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '1') == '1'
+
+# Sampling profiler (profiler.py, /api/debug/profile?seconds=N): off unless enabled here or with
+# PROFILER_ENABLED=1. Requests are capped at PROFILER_MAX_SEC and PROFILER_MAX_HZ.
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '0') == '1'
+PROFILER_DEFAULT_HZ = 50
+PROFILER_MAX_HZ = 200
+PROFILER_MAX_SEC = 60
+
+# Thread registry (thread_registry.py): service threads beat once per loop; one that is more than
+# THREAD_STALL_GRACE_SEC past its next expected beat is reported stalled (/api/health, /api/metrics).
+THREAD_STALL_GRACE_SEC = 30
+THREAD_MONITOR_INTERVAL_SEC = 10
+
+# Flight recorder (flight_recorder.py): a record every FLIGHT_RECORDER_INTERVAL_SEC into a fixed-size
+# mmap ring covering the last FLIGHT_RECORDER_MINUTES, msync'ed every FLIGHT_RECORDER_SYNC_SEC.
+# Read it back after a crash with /api/debug/last_health.
+FLIGHT_RECORDER_PATH = os.getenv('FLIGHT_RECORDER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'flight_recorder.bin'))
+FLIGHT_RECORDER_INTERVAL_SEC = 1
+FLIGHT_RECORDER_MINUTES = 60
+FLIGHT_RECORDER_SYNC_SEC = 5
+
+# Device shadow: skip re-sending LED/IR/display/price state the device already has.
+# Entries expire after this many seconds so hand-changed or rebooted devices get re-synced.
+SHADOW_TTL_SEC = 300
+
+# ONO price on the displays: pushed only when the price moves by this many percent or the
+# 24h change by this many points, on a display hello (boot), and as a safety refresh.
+# The refresh must stay well below the displays' NO_DATA_MS "PI down" watchdog (420 s).
+ONO_PRICE_PUSH_THRESHOLD_PCT = 0.5
+ONO_CHANGE_PUSH_THRESHOLD_PTS = 0.5
+ONO_PRICE_REFRESH_SEC = 150
+
+# Automation rules (rules_engine.py): triggers, conditions and actions in a JSON file,
+# re-read automatically when it changes (checked every RULES_RELOAD_CHECK_SEC).
+RULES_PATH = os.getenv('RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json'))
+RULES_RELOAD_CHECK_SEC = 2
+
+# Warm-restart checkpoint (logs/checkpoint.json): wait for changes to settle,
+# and never write more often than the min interval (SD card wear).
+CHECKPOINT_DEBOUNCE_SEC = 2
+CHECKPOINT_MIN_INTERVAL_SEC = 30
+
+# Onocoy station poller: stations are fetched concurrently through a bounded pool.
+# Base URL of the Onocoy explorer API; point at benchmarks/mock_onocoy_server.py for offline load tests.
+ONOCOY_API_BASE_URL = os.getenv('ONOCOY_API_BASE_URL', 'https://api.onocoy.com').rstrip('/')
+ONOCOY_POLL_CONCURRENCY = int(os.getenv('ONOCOY_POLL_CONCURRENCY', '8'))
+ONOCOY_CONNECT_TIMEOUT_SEC = 3
+ONOCOY_READ_TIMEOUT_SEC = 10
+ONOCOY_POLL_JITTER_SEC = 1.0   # spread request start times over this window
+ONOCOY_MIN_FLUSH_INTERVAL_SEC = 60   # onocoy_stations.json written at most this often (only when changed)
+ONOCOY_HISTORY_RETENTION_DAYS = 400  # status transitions kept in onocoy_history.log
+
+# Circuit breakers per external host (circuit_breaker.py): consecutive failures
+# before failing fast, and seconds before one probe request is let through.
+# A 429 opens the breaker at once for the server's Retry-After.
+BREAKER_SETTINGS = {
+    'aio': {'failure_threshold': 3, 'reset_timeout_sec': 30},
+    'servo': {'failure_threshold': 1, 'reset_timeout_sec': 15},   # dead servo box: abort the spray at once
+    'coingecko': {'failure_threshold': 2, 'reset_timeout_sec': 120},
+    'onocoy': {'failure_threshold': 5, 'reset_timeout_sec': 30},   # 404 (unknown station) is not a failure
+}
@@ -5,11 +5,17 @@ import queue
 import logging
 import sys
 import re
-import struct
 import config
-import subprocess
+import codec
+import serial_framing
+import tracing
+import thread_registry
 from collections import deque
 
+from device_shadow import DeviceShadow
+from delivery_tracker import DeliveryTracker
+from presence_tracker import PresenceTracker
+
 # Import Handlers
 from handlers.hydration import HydrationHandler
 from handlers.led import LEDHandler
@@ -40,12 +46,40 @@ class SerialController:
         # Ring buffer of raw lines from master (for dashboard log)
         self._serial_log = deque(maxlen=500)
         self._log_lock = threading.Lock()
+        # Serialises frame writes with their master-ACK slots (Flask threads, IR scheduler, rules, scenes).
+        self._send_lock = threading.Lock()
+        # Last commanded state per device; lets send_command skip redundant frames.
+        self.shadow = DeviceShadow(ttl_sec=config.SHADOW_TTL_SEC)
+        # Master firmware features from its "CAPS:..." line (TXM = multicast, DLV = per-peer ACK lines).
+        self.master_caps = set()
+        # A frame the device never ACKed did not change its state: drop the shadow so it is re-sent.
+        self.delivery = DeliveryTracker(on_failure=lambda mac: self.shadow.invalidate(mac))
+        # Binary framing once the master advertised BIN (see serial_framing); text lines otherwise.
+        self.binary_framing = False
+        self._splitter = serial_framing.StreamSplitter()
+        # Text framing: the master answers every TX/TXM line (OK:Sent, ERR:...); matched in order for tracing.
+        self.master_acks = tracing.MasterAckMatcher()
+        self.link_stats = {"rx_lines": 0, "rx_frames": 0, "frame_errors": 0, "bytes_in": 0, "bytes_out": 0}
+        self.last_rx_time = None    # time.monotonic() of the last bytes from the master
+        # Automation events (hydration reports, presence changes) go here, e.g. RulesEngine.publish.
+        self.event_sink = None
         self.last_presence_check = {
             "result": None,           # True=HOME, False=AWAY
             "method": "none",         # l2ping / hcitool / fallback_away
             "error": "",
             "timestamp": 0.0,
         }
+        # Phones probed in the background; is_phone_home() answers from its cached state.
+        self.presence = PresenceTracker(
+            [config.SLAVE_MACS.get(d, d) for d in config.PRESENCE_DEVICES],
+            on_change=self._presence_changed,
+            on_check=self._record_presence_check,
+            interval_sec=config.PRESENCE_INTERVAL_SEC,
+            fast_interval_sec=config.PRESENCE_FAST_INTERVAL_SEC,
+            home_confirm=config.PRESENCE_HOME_CONFIRM,
+            away_confirm=config.PRESENCE_AWAY_CONFIRM,
+            fast_windows=config.PRESENCE_FAST_WINDOWS,
+        )
 
         # Initialize Handlers
         self.handlers = {
@@ -75,6 +109,7 @@ class SerialController:
             if getattr(self, "watchdog", None):
                 self.watchdog.serial_conn = self.serial_conn
             logger.info(f"Reconnected to {self.port} at {self.baud_rate} baud.")
+            self._query_caps()
             return True
         except serial.SerialException as e:
             logger.warning(f"Reconnect failed: {e}")
@@ -87,27 +122,56 @@ class SerialController:
             time.sleep(0.1)
             self.serial_conn.dtr = True
             logger.info(f"Connected to {self.port} at {self.baud_rate} baud.")
+            self._query_caps()
             return True
         except serial.SerialException as e:
             logger.error(f"Failed to connect to serial port: {e}")
             return False
 
+    def _query_caps(self):
+        """Ask the master what it supports; old firmware ignores the line and stays on plain TX."""
+        self.master_caps = set()
+        self.binary_framing = False
+        self._splitter = serial_framing.StreamSplitter()
+        self.master_acks.clear()
+        self._write_serial("CAPS?\n")
+
+    def _negotiate_framing(self):
+        """The master accepts frames as soon as it advertises BIN; BIN:1 switches its replies too."""
+        if "BIN" in self.master_caps and config.SERIAL_BINARY_FRAMING:
+            self.binary_framing = True
+            self._write_serial("BIN:1\n")
+        else:
+            self.binary_framing = False
+
     def reader_thread(self):
         logger.info("Reader thread started.")
+        thread_registry.register(expect_sec=10)
         while self.running:
+            thread_registry.beat()
             try:
                 if not self.serial_conn or not self.serial_conn.is_open:
                     self._reconnect_serial()
                     if not self.serial_conn:
                         time.sleep(5)
                     continue
-                if self.serial_conn.in_waiting > 0:
-                    line = self.serial_conn.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        with self._log_lock:
-                            self._serial_log.append({"t": time.time(), "line": line})
+                waiting = self.serial_conn.in_waiting
+                if waiting > 0:
+                    chunk = self.serial_conn.read(waiting)
+                    self.link_stats["bytes_in"] += len(chunk)
+                    self.last_rx_time = time.monotonic()
+                    # Text lines and binary frames can share the stream (see serial_framing).
+                    for is_frame, item in self._splitter.feed(chunk):
                         self.watchdog.pet()
-                        self.process_incoming_data(line)
+                        if is_frame:
+                            self.process_frame(item)
+                            continue
+                        line = item.decode('utf-8', errors='ignore').strip()
+                        if line:
+                            with self._log_lock:
+                                self._serial_log.append({"t": time.time(), "line": line})
+                            self.link_stats["rx_lines"] += 1
+                            self.process_incoming_data(line)
                 else:
                     # Avoid busy-loop: sleep when no data (major cause of high CPU / Pi instability)
                     time.sleep(0.02)
@@ -118,6 +182,16 @@ class SerialController:
             except Exception as e:
                 logger.error(f"Error reading from serial: {e}")
                 time.sleep(1) 
+        thread_registry.unregister()
+
+    def emit(self, kind, key=None, **data):
+        """Hand an automation event to the event sink (no-op until one is set)."""
+        sink = self.event_sink
+        if sink is not None:
+            try:
+                sink(kind, key, **data)
+            except Exception as e:
+                logger.debug(f"Event {kind} dropped: {e}")
 
     def _record_presence_check(self, result, method, error=""):
         self.last_presence_check = {
@@ -126,44 +200,37 @@ class SerialController:
             "error": str(error) if error else "",
             "timestamp": time.time(),
         }
+        if not result:
+            logger.info("Presence probe: no answer (%s)", error)
 
-    def is_phone_home(self):
-        # PHONE_MAC like "F0:24:F9:0D:90:A4"
-        phone_mac = config.SLAVE_MACS.get('my_phone', "00:00:00:00:00:00") 
-        logger.info(f"Checking presence for {phone_mac}...")
-        errors = []
+    def _presence_changed(self, is_home, check):
+        """Confirmed HOME/AWAY transition from the presence tracker."""
+        if 'hydration' in self.handlers:
+            self.handlers['hydration'].on_presence_change(is_home, check)
+        self.emit("presence", "HOME" if is_home else "AWAY", method=check.get("method", "none"))
 
-        # Method 1: l2ping (Preferred, needs sudo usually)
-        try:
-            # -c 1: count 1, -t 2: timeout 2s
-            subprocess.check_output(["sudo", "l2ping", "-c", "1", "-t", "2", phone_mac], stderr=subprocess.STDOUT)
-            logger.info(f"Presence Confirmed via l2ping.")
-            self._record_presence_check(True, "l2ping")
-            return True
-        except subprocess.CalledProcessError as e:
-            out = (e.output or b"").decode('utf-8', errors='ignore').strip()
-            errors.append(f"l2ping failed: {out or e}")
-        except Exception as e:
-            errors.append(f"l2ping error: {e}")
-
-        # Method 2: hcitool name (Fallback)
-        try:
-            result = subprocess.check_output(["hcitool", "name", phone_mac], stderr=subprocess.STDOUT)
-            output = result.strip().decode('utf-8')
-            if output:
-                logger.info(f"Presence Confirmed via hcitool name: '{output}'")
-                self._record_presence_check(True, "hcitool")
-                return True
-        except Exception as e:
-            errors.append(f"hcitool error: {e}")
+    def is_phone_home(self):
+        """Cached tracker state; probes on every call when the tracker is disabled."""
+        return self.presence.is_home()
 
-        err_msg = "; ".join(errors) if errors else "No presence method succeeded."
-        self._record_presence_check(False, "fallback_away", err_msg)
-        logger.warning("Presence Check Failed (User AWAY): %s", err_msg)
-        logger.info("Presence Check Failed (User AWAY)")
-        return False
+    def check_presence_now(self):
+        """Probe the phones right away (dashboard button); a change still needs the usual confirmations."""
+        return self.presence.probe_now()
 
     def process_incoming_data(self, line):
+        if line.startswith("CAPS:"):
+            self.master_caps = {c.strip() for c in line[5:].split(",") if c.strip()}
+            logger.info(f"Master capabilities: {sorted(self.master_caps)}")
+            self._negotiate_framing()
+            return
+        if line == "OK:BIN":
+            logger.info("Master switched to binary serial framing")
+            return
+        if self.delivery.handle_line(line):
+            return
+        if self.master_acks.is_ack_line(line):
+            self.master_acks.match(line)
+            return
         # Only process RX lines from Master (ignore HEARTBEAT, OK:, ERR:); match RX anywhere in line in case of leading garbage
         match = re.search(r'RX:([0-9A-Fa-f:]+):([0-9A-Fa-f\s]+)', line)
         if match:
@@ -171,40 +238,195 @@ class SerialController:
             hex_data = match.group(2).replace(' ', '').replace('\r', '').strip()
             try:
                 data_bytes = bytes.fromhex(hex_data)
-                
-                # Check for Hydration or Protocol Commands (6 bytes)
-                if len(data_bytes) == 6:
-                    ctype, cmd, val = struct.unpack('<BBf', data_bytes)
-                    if ctype == 1:
-                        self.handlers['hydration'].handle_packet(cmd, val, mac)
-                    elif ctype == 2:
-                        self.handlers['led'].handle_packet(cmd, val, mac)
-                    elif ctype == 3:
-                        self.handlers['ono'].handle_packet(cmd, val, mac)
-                    else:
-                        logger.info(f"UNKNOWN TYPE [{mac}] -> Type:{ctype} Cmd:0x{cmd:02X} Val:{val:.2f}")
-                elif len(data_bytes) >= 2 and data_bytes[0] == 3:
-                    self.handlers['ono'].handle_packet(data_bytes[1], 0, mac)
-                else:
-                    logger.info(f"DATA [{mac}] -> RAW HEX: {hex_data}")
-            except Exception as e:
+            except ValueError as e:
                 logger.error(f"Failed to decode data from {mac}: {e}")
+                return
+            self._dispatch_rx(mac, data_bytes)
 
-    def send_command(self, mac_address, hex_data):
-        command = f"TX:{mac_address}:{hex_data}\n"
+    def process_frame(self, data):
+        """One binary frame from the master (RX report or delivery outcome)."""
         try:
-            if self.serial_conn and self.serial_conn.is_open:
-                self.serial_conn.write(command.encode('utf-8'))
-                with self._log_lock:
-                    self._serial_log.append({"t": time.time(), "line": f">> TX {mac_address} {hex_data}"})
-                logger.info(f"SENT to {mac_address}: {hex_data}")
+            kind, mac, payload = serial_framing.parse_frame(data)
+        except serial_framing.FrameError as e:
+            self.link_stats["frame_errors"] += 1
+            logger.warning(f"Dropped serial frame: {e}")
+            return
+        self.link_stats["rx_frames"] += 1
+        if kind == serial_framing.FRAME_RX:
+            line = f"RX:{mac}:{payload.hex().upper()}"
+        elif kind == serial_framing.FRAME_DELIVERED:
+            line = f"OK:Delivered:{mac}"
+        elif kind == serial_framing.FRAME_DELIVERY_FAILED:
+            line = f"ERR:Delivery:{mac}"
+        else:
+            logger.debug(f"Unknown frame kind 0x{kind:02X} from master")
+            return
+        # Same text as the line the master would have printed, so the dashboard log is unchanged.
+        with self._log_lock:
+            self._serial_log.append({"t": time.time(), "line": line})
+        if kind == serial_framing.FRAME_RX:
+            self._dispatch_rx(mac, payload)
+        else:
+            self.delivery.record(mac, kind == serial_framing.FRAME_DELIVERED)
+
+    def _dispatch_rx(self, mac, data_bytes):
+        """Route a slave payload to its handler by type byte."""
+        try:
+            # Check for Hydration or Protocol Commands (6 bytes)
+            if len(data_bytes) == 6:
+                ctype, cmd, val = codec.decode_report(data_bytes)
+                if ctype == 1:
+                    self.handlers['hydration'].handle_packet(cmd, val, mac)
+                elif ctype == 2:
+                    self.handlers['led'].handle_packet(cmd, val, mac)
+                elif ctype == 3:
+                    self.handlers['ono'].handle_packet(cmd, val, mac)
+                else:
+                    logger.info(f"UNKNOWN TYPE [{mac}] -> Type:{ctype} Cmd:0x{cmd:02X} Val:{val:.2f}")
+            elif len(data_bytes) >= 2 and data_bytes[0] == 3:
+                self.handlers['ono'].handle_packet(data_bytes[1], 0, mac)
             else:
-                logger.error("Serial connection lost. Cannot send.")
+                logger.info(f"DATA [{mac}] -> RAW HEX: {data_bytes.hex().upper()}")
+        except Exception as e:
+            logger.error(f"Failed to decode data from {mac}: {e}")
+
+    def serial_up(self):
+        """True while the serial port to the master is open."""
+        return bool(self.serial_conn and self.serial_conn.is_open)
+
+    def _write_serial(self, data):
+        """Write text lines or binary frames to the master in one call. Returns True if it was written."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            if self.serial_conn and self.serial_conn.is_open:
+                self.serial_conn.write(data)
+                self.link_stats["bytes_out"] += len(data)
+                return True
+            logger.error("Serial connection lost. Cannot send.")
         except (serial.SerialException, OSError) as e:
             logger.error(f"Serial send failed: {e}")
             self._close_serial()
         except Exception as e:
             logger.error(f"Error sending data: {e}")
+        return False
+
+    @staticmethod
+    def _payload(data):
+        """bytes (see codec) or a hex string -> (payload bytes, upper-case hex for the TX line)."""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            payload = bytes(data)
+        else:
+            payload = bytes.fromhex(data)
+        return payload, payload.hex().upper()
+
+    def _sent(self, mac_address, payload, group=None, span=None):
+        self.shadow.record(mac_address, payload)
+        if "DLV" in self.master_caps:
+            self.delivery.expect(mac_address, group=group, span=span)
+
+    def _write_traced(self, data, macs, t_call, lines, group=None):
+        """
+        Write under the send lock with one master-ACK slot per text line reserved first, so
+        slots queue in write order and a fast OK:Sent cannot overtake its slot. Returns the
+        TX spans (None per MAC when untraced), or None if the write failed.
+        """
+        with self._send_lock:
+            slots = self.master_acks.reserve(lines) if not self.binary_framing else []
+            if not self._write_serial(data):
+                self.master_acks.cancel(slots)
+                return None
+            t_written = time.perf_counter()
+        spans = tracing.record_tx(macs, t_call, t_written, group=group)
+        if slots:
+            if lines == 1:
+                self.master_acks.fill(slots, t_written, [spans])
+            else:
+                self.master_acks.fill(slots, t_written, [spans[i:i + 1] if spans else None for i in range(lines)])
+        return spans or [None] * len(macs)
+
+    def send_command(self, mac_address, hex_data, force=False, frames=1):
+        """
+        Send one ESP-NOW frame via the master. Returns True if it was written.
+        `hex_data` is the payload as bytes (built with codec) or as a hex string.
+        State-setting commands already applied on the device are skipped unless
+        `force` (see device_shadow); `frames` is the caller's burst size for the savings counter.
+        Writes made during an API request are traced (see tracing).
+        `mac_address` may also be a group name from config.DEVICE_GROUPS (see send_group).
+        """
+        if mac_address in config.DEVICE_GROUPS:
+            return self.send_group(mac_address, hex_data, force=force, frames=frames)
+        t_call = time.perf_counter()
+        try:
+            payload, hex_data = self._payload(hex_data)
+        except (TypeError, ValueError):
+            logger.error(f"Invalid hex payload for {mac_address}: {hex_data}")
+            return False
+        if self.shadow.should_skip(mac_address, payload, force=force, frames=frames):
+            return False
+        if self.binary_framing:
+            data = serial_framing.encode_tx(mac_address, payload)
+        else:
+            data = f"TX:{mac_address}:{hex_data}\n"
+        spans = self._write_traced(data, [mac_address], t_call, 1)
+        if spans is None:
+            return False
+        span, = spans
+        self._sent(mac_address, payload, span=span)
+        with self._log_lock:
+            self._serial_log.append({"t": time.time(), "line": f">> TX {mac_address} {hex_data}"})
+        logger.info(f"SENT to {mac_address}: {hex_data}")
+        return True
+
+    def group_members(self, group):
+        """MACs of a config.DEVICE_GROUPS group (names resolved via SLAVE_MACS, unset MACs dropped)."""
+        macs = []
+        for member in config.DEVICE_GROUPS.get(group, ()):
+            mac = config.SLAVE_MACS.get(member, member).upper()
+            if mac != '00:00:00:00:00:00' and mac not in macs:
+                macs.append(mac)
+        return macs
+
+    def send_group(self, group, hex_data, force=False, frames=1):
+        """
+        Send the same payload to every member of a device group. Returns how many
+        members it was written for (0 = none: all up to date, or serial down).
+
+        Members whose shadow already holds the payload are skipped. With a master
+        that advertises TXM this is one serial line and the master fans out
+        back-to-back; otherwise all TX lines go out in a single write.
+        """
+        t_call = time.perf_counter()
+        try:
+            payload, hex_data = self._payload(hex_data)
+        except (TypeError, ValueError):
+            logger.error(f"Invalid hex payload for group {group}: {hex_data}")
+            return 0
+        targets = [
+            mac for mac in self.group_members(group)
+            if not self.shadow.should_skip(mac, payload, force=force, frames=frames)
+        ]
+        if not targets:
+            return 0
+        multicast = len(targets) > 1 and "TXM" in self.master_caps
+        if self.binary_framing:
+            if multicast:
+                data = serial_framing.encode_txm(targets, payload)
+            else:
+                data = b"".join(serial_framing.encode_tx(mac, payload) for mac in targets)
+        elif multicast:
+            data = f"TXM:{','.join(targets)}:{hex_data}\n"
+        else:
+            data = "".join(f"TX:{mac}:{hex_data}\n" for mac in targets)
+        spans = self._write_traced(data, targets, t_call, 1 if multicast else len(targets), group=group)
+        if spans is None:
+            return 0
+        for mac, span in zip(targets, spans):
+            self._sent(mac, payload, group=group, span=span)
+        with self._log_lock:
+            self._serial_log.append({"t": time.time(), "line": f">> TX {group}[{len(targets)}] {hex_data}"})
+        logger.info(f"SENT to {group} ({len(targets)} device(s)): {hex_data}")
+        return len(targets)
 
     def get_serial_log(self, limit=200):
         """Return last `limit` lines from master serial (for dashboard)."""
@@ -216,6 +438,27 @@ class SerialController:
         with self._log_lock:
             self._serial_log.append({"t": time.time(), "line": msg})
 
+    def snapshot_log_tail(self, limit=100):
+        """Last `limit` serial log entries for the restart checkpoint."""
+        with self._log_lock:
+            return list(self._serial_log)[-limit:]
+
+    def restore_log_tail(self, entries):
+        """Prefill the serial log from a checkpoint so the dashboard log isn't blank after restart."""
+        restored = [
+            {"t": float(e["t"]), "line": str(e["line"])}
+            for e in (entries or [])
+            if isinstance(e, dict) and "t" in e and "line" in e
+        ]
+        if not restored:
+            return
+        with self._log_lock:
+            current = list(self._serial_log)
+            self._serial_log.clear()
+            self._serial_log.extend(restored)
+            self._serial_log.append({"t": time.time(), "line": "-- restored from checkpoint (pre-restart lines above) --"})
+            self._serial_log.extend(current)
+
     def health(self):
         """Return dict with serial status and last activity for monitoring."""
         with self._log_lock:
@@ -225,6 +468,12 @@ class SerialController:
             "serial_port": self.port,
             "last_line_time": last["t"] if last else None,
             "log_entries": len(self._serial_log),
+            "shadow": self.shadow.stats(),
+            "master_caps": sorted(self.master_caps),
+            "framing": "binary" if self.binary_framing else "text",
+            "link": dict(self.link_stats, dropped=self._splitter.dropped, crc_errors=self._splitter.crc_errors),
+            "delivery": self.delivery.stats(),
+            "presence": self.presence.stats(),
         }
 
     def start(self, headless=False):
@@ -237,8 +486,11 @@ class SerialController:
         self.watchdog = WatchdogThread(self.serial_conn)
         self.watchdog.start()
 
+        if config.PRESENCE_TRACKING:
+            self.presence.start()
+
         # Start Reader
-        self.read_thread = threading.Thread(target=self.reader_thread)
+        self.read_thread = threading.Thread(target=self.reader_thread, name="serial-reader")
         self.read_thread.daemon = True
         self.read_thread.start()
         
@@ -293,7 +545,7 @@ class SerialController:
 
 class WatchdogThread(threading.Thread):
     def __init__(self, serial_conn, timeout=60):
-        super().__init__()
+        super().__init__(name="serial-watchdog")
         self.serial_conn = serial_conn
         self.timeout = timeout
         self.last_pet = time.time()
@@ -308,12 +560,15 @@ class WatchdogThread(threading.Thread):
 
     def run(self):
         logger.info("Watchdog started.")
+        thread_registry.register(expect_sec=2)
         while self.running:
+            thread_registry.beat()
             time.sleep(1)
             if time.time() - self.last_pet > self.timeout:
                 logger.critical(f"WATCHDOG TRIGGERED! Last output was {time.time() - self.last_pet:.1f}s ago. Resetting Master via DTR...")
                 self.reset_master()
                 self.pet() # Reset timer to avoid loop while resetting
+        thread_registry.unregister()
 
     def reset_master(self):
         if not self.serial_conn or not self.serial_conn.is_open:
@@ -0,0 +1,130 @@
+"""
+Per-device ESP-NOW delivery tracking from the master's ACK lines.
+
+Masters that advertise `DLV` in their CAPS line print one line per frame once
+the radio knows the outcome:
+
+    OK:Delivered:<MAC>     peer ACKed the frame
+    ERR:Delivery:<MAC>     no ACK after the radio's retries
+
+`expect(mac)` is called for every frame written (single TX or one member of a
+group send); the matching ACK line closes the oldest pending frame for that
+MAC. Frames without an answer within `timeout_sec` count as unconfirmed.
+
+Example:
+    tracker = DeliveryTracker(on_failure=shadow.invalidate)
+    tracker.expect("C0:CD:D6:85:70:CC", group="displays")
+    tracker.handle_line("OK:Delivered:C0:CD:D6:85:70:CC")   # -> True
+    tracker.stats()["devices"]["C0:CD:D6:85:70:CC"]["delivered"]   # -> 1
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("PiController")
+
+DELIVERED_PREFIX = "OK:Delivered:"
+FAILED_PREFIX = "ERR:Delivery:"
+
+
+class DeliveryTracker:
+    def __init__(self, timeout_sec=2.0, on_failure=None):
+        self.timeout_sec = float(timeout_sec)
+        # Called with the MAC when a frame was not ACKed (e.g. forget its shadow state).
+        self.on_failure = on_failure
+        self._lock = threading.Lock()
+        self._pending = {}      # mac -> deque[(sent_monotonic, group)]
+        self._devices = {}      # mac -> counters
+        self._groups = {}       # group -> {"frames", "delivered", "failed", "unconfirmed"}
+
+    def _device(self, mac):
+        d = self._devices.get(mac)
+        if d is None:
+            d = self._devices[mac] = {
+                "delivered": 0,
+                "failed": 0,
+                "unconfirmed": 0,
+                "last_status": None,
+                "last_latency_ms": None,
+                "last_ts": None,
+            }
+        return d
+
+    def _group(self, name):
+        g = self._groups.get(name)
+        if g is None:
+            g = self._groups[name] = {"frames": 0, "delivered": 0, "failed": 0, "unconfirmed": 0}
+        return g
+
+    def _expire(self, now):
+        for mac, q in self._pending.items():
+            while q and now - q[0][0] > self.timeout_sec:
+                _t, group, _span = q.popleft()
+                self._device(mac)["unconfirmed"] += 1
+                if group:
+                    self._group(group)["unconfirmed"] += 1
+
+    def expect(self, mac, group=None, span=None):
+        """`span` (tracing.Span, optional) gets the radio ACK time when the outcome arrives."""
+        mac = mac.upper()
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._pending.setdefault(mac, deque()).append((now, group, span))
+            if group:
+                self._group(group)["frames"] += 1
+
+    def handle_line(self, line):
+        """Consume a delivery line; returns False for anything else."""
+        if line.startswith(DELIVERED_PREFIX):
+            ok, mac = True, line[len(DELIVERED_PREFIX):]
+        elif line.startswith(FAILED_PREFIX):
+            ok, mac = False, line[len(FAILED_PREFIX):]
+        else:
+            return False
+        self.record(mac, ok)
+        return True
+
+    def record(self, mac, ok):
+        """One delivery outcome for `mac` (from a text line or a binary delivery frame)."""
+        mac = mac.strip().upper()
+        now = time.monotonic()
+        with self._lock:
+            q = self._pending.get(mac)
+            sent_at, group, span = q.popleft() if q else (None, None, None)
+            d = self._device(mac)
+            d["delivered" if ok else "failed"] += 1
+            d["last_status"] = "delivered" if ok else "failed"
+            d["last_ts"] = time.time()
+            if sent_at is not None:
+                d["last_latency_ms"] = round((now - sent_at) * 1000, 1)
+            if group:
+                self._group(group)["delivered" if ok else "failed"] += 1
+        if span is not None:
+            span.radio_ack(ok)
+        if not ok:
+            logger.warning("ESP-NOW delivery to %s failed (no ACK)", mac)
+            if self.on_failure:
+                try:
+                    self.on_failure(mac)
+                except Exception as e:
+                    logger.debug("Delivery failure callback error: %s", e)
+
+    def pending(self):
+        """Frames still waiting for their radio ACK."""
+        with self._lock:
+            return sum(len(q) for q in self._pending.values())
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            devices = {
+                mac: dict(d, pending=len(self._pending.get(mac, ())))
+                for mac, d in self._devices.items()
+            }
+            for mac, q in self._pending.items():
+                if mac not in devices and q:
+                    devices[mac] = dict(self._device(mac), pending=len(q))
+            groups = {name: dict(g) for name, g in self._groups.items()}
+        return {"devices": devices, "groups": groups}
@@ -0,0 +1,179 @@
+"""
+Per-device shadow of the last commanded state, used by the send path to skip
+ESP-NOW frames that would not change anything on the device.
+
+Only commands that set a persistent state are shadowed (see SHADOW_SLOTS):
+LED power/mode/colour, the IR power and colour codes, display content and the
+ONO price. Everything else (time sync, presence replies, tare, IR brightness
+steps and effect buttons such as the alert flash, ...) always goes out.
+
+A command is skipped when the same payload was already sent to the same slot
+of the same MAC and the shadow entry has not expired. Display effects expire
+after their own duration (a 5 s text is gone after 5 s); everything else after
+`ttl_sec`, so a device that rebooted or was changed by hand is re-synced.
+
+Example:
+    shadow = DeviceShadow(ttl_sec=300)
+    if shadow.should_skip(mac, payload):      # payload is bytes
+        return
+    ...write frame...
+    shadow.record(mac, payload)
+"""
+import logging
+import struct
+import threading
+import time
+
+logger = logging.getLogger("PiController")
+
+# (type, cmd) -> slot. All commands mapping to the same slot overwrite each other,
+# e.g. LED ON / colour / mode all describe what the strip currently shows.
+SHADOW_SLOTS = {
+    (0x02, 0x10): "led",       # LED power
+    (0x02, 0x12): "led",       # LED static colour
+    (0x02, 0x13): "led",       # LED mode + speed
+    (0x03, 0x31): "ir",        # IR NEC code (only IR_STATE_CODES)
+    (0x03, 0x50): "display",   # Rainbow (duration float @2)
+    (0x03, 0x51): "display",   # Colour (R G B, duration float @5)
+    (0x03, 0x60): "display",   # Text (duration float @2)
+    (0x03, 0x70): "price",     # ONO price + 24h change
+}
+
+# IR codes are button presses; only the idempotent ones (power, fixed colours) describe a state.
+# Brightness steps and effects (F7D02F flash, used by the bottle alert) must repeat.
+IR_STATE_CODES = frozenset({
+    0xF7C03F,   # ON
+    0xF740BF,   # OFF
+    0xF720DF,   # red
+    0xF7A05F,   # green
+    0xF7609F,   # blue
+    0xF708F7,   # yellow
+})
+
+# Offset of the duration float for display effects (entry expires with the effect).
+_DURATION_OFFSET = {0x50: 2, 0x51: 5, 0x60: 2}
+
+# Rough ESP-NOW airtime per frame at 1 Mbps: preamble/PLCP (~192 us) plus
+# ~43 bytes of 802.11 + vendor-action header, plus the payload itself.
+_FRAME_OVERHEAD_US = 192 + 43 * 8
+_US_PER_BYTE = 8
+
+
+def frame_airtime_us(payload_len):
+    return _FRAME_OVERHEAD_US + payload_len * _US_PER_BYTE
+
+
+class DeviceShadow:
+    def __init__(self, ttl_sec=300):
+        self.ttl_sec = float(ttl_sec)
+        self._lock = threading.Lock()
+        # mac -> slot -> (payload bytes, sent_at, expires_at)
+        self._state = {}
+        self._stats = {
+            "sent_frames": 0,
+            "suppressed_frames": 0,
+            "suppressed_bytes": 0,
+            "airtime_saved_us": 0,
+            "by_slot": {},
+        }
+
+    def _slot_for(self, payload):
+        if len(payload) < 2:
+            return None
+        slot = SHADOW_SLOTS.get((payload[0], payload[1]))
+        if slot == "ir" and (len(payload) < 6 or struct.unpack_from('<I', payload, 2)[0] not in IR_STATE_CODES):
+            return None
+        return slot
+
+    def _expiry(self, payload, now):
+        offset = _DURATION_OFFSET.get(payload[1]) if payload[0] == 0x03 else None
+        if offset is not None and len(payload) >= offset + 4:
+            try:
+                duration = struct.unpack_from('<f', payload, offset)[0]
+                if duration > 0:
+                    return now + min(duration, self.ttl_sec)
+            except struct.error:
+                pass
+        return now + self.ttl_sec
+
+    def should_skip(self, mac, payload, force=False, frames=1):
+        """
+        True if `payload` would not change the device state (and count the saving).
+        `frames` is how many frames the caller would have sent (e.g. IR burst = 3).
+        """
+        slot = self._slot_for(payload)
+        if slot is None or force:
+            return False
+        key = mac.upper()
+        now = time.time()
+        with self._lock:
+            entry = self._state.get(key, {}).get(slot)
+            if not entry or entry[0] != payload or now >= entry[2]:
+                return False
+            st = self._stats
+            st["suppressed_frames"] += frames
+            st["suppressed_bytes"] += frames * len(payload)
+            st["airtime_saved_us"] += frames * frame_airtime_us(len(payload))
+            st["by_slot"][slot] = st["by_slot"].get(slot, 0) + frames
+        logger.debug("Shadow: skipped %s %s for %s (already set)", slot, payload.hex(), mac)
+        return True
+
+    def record(self, mac, payload):
+        """Remember `payload` as the device's current state after a successful write."""
+        with self._lock:
+            self._stats["sent_frames"] += 1
+            slot = self._slot_for(payload)
+            if slot is None:
+                return
+            now = time.time()
+            self._state.setdefault(mac.upper(), {})[slot] = (bytes(payload), now, self._expiry(payload, now))
+
+    def invalidate(self, mac=None, slot=None):
+        """Forget shadow state (all devices, one device, or one slot) so the next command is sent."""
+        with self._lock:
+            if mac is None:
+                self._state.clear()
+                return
+            slots = self._state.get(mac.upper())
+            if not slots:
+                return
+            if slot is None:
+                slots.clear()
+            else:
+                slots.pop(slot, None)
+
+    def get(self, mac):
+        """Current (unexpired) shadow for `mac` as {slot: hex_payload}."""
+        now = time.time()
+        with self._lock:
+            slots = dict(self._state.get(mac.upper(), {}))
+        return {slot: e[0].hex() for slot, e in slots.items() if now < e[2]}
+
+    def stats(self):
+        with self._lock:
+            st = dict(self._stats)
+            st["by_slot"] = dict(self._stats["by_slot"])
+            st["devices"] = len(self._state)
+        total = st["sent_frames"] + st["suppressed_frames"]
+        st["suppressed_pct"] = round(100.0 * st["suppressed_frames"] / total, 1) if total else 0.0
+        st["airtime_saved_ms"] = round(st.pop("airtime_saved_us") / 1000.0, 1)
+        return st
+
+    # --- Checkpoint support (see checkpoint.Checkpointer) ---
+
+    def snapshot_checkpoint(self):
+        with self._lock:
+            return {
+                mac: {slot: [e[0].hex(), e[1], e[2]] for slot, e in slots.items()}
+                for mac, slots in self._state.items()
+            }
+
+    def restore_checkpoint(self, data):
+        now = time.time()
+        restored = {}
+        for mac, slots in (data or {}).items():
+            for slot, (hex_payload, sent_at, expires_at) in (slots or {}).items():
+                if expires_at > now:
+                    restored.setdefault(mac.upper(), {})[slot] = (bytes.fromhex(hex_payload), sent_at, expires_at)
+        with self._lock:
+            self._state = restored
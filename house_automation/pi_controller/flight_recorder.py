@@ -0,0 +1,228 @@
+"""
+Flight recorder: one fixed-width record per second in a memory-mapped ring file.
+
+Replaces the once-a-minute logs/last_health.json rewrite. Every
+`interval_sec` the recorder appends a record (ring_file.py) with system
+memory and load, the process's RSS, threads and CPU, and whatever the
+service-level `probe` reports (serial up, age of the last byte from the
+master, queue depths, stalled threads). The file has a fixed size (one hour
+by default), is msync'ed every few seconds, and a record torn by a power cut
+is skipped by its CRC, so after a freeze or reboot the last minutes before it
+are still there.
+
+Records carry the writer's pid: a restart starts a new session in the same
+ring, and `sessions()` / `window()` split them again, so /api/debug/last_health
+can show the minutes before the previous process ended.
+
+Example:
+    rec = FlightRecorder("logs/flight_recorder.bin", probe=lambda: {"serial_up": 1, "rx_age_ms": 120})
+    rec.start()
+    rec.window(minutes=10, session="previous")
+    # -> {"session": {"pid": 812, "from": ..., "to": ..., "ended": "restart"}, "records": [...], "summary": {...}}
+"""
+import logging
+import math
+import os
+import threading
+import time
+
+import thread_registry
+from ring_file import RingFile
+
+logger = logging.getLogger("WebServer")
+
+FIELDS = [
+    ("ts", "d"),
+    ("pid", "i"),
+    ("mem_avail_kb", "I"),
+    ("load1", "f"),
+    ("rss_kb", "I"),
+    ("threads", "H"),
+    ("cpu_pct", "f"),          # this process, since the previous record
+    ("serial_up", "b"),        # 1 / 0, -1 = controller not running
+    ("rx_age_ms", "i"),        # since the last byte from the master, -1 = never / unknown
+    ("send_queue", "i"),       # -1 = unknown
+    ("ir_queue", "i"),
+    ("rules_queue", "i"),
+    ("dlv_pending", "i"),      # frames waiting for a radio ACK
+    ("ack_pending", "i"),      # lines waiting for the master's OK:Sent
+    ("stalled", "B"),          # stalled + dead registered threads
+]
+PROBE_FIELDS = [n for n, _c in FIELDS[7:]]
+SUMMARY_MAX = ("load1", "rss_kb", "threads", "cpu_pct", "rx_age_ms", "send_queue", "ir_queue",
+               "rules_queue", "dlv_pending", "ack_pending", "stalled")
+
+try:
+    _PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+    _CLK_TCK = os.sysconf("SC_CLK_TCK")
+except (ValueError, OSError, AttributeError):
+    _PAGE_KB, _CLK_TCK = 4, 100
+
+
+def _mem_avail_kb():
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _self_stat():
+    """(rss kB, threads, cpu ticks) of this process from /proc/self/statm and /proc/self/stat."""
+    with open("/proc/self/statm") as f:
+        rss_kb = int(f.read().split()[1]) * _PAGE_KB
+    with open("/proc/self/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return rss_kb, int(fields[17]), int(fields[11]) + int(fields[12])
+
+
+class FlightRecorder:
+    def __init__(self, path, probe=None, interval_sec=1.0, minutes=60, sync_sec=5.0):
+        self.path = path
+        self.probe = probe
+        self.interval_sec = float(interval_sec)
+        capacity = max(10, int(minutes * 60 / self.interval_sec))
+        self.ring = RingFile(path, FIELDS, capacity, sync_every=max(1, int(round(sync_sec / self.interval_sec))))
+        self._pid = os.getpid()
+        self._prev_cpu = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.errors = 0
+
+    def sample(self):
+        """Take one record now (also used by the loop)."""
+        now = time.time()
+        mono = time.monotonic()
+        try:
+            with open("/proc/loadavg") as f:
+                load1 = float(f.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            load1 = math.nan
+        try:
+            mem = _mem_avail_kb()
+        except (OSError, ValueError):
+            mem = 0
+        try:
+            rss_kb, threads, ticks = _self_stat()
+        except (OSError, ValueError, IndexError):
+            rss_kb, threads, ticks = 0, threading.active_count(), None
+        cpu_pct = math.nan
+        if ticks is not None:
+            if self._prev_cpu is not None and mono > self._prev_cpu[1]:
+                cpu_pct = 100.0 * (ticks - self._prev_cpu[0]) / _CLK_TCK / (mono - self._prev_cpu[1])
+            self._prev_cpu = (ticks, mono)
+        extra = {}
+        if self.probe is not None:
+            try:
+                extra = self.probe() or {}
+            except Exception as e:
+                logger.debug("Flight recorder probe failed: %s", e)
+        stalled = extra.get("stalled", 0)
+        values = [now, self._pid, mem, load1, rss_kb, min(65535, threads), cpu_pct]
+        values += [int(extra.get(name, -1)) for name in PROBE_FIELDS[:-1]]
+        values.append(max(0, min(255, int(stalled))))
+        return self.ring.append(*values)
+
+    def _run(self):
+        logger.info("Flight recorder: %s every %gs, %d records", self.path, self.interval_sec, self.ring.capacity)
+        thread_registry.register(expect_sec=self.interval_sec)
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                self.errors += 1
+                logger.debug("Flight recorder sample failed: %s", e)
+            thread_registry.beat()
+            next_t += self.interval_sec
+            delay = next_t - time.monotonic()
+            if delay <= 0:
+                next_t = time.monotonic()
+            elif self._stop.wait(delay):
+                break
+        self.ring.flush()
+        thread_registry.unregister()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="flight-recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    # --- Decoding ---
+
+    def sessions(self, records=None):
+        """Split the ring into runs of one process: [{pid, from, to, records, ended}] oldest first."""
+        records = self.ring.records() if records is None else records
+        out = []
+        for r in records:
+            cur = out[-1] if out else None
+            if cur is None or r["pid"] != cur["pid"] or r["ts"] - cur["to"] > 5 * self.interval_sec:
+                if cur is not None:
+                    cur["ended"] = "restart" if r["pid"] != cur["pid"] else "gap"
+                cur = {"pid": r["pid"], "from": r["ts"], "to": r["ts"], "records": 0, "ended": None}
+                out.append(cur)
+            cur["to"] = r["ts"]
+            cur["records"] += 1
+        if out and out[-1]["ended"] is None:
+            running = out[-1]["pid"] == self._pid and time.time() - out[-1]["to"] < 5 * self.interval_sec
+            out[-1]["ended"] = "running" if running else "stopped"
+        return out
+
+    def window(self, minutes=10, session="previous"):
+        """
+        Records of the last `minutes` of one session: "previous" (the run before this
+        process; what happened before the crash / reboot), "current", or an index into
+        sessions(). Falls back to the current session when there is no earlier one.
+        """
+        records = self.ring.records()
+        sessions = self.sessions(records)
+        if not sessions:
+            return {"session": None, "sessions": [], "records": [], "summary": {}}
+        if session == "current":
+            idx = len(sessions) - 1
+        elif session == "previous":
+            idx = len(sessions) - 2 if len(sessions) > 1 and sessions[-1]["ended"] == "running" else len(sessions) - 1
+        else:
+            idx = int(session)
+        sel = sessions[idx]
+        start = sel["to"] - minutes * 60.0
+        rows = [_clean(r) for r in records if sel["from"] <= r["ts"] <= sel["to"] and r["ts"] >= start]
+        return {
+            "session": sel,
+            "sessions": sessions,
+            "interval_sec": self.interval_sec,
+            "corrupt_records": self.ring.corrupt,
+            "summary": _summary(rows),
+            "records": rows,
+        }
+
+
+def _clean(r):
+    """Record dict for JSON: NaN -> None, floats rounded, sequence number dropped."""
+    out = {}
+    for k, v in r.items():
+        if k == "seq":
+            continue
+        if isinstance(v, float):
+            v = None if math.isnan(v) else round(v, 3 if k == "ts" else 2)
+        out[k] = v
+    return out
+
+
+def _summary(rows):
+    if not rows:
+        return {}
+    out = {"records": len(rows), "mem_avail_kb_min": min(r["mem_avail_kb"] for r in rows)}
+    for k in SUMMARY_MAX:
+        vals = [r[k] for r in rows if r[k] is not None and r[k] >= 0]
+        out[f"{k}_max"] = max(vals) if vals else None
+    out["serial_down_records"] = sum(1 for r in rows if r["serial_up"] == 0)
+    out["last"] = rows[-1]
+    return out
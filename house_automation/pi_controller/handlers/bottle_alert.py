@@ -5,6 +5,8 @@ Loops until stopped. Use text_msg="no bottle" for bottle missing, "plz drink" fo
 import logging
 import threading
 
+import thread_registry
+
 logger = logging.getLogger("PiController")
 
 RAINBOW_SEC = 1
@@ -21,7 +23,9 @@ _current_text_msg = DEFAULT_TEXT_BOTTLE_MISSING
 def _alert_loop(controller):
     """Internal loop: rainbow -> text -> repeat until stop event."""
     global _current_text_msg
+    thread_registry.register(expect_sec=RAINBOW_SEC + TEXT_SEC)
     while not _alert_stop_event.is_set():
+        thread_registry.beat()
         ono = controller.handlers.get("ono") if controller else None
         if not ono:
             break
@@ -47,6 +51,7 @@ def _alert_loop(controller):
         if _alert_stop_event.wait(timeout=TEXT_SEC):
             break
 
+    thread_registry.unregister()
     logger.info("Alert display loop ended")
 
 
@@ -61,7 +66,7 @@ def start(controller, text_msg=None):
             _alert_thread.join(timeout=2)
 
         _alert_stop_event.clear()
-        _alert_thread = threading.Thread(target=_alert_loop, args=(controller,), daemon=True)
+        _alert_thread = threading.Thread(target=_alert_loop, args=(controller,), name="bottle-alert", daemon=True)
         _alert_thread.start()
         logger.info("Alert display started: %s", _current_text_msg)
 
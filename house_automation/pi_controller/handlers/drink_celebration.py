@@ -7,17 +7,18 @@ Shared LED/display defaults:
 - Alert LED: Red pulse mode 39, speed 1
 """
 import logging
-import struct
 import threading
 
+import codec
+
 logger = logging.getLogger("PiController")
 
 DURATION_SEC = 3
 IR_GREEN = "F7A05F"
 IR_DEFAULT = "F7F00F"  # Smooth / default state
-LED_GREEN_HEX = "0212" + struct.pack("<f", 2.0).hex()  # RGB color ID 2 = green
-LED_RAINBOW_DEFAULT_HEX = "0213" + struct.pack("<I", (37 << 8) | 5).hex()  # Rainbow speed 5
-LED_RED_PULSE_ALERT_HEX = "0213" + struct.pack("<I", (38 << 8) | 1).hex()  # Red pulse (mode 38) speed 1
+LED_GREEN = codec.led_rgb(2)  # RGB color ID 2 = green
+LED_RAINBOW_DEFAULT = codec.led_mode(37, 5)  # Rainbow speed 5
+LED_RED_PULSE_ALERT = codec.led_mode(38, 1)  # Red pulse (mode 38) speed 1
 
 _revert_timer = None
 _revert_lock = threading.Lock()
@@ -29,7 +30,7 @@ def revert_led_and_ir_to_default(controller):
         return
     try:
         if "led" in controller.handlers:
-            controller.handlers["led"].send_cmd(LED_RAINBOW_DEFAULT_HEX, "Default (Rainbow)")
+            controller.handlers["led"].send_cmd(LED_RAINBOW_DEFAULT, "Default (Rainbow)")
         if "ir" in controller.handlers:
             controller.handlers["ir"].send_nec(IR_DEFAULT)
         logger.info("Reverted LED and IR to default")
@@ -66,7 +67,7 @@ def trigger(controller, ml):
         if "ono" in controller.handlers:
             controller.handlers["ono"].send_text(text, DURATION_SEC)
         if "led" in controller.handlers:
-            controller.handlers["led"].send_cmd(LED_GREEN_HEX, "Drink (Green)")
+            controller.handlers["led"].send_cmd(LED_GREEN, "Drink (Green)")
         if "ir" in controller.handlers:
             controller.handlers["ir"].send_nec(IR_GREEN)
         logger.info("Drink celebration: %s for %ds", text, DURATION_SEC)
@@ -76,5 +77,6 @@ def trigger(controller, ml):
 
     with _revert_lock:
         _revert_timer = threading.Timer(DURATION_SEC, _revert_to_default, args=[controller])
+        _revert_timer.name = "drink-celebration-revert"
         _revert_timer.daemon = True
         _revert_timer.start()
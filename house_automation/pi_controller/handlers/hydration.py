@@ -1,18 +1,24 @@
 import logging
-import struct
 import time
 from datetime import datetime
 
+import codec
+
 from .drink_celebration import (
     trigger as trigger_drink_celebration,
     revert_led_and_ir_to_default,
-    LED_RED_PULSE_ALERT_HEX,
+    LED_RED_PULSE_ALERT,
 )
 from . import bottle_alert
+from hydration_state import HydrationState, StateCell
 
 logger = logging.getLogger("PiController")
 
 
+# Reset at local midnight by the slave; not carried over from an older day's checkpoint.
+DAY_FIELDS = ('daily_total_ml', 'last_drink_ml', 'last_drink_time')
+
+
 def local_epoch_now():
     """Return local-time epoch seconds (UTC epoch + local UTC offset)."""
     now_local = datetime.now().astimezone()
@@ -23,25 +29,65 @@ def local_epoch_now():
 class HydrationHandler:
     def __init__(self, controller):
         self.controller = controller
-        self.current_data = {
-            'weight': 0.0,
-            'status': 'Waiting for data...',
-            'last_update': 0,
-            'last_drink_ml': 0.0,
-            'last_drink_time': 0,
-            'daily_total_ml': 0.0,
-            'presence_last_state': 'UNKNOWN',
-            'presence_last_checked': 0,
-            'presence_last_method': 'none',
-            'presence_last_error': '',
-        }
+        # Immutable state swapped atomically per packet; readers never see a torn update.
+        self.state = StateCell(HydrationState())
+
+    @property
+    def current_data(self):
+        """Dict view of the current state (kept for callers that expect the old dict)."""
+        return self.state.get().as_dict()
+
+    def _publish(self, **changes):
+        """Publish fresh data from the slave (clears the restored/stale flag)."""
+        self.state.update(stale=False, **changes)
+
+    def snapshot_checkpoint(self):
+        """Fields worth keeping across restarts (see checkpoint.Checkpointer)."""
+        data = self.state.get().as_dict()
+        data.pop('version', None)
+        data.pop('stale', None)
+        data['day'] = datetime.now().strftime('%Y-%m-%d')
+        return data
+
+    def restore_checkpoint(self, data):
+        """
+        Warm start from a checkpoint; values stay marked stale until the slave reports.
+        Day-scoped fields (daily total, last drink) are dropped if the checkpoint is from another day.
+        """
+        data = data or {}
+        allowed = set(HydrationState.__slots__) - {'version', 'stale'}
+        fields = {k: v for k, v in data.items() if k in allowed}
+        day = data.get('day')
+        if day is None and data.get('last_update'):
+            day = datetime.fromtimestamp(data['last_update']).strftime('%Y-%m-%d')
+        if day != datetime.now().strftime('%Y-%m-%d'):
+            for k in DAY_FIELDS:
+                fields.pop(k, None)
+            logger.info("Checkpoint: hydration data from %s, daily values not restored", day or "unknown day")
+        self.state.update(stale=True, **fields)
+
+    def _publish_presence(self, is_home, check):
+        self._publish(
+            presence_last_state='HOME' if is_home else 'AWAY',
+            presence_last_checked=check.get('timestamp', time.time()),
+            presence_last_method=check.get('method', 'none'),
+            presence_last_error=check.get('error', ''),
+        )
+
+    def on_presence_change(self, is_home, check):
+        """HOME/AWAY transition: tell the slave at once so its reminder logic does not wait for 0x40."""
+        self._publish_presence(is_home, check)
+        import config
+        mac = config.SLAVE_MACS.get('hydration', '00:00:00:00:00:00')
+        if mac != '00:00:00:00:00:00':
+            self.controller.send_command(mac, codec.hydration_presence(is_home))
 
     def _trigger_alert_display_and_led(self, display_text="no bottle"):
         """Alert: display loops rainbow(1s)/text(4s), LED red pulse speed 1, IR flash."""
         if 'ir' in self.controller.handlers:
             self.controller.handlers['ir'].send_nec("F7D02F")
         if 'led' in self.controller.handlers:
-            self.controller.handlers['led'].send_cmd(LED_RED_PULSE_ALERT_HEX, "Alert (Red pulse)")
+            self.controller.handlers['led'].send_cmd(LED_RED_PULSE_ALERT, "Alert (Red pulse)")
         bottle_alert.start(self.controller, text_msg=display_text)
 
     def _revert_alert_display_and_led(self):
@@ -50,30 +96,25 @@ class HydrationHandler:
         revert_led_and_ir_to_default(self.controller)
 
     def handle_packet(self, cmd, val, mac):
+        if cmd >= 0x50:
+            # Alerts, drinks and daily totals are automation triggers (see rules_engine).
+            self.controller.emit("hydration", cmd, mac=mac, value=val, ml=round(val, 1))
         # 0x21: REPORT_WEIGHT
         if cmd == 0x21:
-            self.current_data['weight'] = val
-            self.current_data['last_update'] = time.time()
-            self.current_data['status'] = 'Active'
+            self._publish(weight=val, last_update=time.time(), status='Active')
             logger.info(f"HYDRATION WEIGHT: {val:.2f} g")
         
         # 0x30: REQUEST_TIME from Slave
         elif cmd == 0x30:
             logger.info(f"[{mac}] Requested Time.")
-            time_hex = struct.pack('<I', local_epoch_now()).hex()
-            self.controller.send_command(mac, "0131" + time_hex)
+            self.controller.send_command(mac, codec.hydration_time(local_epoch_now()))
 
-        # 0x40: REQUEST_PRESENCE from Slave
+        # 0x40: REQUEST_PRESENCE from Slave (answered from the presence tracker, no probe)
         elif cmd == 0x40:
             logger.info(f"[{mac}] Requested Presence Check.")
-            is_home = self.controller.is_phone_home() # Call back to controller
-            presence = getattr(self.controller, "last_presence_check", {}) or {}
-            self.current_data['presence_last_state'] = 'HOME' if is_home else 'AWAY'
-            self.current_data['presence_last_checked'] = presence.get('timestamp', time.time())
-            self.current_data['presence_last_method'] = presence.get('method', 'none')
-            self.current_data['presence_last_error'] = presence.get('error', '')
-            payload = "0000803F" if is_home else "00000000" # 1.0 or 0.0
-            self.controller.send_command(mac, "0141" + payload)
+            is_home = self.controller.is_phone_home()
+            self._publish_presence(is_home, getattr(self.controller, "last_presence_check", {}) or {})
+            self.controller.send_command(mac, codec.hydration_presence(is_home))
 
         # 0x50: ALERT_MISSING (bottle missing)
         elif cmd == 0x50:
@@ -98,9 +139,8 @@ class HydrationHandler:
         # 0x60: DRINK_DETECTED
         elif cmd == 0x60:
             ml = round(val, 1)
-            self.current_data['last_drink_ml'] = ml
-            self.current_data['last_drink_time'] = time.time()
-            self.current_data['last_update'] = time.time()
+            now = time.time()
+            self._publish(last_drink_ml=ml, last_drink_time=now, last_update=now)
             logger.info(f"HYDRATION [{mac}]: Drink Detected: {ml} ml")
             if getattr(self.controller, 'append_log_line', None):
                 self.controller.append_log_line(f"  >> Drink detected: {ml} ml")
@@ -109,8 +149,7 @@ class HydrationHandler:
         # 0x61: DAILY_TOTAL
         elif cmd == 0x61:
             ml = round(val, 1)
-            self.current_data['daily_total_ml'] = ml
-            self.current_data['last_update'] = time.time()
+            self._publish(daily_total_ml=ml, last_update=time.time())
             logger.info(f"HYDRATION [{mac}]: Daily Total: {ml} ml")
             if getattr(self.controller, 'append_log_line', None):
                 self.controller.append_log_line(f"  >> Today total: {ml} ml")
@@ -148,33 +187,29 @@ class HydrationHandler:
         if subcmd == 'led':
             val = 1 if (len(parts)>2 and parts[2]=='on') else 0
             # 0x10 = SET_LED. Payload: Type(1) Cmd(0x10) Val(float)
-            hex_payload = "0110" + ("0000803F" if val else "00000000")
-            self.controller.send_command(mac, hex_payload)
+            self.controller.send_command(mac, codec.hydration(codec.HYD_SET_LED, val))
 
         elif subcmd == 'buzzer':
             val = 1 if (len(parts)>2 and parts[2]=='on') else 0
             # 0x11 = SET_BUZZER
-            hex_payload = "0111" + ("0000803F" if val else "00000000")
-            self.controller.send_command(mac, hex_payload)
+            self.controller.send_command(mac, codec.hydration(codec.HYD_SET_BUZZER, val))
 
         elif subcmd == 'rgb':
             # Valid codes: 0-4
             if len(parts) > 2:
                 code = int(parts[2])
                 # 0x12 = SET_RGB. Float representation of int code.
-                float_hex = struct.pack('<f', code).hex()
-                hex_payload = "0112" + float_hex
-                self.controller.send_command(mac, hex_payload)
+                self.controller.send_command(mac, codec.hydration(codec.HYD_SET_RGB, code))
             else:
                 logger.warning("Usage: hydration rgb <0-8>")
 
         elif subcmd == 'weight':
             # 0x20 = GET_WEIGHT. 
-            self.controller.send_command(mac, "012000000000")
+            self.controller.send_command(mac, codec.HYD_GET_WEIGHT_MSG)
 
         elif subcmd == 'tare':
             # 0x22 = CMD_TARE
-            self.controller.send_command(mac, "012200000000")
+            self.controller.send_command(mac, codec.HYD_TARE_MSG)
             logger.info("Sent TARE command.")
 
         elif subcmd == 'test':
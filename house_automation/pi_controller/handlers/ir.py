@@ -1,44 +1,67 @@
 import logging
-import struct
+
+import codec
+from tx_scheduler import BurstScheduler
 
 logger = logging.getLogger("PiController")
 
+BURST_COUNT = 3
+BURST_SPACING_SEC = 0.1
+
 class IRHandler:
     def __init__(self, controller):
         self.controller = controller
-        
+        # Runs IR bursts in the background; codes to the same remote never interleave.
+        self.scheduler = BurstScheduler(name="ir-tx")
+
     def handle_packet(self, cmd, val, mac):
         # IR Remote probably won't send much back
         logger.info(f"IR [{mac}] -> Cmd:0x{cmd:02X} Val:{val:.2f}")
 
-    def send_nec(self, hex_code):
-        import time
+    def send_nec(self, hex_code, force=False):
+        """
+        Queue an NEC code as a 3-frame burst and return its TxJob handle (None on bad input).
+        Frames are spaced by the IR scheduler, so the caller never sleeps. A power or colour
+        code (device_shadow.IR_STATE_CODES) is skipped if it was the last code sent, unless `force`.
+        """
         try:
             code_val = int(hex_code, 16)
-            # Protocol: Type=3 (IR), Cmd=0x31 (NEC)
-            # Payload: 32-bit integer packed (Little Endian)
-            code_hex = struct.pack('<I', code_val).hex()
-            payload = "0331" + code_hex
-            
-            # Send via Controller
-            # We must get the proper MAC. IR Handler usually just controls one remote, 
-            # but for generality let's get it from config if possible or default to configured
-            import config
-            mac = config.SLAVE_MACS.get('ir_remote', '00:00:00:00:00:00')
-            
-            if mac != '00:00:00:00:00:00':
-                 # BURST SEND: Send 3 times to ensure reception (RCA: 10% failure rate)
-                 for i in range(3):
-                     self.controller.send_command(mac, payload)
-                     # Small delay between bursts to allow ESP/IR receiver to reset
-                     if i < 2: 
-                         time.sleep(0.1) 
-                 logger.info(f"Sent IR NEC: 0x{code_val:08X} (Burst x3)")
-            else:
-                 logger.error("Cannot send NEC: IR MAC not configured")
-
-        except ValueError:
+            # Protocol: Type=3 (IR), Cmd=0x31 (NEC), 32-bit code (Little Endian)
+            payload = codec.ir_nec(code_val)
+        except (ValueError, codec.error):
             logger.error(f"Invalid Hex Code: {hex_code}")
+            return None
+
+        # We must get the proper MAC. IR Handler usually just controls one remote,
+        # but for generality let's get it from config if possible or default to configured
+        import config
+        mac = config.SLAVE_MACS.get('ir_remote', '00:00:00:00:00:00')
+        if mac == '00:00:00:00:00:00':
+            logger.error("Cannot send NEC: IR MAC not configured")
+            return None
+
+        # BURST SEND: Send 3 times to ensure reception (RCA: 10% failure rate).
+        # The shadow check covers the whole burst (first frame); repeats are forced.
+        # Frames are BURST_SPACING_SEC apart so the ESP/IR receiver can reset.
+        def first():
+            if self.controller.send_command(mac, payload, force=force, frames=BURST_COUNT):
+                return True
+            if not self.controller.serial_up():
+                # Not written at all: the job fails ("serial_down") instead of looking like a shadow skip.
+                raise ConnectionError("serial_down")
+            return False
+
+        def repeat():
+            return self.controller.send_command(mac, payload, force=True)
+
+        job = self.scheduler.submit(
+            mac,
+            [first] + [repeat] * (BURST_COUNT - 1),
+            spacing_sec=BURST_SPACING_SEC,
+            description=f"IR NEC 0x{code_val:08X}",
+        )
+        logger.info(f"Queued IR NEC: 0x{code_val:08X} (Burst x{BURST_COUNT}, job {job.id})")
+        return job
 
     def handle_user_input(self, parts):
         # parts: ['ir', 'cmd', 'arg']
@@ -50,7 +73,7 @@ class IRHandler:
 
         if subcmd == 'send':
              if len(parts) > 2:
-                  self.send_nec(parts[2])
+                  self.send_nec(parts[2], force=True)
              else:
                   logger.warning("Usage: ir send <HEX_CODE>")
         else:
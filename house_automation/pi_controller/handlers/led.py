@@ -1,5 +1,6 @@
 import logging
-import struct
+
+import codec
 
 logger = logging.getLogger("PiController")
 
@@ -12,14 +13,21 @@ class LEDHandler:
         # But if we receive something from the LED MAC, we can log it.
         logger.info(f"LED [{mac}] -> Cmd:0x{cmd:02X} Val:{val:.2f}")
 
-    def send_cmd(self, hex_payload, description="CMD"):
+    def send_cmd(self, hex_payload, description="CMD", force=False):
+        """
+        Send an LED payload. Skipped if the strip is already in that state, unless `force`.
+        Returns True if a frame was written.
+        """
         import config
         mac = config.SLAVE_MACS.get('led_ble', '00:00:00:00:00:00')
         if mac != '00:00:00:00:00:00':
-             self.controller.send_command(mac, hex_payload)
-             logger.info(f"Sent LED {description}")
+             if self.controller.send_command(mac, hex_payload, force=force):
+                 logger.info(f"Sent LED {description}")
+                 return True
+             logger.debug(f"LED {description} not sent (unchanged or serial down)")
         else:
              logger.error("LED MAC not configured")
+        return False
 
     def handle_user_input(self, parts):
         # parts: ['led', 'cmd', 'arg']
@@ -34,11 +42,11 @@ class LEDHandler:
 
         if subcmd == 'on':
             # 0x10 = SET_LED. Payload: 1.0
-            self.send_cmd("02100000803F", "ON")
+            self.send_cmd(codec.LED_ON, "ON", force=True)
 
         elif subcmd == 'off':
             # 0x10 = SET_LED. Payload: 0.0
-            self.send_cmd("021000000000", "OFF")
+            self.send_cmd(codec.LED_OFF, "OFF", force=True)
 
         elif subcmd == 'rgb':
              # led rgb <id>
@@ -46,9 +54,7 @@ class LEDHandler:
                   try:
                       code = int(parts[2])
                       # 0x12 = SET_RGB. Float representation
-                      float_hex = struct.pack('<f', code).hex()
-                      hex_payload = "0212" + float_hex
-                      self.send_cmd(hex_payload, f"RGB {code}")
+                      self.send_cmd(codec.led_rgb(code), f"RGB {code}", force=True)
                   except ValueError:
                       logger.error("Invalid RGB code. Use integer.")
              else:
@@ -62,12 +68,7 @@ class LEDHandler:
                       speed = int(parts[3])
                       # 0x13 = CMD_SET_MODE
                       # Data: 0x0000[MODE][SPEED] -> Little Endian Bytes: [SPEED][MODE][00][00]
-                      # Packed as uint32 (I)
-                      # Value = (mode << 8) | speed
-                      val = (mode << 8) | speed
-                      # Struct pack <I (Little Endian uint32)
-                      hex_payload = "0213" + struct.pack('<I', val).hex()
-                      self.send_cmd(hex_payload, f"Mode {mode} Speed {speed}")
+                      self.send_cmd(codec.led_mode(mode, speed), f"Mode {mode} Speed {speed}", force=True)
                   except ValueError:
                       logger.error("Usage: led mode <id> <speed> (integers)")
              else:
@@ -75,17 +76,14 @@ class LEDHandler:
 
         elif subcmd == 'rainbow':
              # Fast Rainbow Shortcut (Mode 37, Speed 100)
-             # Val = (37 << 8) | 100 = 0x2564
-             val = (37 << 8) | 100
-             hex_payload = "0213" + struct.pack('<I', val).hex()
-             self.send_cmd(hex_payload, "Rainbow Mode")
+             self.send_cmd(codec.led_mode(37, 100), "Rainbow Mode", force=True)
 
         elif subcmd == 'raw':
              # led raw <HEX_PAYLOAD>
              if len(parts) > 2:
                   hex_payload = parts[2]
                   if all(c in '0123456789ABCDEFabcdef' for c in hex_payload) and len(hex_payload) % 2 == 0:
-                      self.send_cmd(hex_payload, f"RAW: {hex_payload}")
+                      self.send_cmd(hex_payload, f"RAW: {hex_payload}", force=True)
                   else:
                       logger.error("Invalid HEX payload.")
              else:
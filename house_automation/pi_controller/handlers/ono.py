@@ -1,6 +1,8 @@
 """Handler for ONO display (OLED + RGB) – text, rainbow, custom color via ESP-NOW."""
 import logging
-import struct
+import threading
+import time
+import codec
 import config
 
 logger = logging.getLogger("PiController")
@@ -10,58 +12,106 @@ logger = logging.getLogger("PiController")
 # Cmd 0x51 = Color (8 bytes: 03 51 R G B + duration float)
 # Cmd 0x60 = Text (9+ bytes: 03 60 + duration float + len + UTF-8 text)
 # Cmd 0x70 = Price update (10 bytes: 03 70 + price_usd float + change_24h float)
+# Display -> Pi:
+# Cmd 0x01 = Hello (6 bytes: 03 01 + float, sent on boot until a price arrives)
+
+CMD_HELLO = 0x01
+
+# Price pushes are change-driven: only when price / 24h change move past these
+# thresholds, on a display hello, or as a slow safety refresh (keeps the
+# displays' "PI down" watchdog fed; must stay well below their NO_DATA_MS).
+PRICE_PUSH_THRESHOLD_PCT = config.ONO_PRICE_PUSH_THRESHOLD_PCT
+CHANGE_PUSH_THRESHOLD_PTS = config.ONO_CHANGE_PUSH_THRESHOLD_PTS
+PRICE_REFRESH_SEC = config.ONO_PRICE_REFRESH_SEC
+DISPLAY_GROUP = 'displays'     # config.DEVICE_GROUPS entry: ono_display + cam_display
+LEGACY_PUSH_INTERVAL_SEC = 15   # old loop re-sent the price this often; used to count frames saved
 
 class OledHandler:
     def __init__(self, controller):
         self.controller = controller
+        self._price_lock = threading.Lock()
+        self.price = None           # (price_usd, change_24h) last fetched
+        self._pushed = None         # (price_usd, change_24h) last pushed to all displays
+        self._last_push = 0.0
+        self._price_since = None    # first price seen: baseline for "frames saved"
+        self.price_stats = {
+            "pushes": {"first": 0, "price": 0, "change": 0, "refresh": 0, "hello": 0},
+            "skipped": 0,
+            "frames_sent": 0,
+            "hellos": 0,
+        }
 
     def handle_packet(self, cmd, val, mac):
+        if cmd == CMD_HELLO:
+            self._on_hello(mac)
+            return
         logger.info(f"ONO [{mac}] -> Cmd:0x{cmd:02X} Val:{val:.2f}")
 
+    def _on_hello(self, mac):
+        """Display (re)booted: it has lost everything, so forget its shadow and push the price now."""
+        logger.info(f"ONO [{mac}] -> Hello (display booted)")
+        shadow = getattr(self.controller, 'shadow', None)
+        if shadow is not None:
+            shadow.invalidate(mac)
+        with self._price_lock:
+            self.price_stats["hellos"] += 1
+            price = self.price
+        if price is None:
+            logger.info("ONO hello: no price fetched yet, display will get the first push")
+            return
+        if self.controller.send_command(mac, self._price_payload(*price), force=True):
+            with self._price_lock:
+                self.price_stats["pushes"]["hello"] += 1
+                self.price_stats["frames_sent"] += 1
+
     def _display_macs(self):
-        """Return list of display MACs to send to (ono_display + cam_display)."""
+        """Return list of display MACs in the display group (ono_display + cam_display)."""
         macs = []
-        for key in ('ono_display', 'cam_display'):
-            m = config.SLAVE_MACS.get(key, '00:00:00:00:00:00')
+        for key in config.DEVICE_GROUPS.get(DISPLAY_GROUP, ()):
+            m = config.SLAVE_MACS.get(key, key)
             if m != '00:00:00:00:00:00':
                 macs.append(m)
         return macs
 
-    def send_cmd(self, hex_payload, description="CMD"):
+    def send_cmd(self, hex_payload, description="CMD", force=False):
+        """
+        Send to the display group at once; displays already showing this payload are skipped
+        unless `force`. Returns the number of displays the frame was written for.
+        """
         macs = self._display_macs()
         if not macs:
             logger.error("No display MAC configured (ono_display / cam_display)")
-            return
-        for mac in macs:
-            self.controller.send_command(mac, hex_payload)
-        logger.info(f"Sent ONO {description} to {len(macs)} display(s)")
+            return 0
+        sent = int(self.controller.send_command(DISPLAY_GROUP, hex_payload, force=force) or 0)
+        if sent:
+            logger.info(f"Sent ONO {description} to {sent}/{len(macs)} display(s)")
+        else:
+            logger.debug(f"ONO {description} not sent (unchanged or serial down)")
+        return sent
 
-    def send_rainbow(self, duration_sec=10):
+    def send_rainbow(self, duration_sec=10, force=False):
         """Rainbow effect for `duration_sec` seconds."""
-        payload = "03" + "50" + struct.pack('<f', float(duration_sec)).hex()
-        self.send_cmd(payload, f"Rainbow {duration_sec}s")
+        return self.send_cmd(codec.display_rainbow(duration_sec), f"Rainbow {duration_sec}s", force=force)
 
-    def send_color(self, r, g, b, duration_sec=10):
+    def send_color(self, r, g, b, duration_sec=10, force=False):
         """Custom RGB color for `duration_sec` seconds."""
         r = max(0, min(255, int(r)))
         g = max(0, min(255, int(g)))
         b = max(0, min(255, int(b)))
-        payload = "03" + "51" + f"{r:02x}{g:02x}{b:02x}" + struct.pack('<f', float(duration_sec)).hex()
-        self.send_cmd(payload, f"Color R{r} G{g} B{b} {duration_sec}s")
+        return self.send_cmd(codec.display_color(r, g, b, duration_sec), f"Color R{r} G{g} B{b} {duration_sec}s", force=force)
 
-    def send_text(self, text, duration_sec=5):
+    def send_text(self, text, duration_sec=5, force=False):
         """Display text (scrolls if long) for `duration_sec` seconds."""
         text = (text or "").strip()
         if not text:
             logger.warning("ONO text empty")
-            return
-        raw = text.encode('utf-8')
-        if len(raw) > 80:
-            raw = raw[:80]
-        payload = "03" + "60" + struct.pack('<f', float(duration_sec)).hex() + f"{len(raw):02x}" + raw.hex()
-        self.send_cmd(payload, f"Text '{text[:20]}...' {duration_sec}s")
+            return 0
+        return self.send_cmd(codec.display_text(text, duration_sec), f"Text '{text[:20]}...' {duration_sec}s", force=force)
+
+    def _price_payload(self, p, c):
+        return codec.display_price(p, c)
 
-    def send_price(self, price_usd, change_24h):
+    def send_price(self, price_usd, change_24h, force=False):
         """Send ONO price and 24h change to display (Pi fetches from CoinGecko)."""
         try:
             p = float(price_usd)
@@ -69,8 +119,73 @@ class OledHandler:
         except (TypeError, ValueError):
             logger.warning("ONO send_price: invalid numbers")
             return
-        payload = "03" + "70" + struct.pack('<f', p).hex() + struct.pack('<f', c).hex()
-        self.send_cmd(payload, f"Price ${p:.4f} 24h {c:+.2f}%")
+        self.send_cmd(self._price_payload(p, c), f"Price ${p:.4f} 24h {c:+.2f}%", force=force)
+
+    def _push_reason(self, p, c, now):
+        if self._pushed is None:
+            return "first"
+        lp, lc = self._pushed
+        if lp and abs(p - lp) / abs(lp) * 100.0 >= PRICE_PUSH_THRESHOLD_PCT:
+            return "price"
+        if abs(c - lc) >= CHANGE_PUSH_THRESHOLD_PTS:
+            return "change"
+        if now - self._last_push >= PRICE_REFRESH_SEC:
+            return "refresh"
+        return None
+
+    def update_price(self, price_usd=None, change_24h=None, now=None):
+        """
+        Record a freshly fetched price (or pass nothing to just re-check the last one)
+        and push it to all displays only if it moved past the thresholds or the
+        safety refresh is due. Returns the push reason, or None if nothing was sent.
+        """
+        now = time.time() if now is None else now
+        with self._price_lock:
+            if price_usd is not None:
+                try:
+                    self.price = (float(price_usd), float(change_24h or 0.0))
+                except (TypeError, ValueError):
+                    logger.warning("ONO update_price: invalid numbers")
+                    return None
+                if self._price_since is None:
+                    self._price_since = now
+            if self.price is None:
+                return None
+            p, c = self.price
+            reason = self._push_reason(p, c, now)
+            if reason is None:
+                self.price_stats["skipped"] += 1
+                return None
+            self._pushed = (p, c)
+            self._last_push = now
+        # A refresh repeats the same bytes on purpose (it is the keepalive), and the first
+        # push after start must not be skipped by a restored shadow: force both.
+        force = reason in ("first", "refresh")
+        macs = self._display_macs()
+        sent = int(self.controller.send_command(DISPLAY_GROUP, self._price_payload(p, c), force=force) or 0)
+        logger.info(f"ONO price push ({reason}): ${p:.4f} 24h {c:+.2f}% -> {sent}/{len(macs)} display(s)")
+        with self._price_lock:
+            self.price_stats["pushes"][reason] += 1
+            self.price_stats["frames_sent"] += sent
+        return reason
+
+    def price_push_stats(self, now=None):
+        """Push counters plus frames saved vs. the old fixed 15 s re-push to every display."""
+        now = time.time() if now is None else now
+        with self._price_lock:
+            out = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self.price_stats.items()}
+            since = self._price_since
+        if since is not None:
+            legacy = int((now - since) // LEGACY_PUSH_INTERVAL_SEC + 1) * len(self._display_macs())
+            out["legacy_frames"] = legacy
+            out["frames_saved"] = max(0, legacy - out["frames_sent"])
+            out["frames_saved_pct"] = round(100.0 * out["frames_saved"] / legacy, 1) if legacy else 0.0
+        out["thresholds"] = {
+            "price_pct": PRICE_PUSH_THRESHOLD_PCT,
+            "change_pts": CHANGE_PUSH_THRESHOLD_PTS,
+            "refresh_sec": PRICE_REFRESH_SEC,
+        }
+        return out
 
     def handle_user_input(self, parts):
         if len(parts) < 2:
@@ -79,12 +194,12 @@ class OledHandler:
         subcmd = parts[1].lower()
         if subcmd == 'rainbow':
             dur = int(parts[2]) if len(parts) > 2 else 10
-            self.send_rainbow(dur)
+            self.send_rainbow(dur, force=True)
         elif subcmd == 'color':
             if len(parts) >= 6:
                 r, g, b = int(parts[2]), int(parts[3]), int(parts[4])
                 dur = int(parts[5]) if len(parts) > 5 else 10
-                self.send_color(r, g, b, dur)
+                self.send_color(r, g, b, dur, force=True)
             else:
                 logger.warning("Usage: ono color <r> <g> <b> [duration_sec]")
         elif subcmd == 'text':
@@ -93,6 +208,6 @@ class OledHandler:
             if text and text.split()[-1].isdigit():
                 dur = int(text.split()[-1])
                 text = " ".join(text.split()[:-1])
-            self.send_text(text or "Hello", dur)
+            self.send_text(text or "Hello", dur, force=True)
         else:
             logger.warning("Unknown ono cmd. Try: rainbow, color, text")
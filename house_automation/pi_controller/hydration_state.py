@@ -0,0 +1,138 @@
+"""
+Immutable hydration state + atomic swap cell with change notifications.
+
+The serial reader thread publishes a new `HydrationState` for every update;
+Flask threads (and anything else) read `cell.get()` and always see a complete,
+consistent record (never a new `last_drink_ml` with an old `last_drink_time`).
+
+Consumers that want to react to changes block on `cell.wait_for_change(version)`
+(the /api/data long poll) or register a callback with `cell.subscribe(fn)`
+(the checkpointer) instead of polling.
+
+Example:
+    cell = StateCell(HydrationState())
+    cell.update(weight=512.3, status='Active')
+    state = cell.get()                 # HydrationState(version=1, ...)
+    newer = cell.wait_for_change(state.version, timeout=30)   # None on timeout
+"""
+import logging
+import threading
+
+logger = logging.getLogger("PiController")
+
+
+class HydrationState:
+    """Read-only snapshot of the hydration slave as seen by the Pi."""
+
+    __slots__ = (
+        'version',
+        'weight',
+        'status',
+        'last_update',
+        'last_drink_ml',
+        'last_drink_time',
+        'daily_total_ml',
+        'presence_last_state',
+        'presence_last_checked',
+        'presence_last_method',
+        'presence_last_error',
+        'stale',
+    )
+
+    _DEFAULTS = {
+        'version': 0,
+        'weight': 0.0,
+        'status': 'Waiting for data...',
+        'last_update': 0,
+        'last_drink_ml': 0.0,
+        'last_drink_time': 0,
+        'daily_total_ml': 0.0,
+        'presence_last_state': 'UNKNOWN',
+        'presence_last_checked': 0,
+        'presence_last_method': 'none',
+        'presence_last_error': '',
+        # True while the values come from a checkpoint and no fresh packet has arrived yet.
+        'stale': False,
+    }
+
+    def __init__(self, **fields):
+        unknown = set(fields) - set(self.__slots__)
+        if unknown:
+            raise TypeError(f"Unknown HydrationState field(s): {', '.join(sorted(unknown))}")
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields.get(name, self._DEFAULTS[name]))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("HydrationState is immutable; use StateCell.update()")
+
+    def __delattr__(self, name):
+        raise AttributeError("HydrationState is immutable")
+
+    def replace(self, **changes):
+        """Return a copy with `changes` applied and the version bumped."""
+        fields = self.as_dict()
+        fields.update(changes)
+        fields['version'] = self.version + 1
+        return HydrationState(**fields)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"HydrationState(version={self.version}, status={self.status!r}, weight={self.weight:.1f})"
+
+
+class StateCell:
+    """
+    Holds the current immutable state object and swaps it atomically.
+    Works with any object exposing `version` and `replace(**changes)`.
+    """
+
+    def __init__(self, initial):
+        self._state = initial
+        self._cond = threading.Condition(threading.Lock())
+        self._subscribers = []
+
+    def get(self):
+        # Attribute reads are atomic in CPython; the object itself is immutable.
+        return self._state
+
+    @property
+    def version(self):
+        return self._state.version
+
+    def update(self, **changes):
+        """Publish a new state with `changes` applied. Returns the new state."""
+        with self._cond:
+            old = self._state
+            new = old.replace(**changes)
+            self._state = new
+            self._cond.notify_all()
+            subscribers = list(self._subscribers)
+        for fn in subscribers:
+            try:
+                fn(old, new)
+            except Exception as e:
+                logger.warning("State subscriber %s failed: %s", getattr(fn, "__name__", fn), e)
+        return new
+
+    def wait_for_change(self, since_version, timeout=None):
+        """
+        Block until the version is newer than `since_version`.
+        Returns the new state, or None if `timeout` expired first.
+        """
+        with self._cond:
+            if self._cond.wait_for(lambda: self._state.version > since_version, timeout=timeout):
+                return self._state
+            return None
+
+    def subscribe(self, fn):
+        """Call `fn(old_state, new_state)` after every update (on the updating thread)."""
+        with self._cond:
+            self._subscribers.append(fn)
+        return fn
+
+    def unsubscribe(self, fn):
+        with self._cond:
+            if fn in self._subscribers:
+                self._subscribers.remove(fn)
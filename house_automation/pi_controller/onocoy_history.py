@@ -0,0 +1,226 @@
+"""
+Onocoy station uptime history, built from status transitions only.
+
+Each Online/Offline transition is appended to a compact log file
+(`<epoch>,<0|1>,<station_id>` per line) and kept in memory as two parallel
+arrays per station (timestamps + states). Queries bisect to the window start
+and walk only the transitions inside the window, so cost is O(log n + changes)
+regardless of how often stations are polled.
+
+Example:
+    history = OnocoyHistory("onocoy_history.log")
+    history.observe("station-1", is_up=True, since="2026-03-20T10:00:00Z")
+    history.uptime("station-1", start, end)      # -> {"uptime_pct": 99.2, ...}
+    history.outages("station-1", start, end)     # -> [{"start": ..., "end": ..., "duration_sec": ...}]
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+
+logger = logging.getLogger("WebServer")
+
+DAY_SEC = 86400.0
+
+
+def _to_epoch(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class _StationHistory:
+    __slots__ = ("ts", "up")
+
+    def __init__(self):
+        self.ts = array("d")
+        self.up = bytearray()
+
+    def state_at(self, t):
+        """(index of the last transition at/before t, state) or (-1, None) if unknown."""
+        i = bisect_right(self.ts, t) - 1
+        return (i, bool(self.up[i])) if i >= 0 else (-1, None)
+
+    def segments(self, start, end):
+        """Yield (seg_start, seg_end, is_up) covering [start, end] where the state is known."""
+        i, state = self.state_at(start)
+        t = start
+        if i < 0:
+            i = 0 if self.ts else None
+            if i is None or self.ts[0] >= end:
+                return
+            t, state = self.ts[0], bool(self.up[0])
+        n = len(self.ts)
+        j = i + 1
+        while j < n and self.ts[j] < end:
+            yield t, self.ts[j], state
+            t, state = self.ts[j], bool(self.up[j])
+            j += 1
+        yield t, end, state
+
+
+class OnocoyHistory:
+    def __init__(self, path, retention_days=400):
+        self.path = path
+        self.retention_sec = float(retention_days) * DAY_SEC
+        self._lock = threading.Lock()
+        self._stations = {}
+        self._load()
+
+    def _load(self):
+        cutoff = time.time() - self.retention_sec
+        count = dropped = 0
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split(",", 2)
+                    if len(parts) != 3:
+                        continue
+                    try:
+                        ts, up = float(parts[0]), parts[1] == "1"
+                    except ValueError:
+                        continue
+                    self._append(parts[2], ts, up)
+                    count += 1
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("Onocoy history: failed to load %s: %s", self.path, e)
+            return
+        dropped = self._trim(cutoff)
+        if dropped:
+            self._rewrite()
+        logger.info("Onocoy history: loaded %d transitions (%d expired)", count, dropped)
+
+    def _append(self, station_id, ts, up):
+        h = self._stations.get(station_id)
+        if h is None:
+            h = self._stations[station_id] = _StationHistory()
+        if h.up and h.up[-1] == up:
+            return False
+        if h.ts and ts < h.ts[-1]:
+            ts = h.ts[-1]   # keep timestamps monotonic per station
+        h.ts.append(ts)
+        h.up.append(1 if up else 0)
+        return True
+
+    def _trim(self, cutoff):
+        """Drop transitions older than `cutoff`, keeping the state in force at the cutoff."""
+        dropped = 0
+        for h in self._stations.values():
+            i = bisect_right(h.ts, cutoff) - 1
+            if i > 0:
+                del h.ts[:i]
+                del h.up[:i]
+                dropped += i
+        return dropped
+
+    def _rewrite(self):
+        from checkpoint import atomic_write_bytes
+        lines = []
+        for sid, h in self._stations.items():
+            lines.extend(f"{t:.0f},{u},{sid}\n" for t, u in zip(h.ts, h.up))
+        try:
+            atomic_write_bytes(self.path, "".join(lines).encode("utf-8"))
+        except Exception as e:
+            logger.warning("Onocoy history: compaction failed: %s", e)
+
+    def observe(self, station_id, is_up, since=None, now=None):
+        """Record the station's current state; only a change of state is stored."""
+        ts = _to_epoch(since) or (now if now is not None else time.time())
+        with self._lock:
+            if not self._append(station_id, ts, bool(is_up)):
+                return False
+            h = self._stations[station_id]
+            line = f"{h.ts[-1]:.0f},{1 if is_up else 0},{station_id}\n"
+            try:
+                with open(self.path, "a") as f:
+                    f.write(line)
+            except Exception as e:
+                logger.warning("Onocoy history: append failed: %s", e)
+        return True
+
+    def compact(self):
+        """Drop expired transitions from memory and disk (call occasionally, e.g. daily)."""
+        with self._lock:
+            if self._trim(time.time() - self.retention_sec):
+                self._rewrite()
+
+    # --- Queries ---
+
+    def _segments(self, station_id, start, end):
+        with self._lock:
+            h = self._stations.get(station_id)
+            if not h:
+                return [], None, 0
+            segs = list(h.segments(start, end))
+            n_changes = bisect_right(h.ts, end) - bisect_right(h.ts, start)
+            return segs, h.ts[-1], n_changes
+
+    @staticmethod
+    def _uptime_from(segs, start, end):
+        known = sum(b - a for a, b, _ in segs)
+        up = sum(b - a for a, b, s in segs if s)
+        window = max(0.0, end - start)
+        return {
+            "uptime_pct": round(100.0 * up / known, 3) if known else None,
+            "coverage_pct": round(100.0 * known / window, 1) if window else None,
+            "up_sec": round(up),
+            "known_sec": round(known),
+        }
+
+    @staticmethod
+    def _outages_from(segs, end, last_ts, min_duration_sec=0):
+        out = []
+        for a, b, up in segs:
+            if up or b - a < min_duration_sec:
+                continue
+            out.append({
+                "start": a,
+                "end": b,
+                "duration_sec": round(b - a),
+                "ongoing": b == end and last_ts is not None and last_ts <= a,
+            })
+        return out
+
+    def uptime(self, station_id, start, end):
+        """Uptime over [start, end] (epoch sec), counting only time where the state is known."""
+        segs, _last, _n = self._segments(station_id, start, end)
+        return self._uptime_from(segs, start, end)
+
+    def outages(self, station_id, start, end, min_duration_sec=0):
+        """Offline periods overlapping [start, end]; `ongoing` if still offline at `end`."""
+        segs, last_ts, _n = self._segments(station_id, start, end)
+        return self._outages_from(segs, end, last_ts, min_duration_sec)
+
+    def flapping_score(self, station_id, start, end):
+        """Transitions per day inside [start, end] (0 = rock solid)."""
+        _segs, _last, n = self._segments(station_id, start, end)
+        return round(n / (max(end - start, 1.0) / DAY_SEC), 2)
+
+    def summary(self, station_ids, start, end, include_outages=False):
+        """Per-station uptime, outage count/downtime and flapping score (one pass per station)."""
+        days = max(end - start, 1.0) / DAY_SEC
+        out = {}
+        for sid in station_ids:
+            segs, last_ts, n = self._segments(sid, start, end)
+            entry = self._uptime_from(segs, start, end)
+            outages = self._outages_from(segs, end, last_ts)
+            entry["outages"] = len(outages)
+            entry["downtime_sec"] = sum(o["duration_sec"] for o in outages)
+            entry["flapping_score"] = round(n / days, 2)
+            if include_outages:
+                entry["outage_list"] = outages
+            out[sid] = entry
+        return out
+
+    def transitions(self):
+        with self._lock:
+            return sum(len(h.ts) for h in self._stations.values())
@@ -0,0 +1,452 @@
+"""
+Background Onocoy station poller with bounded concurrency and an adaptive
+per-station schedule.
+
+Stations are fetched through a small worker pool (`max_workers`) instead of one
+after another, with per-request (connect, read) timeouts and jittered start
+times. Each station has its own next-poll time, kept in a heap:
+
+- stable stations drift towards `stable_max_factor` x the global interval,
+- a station whose status just changed is re-polled at `fast_factor` x interval,
+- failing / 404 stations back off exponentially (up to `max_backoff_sec`),
+- a per-station override in OnocoyStationStore pins a fixed interval.
+
+All requests go through the API host's circuit breaker: while Onocoy is known
+down, stations are skipped (status kept, re-tried when the breaker half-opens)
+instead of each one waiting out its read timeout.
+
+`poll_cycle()` still polls every station once (used by benchmarks), bounded by
+`cycle_deadline_sec`.
+
+Example:
+    poller = OnocoyPoller(store, max_workers=8, wakeup_event=onocoy_poll_wakeup_event)
+    poller.start()            # daemon thread, adaptive schedule
+    poller.poll_cycle()       # or one synchronous pass over all stations
+"""
+import heapq
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import circuit_breaker
+import thread_registry
+
+logger = logging.getLogger("WebServer")
+
+ONOCOY_API_BASE_URL = "https://api.onocoy.com"
+ONOCOY_INFO_PATH = "/api/v1/explorer/server/{station_id}/info"
+ONOCOY_INFO_URL_TMPL = ONOCOY_API_BASE_URL + ONOCOY_INFO_PATH
+
+
+def info_url_tmpl(base_url):
+    """Station info URL template for an API base URL (e.g. a local mock server)."""
+    return (base_url or ONOCOY_API_BASE_URL).rstrip("/") + ONOCOY_INFO_PATH
+
+# Same shape the store expects; used when a station can't be fetched.
+OFFLINE_INFO = {"status": {"is_up": False, "since": None}}
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_NOT_FOUND = "not_found"
+OUTCOME_CIRCUIT_OPEN = "circuit_open"
+
+
+def _default_session_factory():
+    import requests
+    return requests.Session()
+
+
+def _iso_to_epoch(value):
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return None
+    idx = min(len(sorted_vals) - 1, int(round(pct / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+class _StationSchedule:
+    __slots__ = (
+        "station_id", "next_due", "interval", "factor", "failures", "polls",
+        "last_outcome", "last_change", "last_since",
+    )
+
+    def __init__(self, station_id, next_due):
+        self.station_id = station_id
+        self.next_due = next_due
+        self.interval = None
+        self.factor = 1.0
+        self.failures = 0
+        self.polls = 0
+        self.last_outcome = None
+        self.last_change = None
+        self.last_since = None
+
+
+class OnocoyPoller:
+    def __init__(
+        self,
+        store,
+        url_tmpl=ONOCOY_INFO_URL_TMPL,
+        max_workers=8,
+        connect_timeout_sec=3.0,
+        read_timeout_sec=10.0,
+        jitter_sec=1.0,
+        cycle_deadline_sec=None,
+        wakeup_event=None,
+        session_factory=None,
+        history=None,
+        fast_factor=0.25,
+        stable_growth=1.25,
+        stable_max_factor=4.0,
+        max_backoff_sec=3600,
+        breaker_settings=None,
+        on_status_change=None,
+    ):
+        self.store = store
+        self.url_tmpl = url_tmpl
+        self.max_workers = max(1, int(max_workers))
+        self.timeout = (float(connect_timeout_sec), float(read_timeout_sec))
+        self.jitter_sec = max(0.0, float(jitter_sec))
+        # Default: one request's worth of time after the last jittered start, plus slack.
+        self.cycle_deadline_sec = (
+            float(cycle_deadline_sec)
+            if cycle_deadline_sec is not None
+            else self.jitter_sec + sum(self.timeout) + 2.0
+        )
+        self.fast_factor = float(fast_factor)
+        self.stable_growth = float(stable_growth)
+        self.stable_max_factor = float(stable_max_factor)
+        self.max_backoff_sec = float(max_backoff_sec)
+        self.wakeup_event = wakeup_event or threading.Event()
+        # Optional OnocoyHistory: receives every successfully fetched status (stores transitions only).
+        self.history = history
+        # Optional callback(station_id, is_up) for every transition the history records.
+        self.on_status_change = on_status_change
+        self._session_factory = session_factory or _default_session_factory
+        # One breaker per API host; 404s (unknown station) do not count as failures.
+        self.breaker = circuit_breaker.for_url(
+            url_tmpl, **(breaker_settings or {"failure_threshold": 5, "reset_timeout_sec": 30})
+        )
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="onocoy-fetch")
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        # Adaptive schedule: heap of (next_due, seq, station_id) + per-station state.
+        self._sched_lock = threading.Lock()
+        self._heap = []
+        self._seq = 0
+        self._schedules = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_cycle = {}
+        self._requests = 0
+        self._changes_detected = 0
+        self._detection_latency = deque(maxlen=500)
+
+    def _session(self):
+        # requests.Session is not guaranteed thread-safe: one per worker thread.
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = self._session_factory()
+        return s
+
+    def fetch_info(self, station_id):
+        """Fetch one station's info. Returns (info, outcome)."""
+        url = self.url_tmpl.format(station_id=station_id)
+        if not self.breaker.allow():
+            return None, OUTCOME_CIRCUIT_OPEN
+        try:
+            r = self._session().get(url, timeout=self.timeout)
+        except Exception as e:
+            logger.debug("Onocoy fetch %s failed: %s", station_id, e)
+            self.breaker.record_failure(e)
+            return OFFLINE_INFO, OUTCOME_ERROR
+        circuit_breaker.record_response(self.breaker, r)
+        try:
+            if r.status_code == 200:
+                return r.json(), OUTCOME_OK
+        except ValueError as e:
+            logger.debug("Onocoy fetch %s: bad JSON: %s", station_id, e)
+            return OFFLINE_INFO, OUTCOME_ERROR
+        if r.status_code == 404:
+            return OFFLINE_INFO, OUTCOME_NOT_FOUND
+        return OFFLINE_INFO, OUTCOME_ERROR
+
+    def _poll_one(self, station_id):
+        try:
+            info, outcome = self.fetch_info(station_id)
+            if outcome == OUTCOME_CIRCUIT_OPEN:
+                # Nothing was asked, so nothing is known: keep the cached status.
+                self._record_skipped(station_id)
+                return False
+            changed = self.store.update_station_from_onocoy_info(station_id=station_id, info=info)
+            if self.history is not None and outcome == OUTCOME_OK and self.store.has_station(station_id):
+                # Fetch errors are not outages: only real API answers go into the history.
+                status = (info or {}).get("status") or {}
+                is_up = bool(status.get("is_up", False))
+                if self.history.observe(station_id, is_up, status.get("since")) and self.on_status_change:
+                    try:
+                        self.on_status_change(station_id, is_up)
+                    except Exception as e:
+                        logger.debug("Onocoy status callback failed: %s", e)
+            self._record_result(station_id, info, outcome, bool(changed))
+            return outcome == OUTCOME_OK
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(station_id)
+            # The store update or history raised before _record_result: keep the station on the schedule.
+            self._ensure_scheduled(station_id)
+
+    # --- Adaptive schedule ---
+
+    def _base_interval(self, station_id):
+        override = self.store.get_station_poll_interval(station_id)
+        return float(override) if override else float(self.store.get_polling_interval()), bool(override)
+
+    def _push(self, sched, due):
+        sched.next_due = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, sched.station_id))
+
+    def _ensure_scheduled(self, station_id):
+        """Re-push a station that was popped (next_due None) but never re-scheduled, at its base interval."""
+        with self._sched_lock:
+            sched = self._schedules.get(station_id)
+            if sched is None or sched.next_due is not None:
+                return
+            base, _pinned = self._base_interval(station_id)
+            interval = max(float(self.store.min_poll_interval_sec), base * sched.factor)
+            self._push(sched, time.monotonic() + interval * random.uniform(0.9, 1.1))
+
+    def _record_skipped(self, station_id):
+        """Breaker open: re-try when it half-opens, without counting a station failure."""
+        with self._sched_lock:
+            sched = self._schedules.get(station_id)
+            if sched is None:
+                return
+            delay = max(self.breaker.retry_in(), float(self.store.min_poll_interval_sec))
+            self._push(sched, time.monotonic() + delay + random.uniform(0, self.jitter_sec))
+
+    def _record_result(self, station_id, info, outcome, changed):
+        now = time.time()
+        with self._sched_lock:
+            self._requests += 1
+            sched = self._schedules.get(station_id)
+            if sched is None:
+                return
+            if outcome == OUTCOME_OK:
+                since = _iso_to_epoch(((info or {}).get("status") or {}).get("since"))
+                # A real transition has a new `since`; Offline->Online after a fetch error does not.
+                if changed and since is not None and sched.last_since is not None and since != sched.last_since:
+                    self._changes_detected += 1
+                    if now >= since:
+                        self._detection_latency.append(now - since)
+                sched.last_since = since
+            sched.polls += 1
+            sched.last_outcome = outcome
+            base, pinned = self._base_interval(station_id)
+
+            if outcome != OUTCOME_OK:
+                sched.failures += 1
+                # 404 = unknown station: back off harder than a transient error.
+                exp = sched.failures + (2 if outcome == OUTCOME_NOT_FOUND else 0)
+                interval = min(self.max_backoff_sec, base * (2 ** min(exp, 16)))
+            else:
+                sched.failures = 0
+                if pinned:
+                    sched.factor = 1.0
+                elif changed:
+                    sched.last_change = now
+                    sched.factor = self.fast_factor
+                else:
+                    sched.factor = min(self.stable_max_factor, sched.factor * self.stable_growth)
+                interval = base * sched.factor
+
+            interval = max(float(self.store.min_poll_interval_sec), interval)
+            sched.interval = interval
+            # +-10% jitter keeps stations from re-synchronising into bursts.
+            self._push(sched, time.monotonic() + interval * random.uniform(0.9, 1.1))
+
+    def _sync_stations(self, rush=False):
+        """Add new stations (due now, jittered), drop removed ones; `rush` pulls everything forward."""
+        station_ids = set(self.store.get_snapshot().keys())
+        now = time.monotonic()
+        with self._sched_lock:
+            for sid in list(self._schedules):
+                if sid not in station_ids:
+                    del self._schedules[sid]
+            for sid in station_ids:
+                sched = self._schedules.get(sid)
+                if sched is None:
+                    sched = self._schedules[sid] = _StationSchedule(sid, now)
+                    self._push(sched, now + random.uniform(0, self.jitter_sec))
+                elif rush:
+                    sched.factor = 1.0
+                    sched.failures = 0
+                    self._push(sched, now + random.uniform(0, self.jitter_sec))
+
+    def _pop_due(self):
+        """Return (station_id or None, seconds until the next due station)."""
+        with self._sched_lock:
+            while self._heap:
+                due, _seq, sid = self._heap[0]
+                sched = self._schedules.get(sid)
+                if sched is None or sched.next_due != due:
+                    heapq.heappop(self._heap)   # removed station or superseded entry
+                    continue
+                wait_sec = due - time.monotonic()
+                if wait_sec > 0:
+                    return None, wait_sec
+                heapq.heappop(self._heap)
+                sched.next_due = None
+                return sid, 0.0
+            return None, float(self.store.get_polling_interval())
+
+    def _dispatch(self, station_id):
+        with self._in_flight_lock:
+            in_flight = station_id in self._in_flight
+            if not in_flight:
+                self._in_flight.add(station_id)
+        if in_flight:
+            # Already being polled (poll_cycle): its result may have been recorded before this pop.
+            self._ensure_scheduled(station_id)
+            return
+        # Bounded: wait for a free worker instead of queueing unboundedly in the pool.
+        self._slots.acquire()
+        fut = self._pool.submit(self._poll_one, station_id)
+        fut.add_done_callback(lambda _f: self._slots.release())
+
+    def _run(self):
+        thread_registry.register(expect_sec=60)
+        self._sync_stations()
+        last_save = last_compact = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                if self.wakeup_event.is_set():
+                    # Pool time or station list changed: pick up new stations and poll everything soon.
+                    self.wakeup_event.clear()
+                    self._sync_stations(rush=True)
+                station_id, wait_sec = self._pop_due()
+                if station_id is not None:
+                    self._dispatch(station_id)   # may block until a worker is free
+                    thread_registry.beat()
+                    continue
+                now = time.monotonic()
+                interval = self.store.get_polling_interval()
+                if now - last_save >= interval:
+                    # Persist updated station status so it survives Pi restarts; re-check the station list.
+                    self.store.save_stations()
+                    self._sync_stations()
+                    last_save = now
+                    if self.history is not None and now - last_compact >= 86400:
+                        self.history.compact()
+                        last_compact = now
+                # Sleep until the next station is due, but wake up when pool time or stations change.
+                thread_registry.beat(min(wait_sec, interval))
+                self.wakeup_event.wait(timeout=min(wait_sec, interval))
+            except Exception as e:
+                logger.error("Onocoy poller error: %s", e)
+                thread_registry.beat(10)
+                self.wakeup_event.wait(timeout=10)
+        thread_registry.unregister()
+
+    # --- One-shot cycle (benchmarks / manual refresh) ---
+
+    def poll_cycle(self, station_ids=None):
+        """Poll the given (default: all) stations once. Returns cycle stats."""
+        t0 = time.monotonic()
+        if station_ids is None:
+            station_ids = list(self.store.get_snapshot().keys())
+        deadline = t0 + self.cycle_deadline_sec
+
+        # Jittered start offsets, dispatched in order so workers are never parked in a sleep.
+        starts = sorted((random.uniform(0, self.jitter_sec), sid) for sid in station_ids)
+        futures = []
+        skipped = 0
+        for offset, station_id in starts:
+            delay = t0 + offset - time.monotonic()
+            if delay > 0:
+                # A wake-up (stations / interval changed) ends the stagger: the rest go out now.
+                self.wakeup_event.wait(timeout=delay)
+            with self._in_flight_lock:
+                if station_id in self._in_flight:
+                    skipped += 1
+                    continue
+                self._in_flight.add(station_id)
+            futures.append(self._pool.submit(self._poll_one, station_id))
+
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        ok = sum(1 for f in done if not f.exception() and f.result())
+        stats = {
+            "stations": len(station_ids),
+            "ok": ok,
+            "errors": len(done) - ok,
+            "late": len(not_done),
+            "skipped_in_flight": skipped,
+            "duration_sec": round(time.monotonic() - t0, 3),
+            "finished_at": time.time(),
+        }
+        self.last_cycle = stats
+        return stats
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="onocoy-poller", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=5.0):
+        """Stop the background loop and the worker pool (benchmarks / tests)."""
+        self._stop.set()
+        self.wakeup_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        with self._in_flight_lock:
+            in_flight = len(self._in_flight)
+        now = time.monotonic()
+        with self._sched_lock:
+            lat = sorted(self._detection_latency)
+            schedule = {
+                sid: {
+                    "interval_sec": round(s.interval, 1) if s.interval else None,
+                    "next_in_sec": round(s.next_due - now, 1) if s.next_due is not None else None,
+                    "failures": s.failures,
+                    "last_outcome": s.last_outcome,
+                }
+                for sid, s in self._schedules.items()
+            }
+            requests_total = self._requests
+            changes = self._changes_detected
+        return {
+            "max_workers": self.max_workers,
+            "breaker": self.breaker.as_dict(),
+            "in_flight": in_flight,
+            "requests": requests_total,
+            "changes_detected": changes,
+            # How long after Onocoy's `since` we noticed a change, vs. how many requests it cost.
+            "detection_latency_sec": {
+                "samples": len(lat),
+                "p50": round(_percentile(lat, 50), 1) if lat else None,
+                "p95": round(_percentile(lat, 95), 1) if lat else None,
+                "mean": round(sum(lat) / len(lat), 1) if lat else None,
+            },
+            "requests_per_change": round(requests_total / changes, 1) if changes else None,
+            "schedule": schedule,
+            "last_cycle": dict(self.last_cycle),
+        }
@@ -1,17 +1,50 @@
 import json
+import logging
 import os
 import threading
-from datetime import datetime, timezone
+import time
+from datetime import date, datetime, timezone
+
+import thread_registry
+from checkpoint import atomic_write_bytes
+
+logger = logging.getLogger("WebServer")
 
 
 def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+class FrozenDict(dict):
+    """
+    Read-only dict used for published snapshots. Still a real dict, so
+    jsonify / json.dumps / iteration work unchanged, but mutation raises.
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("snapshot is read-only; use OnocoyStationStore methods to change stations")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
 class OnocoyStationStore:
     """
     Thread-safe in-memory cache of Onocoy stations + JSON persistence.
     The dashboard reads from this cache; the poller updates it.
+
+    Persistence is dirty-tracked: only real changes (status / since / nickname /
+    station list / overrides) mark the stations file dirty, and a write-behind
+    flusher writes it at most once per `min_flush_interval_sec` (SD card wear).
+    Pure `last_checked` refreshes ride along with the next real write.
     """
 
     def __init__(
@@ -31,21 +64,44 @@ class OnocoyStationStore:
 
         self.stations: dict = {}
         self.settings: dict = {"polling_interval": self.default_poll_interval_sec}
+        # Copy-on-write snapshot: rebuilt lazily after a mutation, read lock-free otherwise.
+        # Per-station frozen copies are cached so one update re-freezes only that station.
+        self._snapshot: FrozenDict | None = None
+        self._frozen_stations: dict = {}
+
+        # Dirty tracking + write-behind flusher state.
+        self._dirty = False
+        self._write_lock = threading.Lock()
+        self._flush_wake = threading.Event()
+        self._flusher = None
+        self.min_flush_interval_sec = 60.0
+        self._last_flush = 0.0
+        self._write_stats = {
+            "day": date.today().isoformat(),
+            "bytes_today": 0,
+            "writes_today": 0,
+            "bytes_total": 0,
+            "writes_total": 0,
+            "skipped_clean": 0,
+        }
 
         self._load_from_disk()
 
     def _load_from_disk(self) -> None:
         with self._lock:
             self.stations = self._safe_read_json(self.stations_path, default={})
+            self._invalidate(dirty=False)
             self.settings = self._safe_read_json(
                 self.settings_path,
                 default={"polling_interval": self.default_poll_interval_sec},
             )
 
-            # Enforce min polling interval
+            # Enforce min polling interval (rewrite the file only if that changed it)
             pi = self._to_int(self.settings.get("polling_interval"), self.default_poll_interval_sec)
-            self.settings["polling_interval"] = max(self.min_poll_interval_sec, pi)
-            self._safe_write_json(self.settings_path, self.settings)
+            pi = max(self.min_poll_interval_sec, pi)
+            if self.settings.get("polling_interval") != pi:
+                self.settings["polling_interval"] = pi
+                self._safe_write_json(self.settings_path, self.settings)
 
     def _safe_read_json(self, path: str, default):
         try:
@@ -60,15 +116,29 @@ class OnocoyStationStore:
             # If JSON is corrupted, fall back to defaults rather than crashing the server.
             return default
 
-    def _safe_write_json(self, path: str, data) -> None:
+    def _safe_write_json(self, path: str, data) -> bool:
         try:
-            tmp = path + ".tmp"
-            with open(tmp, "w") as f:
-                json.dump(data, f, indent=2)
-            os.replace(tmp, path)
-        except Exception:
+            # Compact encoding + fsync'd tmp file + rename: small, and never torn on power loss.
+            raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+            with self._write_lock:
+                atomic_write_bytes(path, raw)
+                self._count_write(len(raw))
+            return True
+        except Exception as e:
             # Persistence failures must never crash the server loop.
-            pass
+            logger.warning("Onocoy store: write %s failed: %s", path, e)
+            return False
+
+    def _count_write(self, nbytes: int) -> None:
+        st = self._write_stats
+        today = date.today().isoformat()
+        if st["day"] != today:
+            logger.info("Onocoy store: %d bytes in %d writes on %s", st["bytes_today"], st["writes_today"], st["day"])
+            st["day"], st["bytes_today"], st["writes_today"] = today, 0, 0
+        st["bytes_today"] += nbytes
+        st["writes_today"] += 1
+        st["bytes_total"] += nbytes
+        st["writes_total"] += 1
 
     def _to_int(self, v, default: int) -> int:
         try:
@@ -76,14 +146,82 @@ class OnocoyStationStore:
         except Exception:
             return int(default)
 
+    def _invalidate(self, station_id: str | None = None, dirty: bool = True) -> None:
+        """Call (under the lock) after mutating `self.stations`; None = all stations."""
+        if dirty:
+            self._dirty = True
+        self._snapshot = None
+        if station_id is None:
+            self._frozen_stations = {}
+        else:
+            self._frozen_stations.pop(station_id, None)
+
     def get_snapshot(self) -> dict:
-        # Deep copy via JSON roundtrip (small dict; reliability over micro-optimization).
+        """
+        Read-only view of all stations ({station_id: {...}}). O(1) and lock-free
+        while nothing changed; callers must not (and cannot) mutate it.
+        """
+        snap = self._snapshot
+        if snap is not None:
+            return snap
         with self._lock:
-            return json.loads(json.dumps(self.stations))
+            if self._snapshot is None:
+                frozen = self._frozen_stations
+                for sid, st in self.stations.items():
+                    if sid not in frozen:
+                        frozen[sid] = FrozenDict(st)
+                self._snapshot = FrozenDict((sid, frozen[sid]) for sid in self.stations)
+            return self._snapshot
 
     def save_stations(self) -> None:
+        """Request persistence. With the flusher running this only wakes it (rate-limited);
+        without it, writes now if anything changed."""
+        if self._flusher is not None:
+            if self._dirty:
+                self._flush_wake.set()
+            return
+        self.flush()
+
+    def flush(self, force: bool = False) -> bool:
+        """Write the stations file if dirty (or `force`). Returns True if written."""
         with self._lock:
-            self._safe_write_json(self.stations_path, self.stations)
+            if not (self._dirty or force):
+                self._write_stats["skipped_clean"] += 1
+                return False
+            data = {sid: dict(st) for sid, st in self.stations.items()}
+            self._dirty = False
+        ok = self._safe_write_json(self.stations_path, data)
+        if not ok:
+            with self._lock:
+                self._dirty = True
+        self._last_flush = time.monotonic()
+        return ok
+
+    def _flusher_loop(self) -> None:
+        thread_registry.register(expect_sec=2 * self.min_flush_interval_sec)
+        while True:
+            thread_registry.beat()
+            self._flush_wake.wait(timeout=self.min_flush_interval_sec)
+            self._flush_wake.clear()
+            wait = self._last_flush + self.min_flush_interval_sec - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            if self._dirty:
+                self.flush()
+
+    def start_flusher(self, min_flush_interval_sec: float = 60.0) -> None:
+        """Start the write-behind flusher (at most one stations write per interval)."""
+        self.min_flush_interval_sec = float(min_flush_interval_sec)
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flusher_loop, name="onocoy-flush", daemon=True)
+            self._flusher.start()
+
+    def write_stats(self) -> dict:
+        with self._write_lock:
+            out = dict(self._write_stats)
+        out["dirty"] = self._dirty
+        out["min_flush_interval_sec"] = self.min_flush_interval_sec
+        return out
 
     def get_polling_interval(self) -> int:
         with self._lock:
@@ -98,17 +236,57 @@ class OnocoyStationStore:
                     "last_updated": None,
                     "last_checked": None,
                 }
+                self._invalidate(station_id)
 
     def add_station(self, station_id: str, nickname: str | None = None) -> None:
         with self._lock:
             self.ensure_station_exists(station_id, nickname=nickname)
             if nickname is not None:
                 self.stations[station_id]["nickname"] = nickname
+                self._invalidate(station_id)
 
     def remove_station(self, station_id: str) -> None:
         with self._lock:
             if station_id in self.stations:
                 del self.stations[station_id]
+                self._invalidate(station_id)
+
+    def has_station(self, station_id: str) -> bool:
+        """Locked membership test; unlike get_snapshot() it never rebuilds the snapshot."""
+        with self._lock:
+            return station_id in self.stations
+
+    def get_station_poll_interval(self, station_id: str) -> int | None:
+        """Per-station polling interval override (seconds), or None to use the adaptive schedule."""
+        with self._lock:
+            st = self.stations.get(station_id)
+            return st.get("poll_interval") if st else None
+
+    def set_station_poll_interval(self, station_id: str, interval_sec: int | None) -> int | None:
+        """
+        Pin a station to a fixed polling interval (None/0 clears the override).
+        Values below min_poll_interval_sec are raised to it. Raises ValueError for
+        anything that is not a non-negative integer.
+        """
+        if interval_sec is not None:
+            if isinstance(interval_sec, bool) or (isinstance(interval_sec, float) and not interval_sec.is_integer()):
+                raise ValueError(f"poll_interval must be an integer, got {interval_sec!r}")
+            try:
+                interval_sec = int(interval_sec)
+            except (TypeError, ValueError):
+                raise ValueError(f"poll_interval must be an integer, got {interval_sec!r}") from None
+            if interval_sec < 0:
+                raise ValueError(f"poll_interval must not be negative, got {interval_sec}")
+        with self._lock:
+            if station_id not in self.stations:
+                return None
+            self._invalidate(station_id)
+            if not interval_sec:
+                self.stations[station_id].pop("poll_interval", None)
+                return None
+            pi = max(self.min_poll_interval_sec, interval_sec)
+            self.stations[station_id]["poll_interval"] = pi
+            return pi
 
     def set_polling_interval(self, polling_interval_sec: int) -> int:
         with self._lock:
@@ -118,12 +296,13 @@ class OnocoyStationStore:
             self._safe_write_json(self.settings_path, self.settings)
             return pi
 
-    def update_station_from_onocoy_info(self, station_id: str, info: dict, now_iso: str | None = None) -> None:
+    def update_station_from_onocoy_info(self, station_id: str, info: dict, now_iso: str | None = None) -> bool:
         """
         Update a station's cached status using the response JSON from Onocoy.
         Expected shape:
           info["status"]["is_up"] -> bool
           info["status"]["since"] -> str timestamp
+        Returns True if the Online/Offline status changed.
         """
         now_iso = now_iso or _utc_now_iso()
         raw_status = {}
@@ -138,8 +317,16 @@ class OnocoyStationStore:
         with self._lock:
             if station_id not in self.stations:
                 # Do not recreate removed station automatically.
-                return
-            self.stations[station_id]["status"] = "Online" if is_up else "Offline"
+                return False
+            status = "Online" if is_up else "Offline"
+            # The first check of a new station is not a change (status was only a placeholder).
+            prev = self.stations[station_id]
+            changed = prev.get("last_checked") is not None and prev.get("status") != status
+            # Only status / since changes need persisting; last_checked rides along later.
+            persist = prev.get("status") != status or prev.get("last_updated") != since
+            self.stations[station_id]["status"] = status
             self.stations[station_id]["last_updated"] = since
             self.stations[station_id]["last_checked"] = now_iso
+            self._invalidate(station_id, dirty=persist)
+            return changed
 
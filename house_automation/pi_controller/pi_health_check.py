@@ -3,16 +3,60 @@
 Pi health check: memory, CPU load, disk, serial port usage, and smart-home API health.
 Run manually or from cron to monitor why the Pi might crash (e.g. with n8n + smart-home).
 
+Everything is read from /proc, /sys and statvfs (no df / lsof subprocesses), so
+it is cheap enough to run as a sampler: --daemon appends one fixed-width record
+per interval to a ring file (ring_file.py, fixed size, survives power cuts) and
+--report summarises it: min / avg / max / trend per metric, threshold breaches,
+and gaps where no sample was taken (daemon stopped, or the Pi froze).
+
 Usage:
   python3 pi_health_check.py              # Print one report to stdout
   python3 pi_health_check.py --log FILE   # Append report to FILE (for cron)
   python3 pi_health_check.py --api        # Also GET localhost:5000/api/health?system=true
+  python3 pi_health_check.py --daemon --interval 10          # Sample into logs/health_ring.bin
+  python3 pi_health_check.py --report --since 180 [--json]   # Last 3 hours from the ring
 """
 import argparse
-import subprocess
+import json
+import math
+import os
+import signal
 import sys
 import time
 
+from ring_file import RingFile, RingFileError
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RING = os.path.join(HERE, "logs", "health_ring.bin")
+SERIAL_PORT = "/dev/serial0"
+SERVICE_SCRIPT = "web_server.py"
+
+# Warning thresholds (one-shot report and --report breaches).
+LOW_MEM_MB = 100
+HIGH_LOAD = 4.0
+LOW_DISK_MB = 500
+HIGH_TEMP_C = 80.0
+SERVICE_RSS_MB = 350         # smart-home.service has MemoryMax=400M
+
+RING_FIELDS = [
+    ("ts", "d"),
+    ("mem_total_kb", "I"),
+    ("mem_avail_kb", "I"),
+    ("swap_free_kb", "I"),
+    ("load1", "f"),
+    ("load5", "f"),
+    ("load15", "f"),
+    ("cpu_pct", "f"),          # whole machine, since the previous sample (NaN on the first)
+    ("disk_avail_mb", "I"),
+    ("disk_used_mb", "I"),
+    ("temp_c", "f"),           # NaN when there is no thermal zone
+    ("serial_holders", "b"),   # processes with the serial device open, -1 = unknown
+    ("serial_pid", "i"),
+    ("svc_pid", "i"),          # smart-home web_server.py, 0 = not running
+    ("svc_rss_kb", "I"),
+    ("svc_threads", "H"),
+]
+
 
 def meminfo():
     try:
@@ -41,41 +85,85 @@ def loadavg():
 
 def disk_mb(mount="/"):
     try:
-        r = subprocess.run(
-            ["df", "-m", mount], capture_output=True, text=True, timeout=5
-        )
-        if r.returncode != 0 or not r.stdout:
-            return None
-        line = r.stdout.strip().split("\n")[-1]
-        parts = line.split()
-        if len(parts) >= 4:
-            return {"used_mb": int(parts[2]), "avail_mb": int(parts[3])}
-    except Exception:
-        pass
-    return None
+        st = os.statvfs(mount)
+    except OSError:
+        return None
+    total = st.f_blocks * st.f_frsize // (1024 * 1024)
+    free = st.f_bfree * st.f_frsize // (1024 * 1024)
+    return {"used_mb": total - free, "avail_mb": st.f_bavail * st.f_frsize // (1024 * 1024)}
 
 
-def serial_usage(port="/dev/serial0"):
-    """Return PID and command that have the serial device open, or None."""
+def cpu_times():
+    """(busy, total) jiffies from the first line of /proc/stat."""
     try:
-        r = subprocess.run(
-            ["lsof", port], capture_output=True, text=True, timeout=3
-        )
-        if r.returncode != 0:
-            return None
-        lines = r.stdout.strip().split("\n")[1:]  # skip header
-        if not lines:
-            return None
-        procs = []
-        for line in lines:
-            parts = line.split()
-            if len(parts) >= 2:
-                procs.append({"pid": parts[1], "cmd": " ".join(parts[1:])[:60]})
-        return procs
-    except FileNotFoundError:
-        return "lsof not installed"
-    except Exception as e:
-        return str(e)
+        with open("/proc/stat") as f:
+            vals = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = vals[3] + (vals[4] if len(vals) > 4 else 0)    # idle + iowait
+    total = sum(vals[:8])                                  # guest time is already in user
+    return total - idle, total
+
+
+def cpu_temp_c():
+    try:
+        with open("/sys/class/thermal/thermal_zone0/temp") as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+def _cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode("utf-8", errors="replace").strip()
+    except OSError:
+        return ""
+
+
+def _has_open(pid, target):
+    """True if process `pid` has `target` open (readlink over /proc/<pid>/fd)."""
+    fd_dir = f"/proc/{pid}/fd"
+    try:
+        fds = os.listdir(fd_dir)
+    except OSError:
+        return False
+    for fd in fds:
+        try:
+            if os.readlink(f"{fd_dir}/{fd}") == target:
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def serial_usage(port=SERIAL_PORT):
+    """Return PID and command that have the serial device open, or None."""
+    target = os.path.realpath(port)       # /dev/serial0 is a symlink to ttyS0 / ttyAMA0
+    if not os.path.exists(target):
+        return None
+    procs = []
+    for pid in os.listdir("/proc"):
+        if pid.isdigit() and _has_open(pid, target):
+            procs.append({"pid": pid, "cmd": _cmdline(pid)[:60]})
+    return procs or None
+
+
+def service_process(hint_pid=None):
+    """(pid, rss kB, threads) of the smart-home web server, or None. Checks `hint_pid` first."""
+    first = [str(hint_pid)] if hint_pid else []
+    pids = first + [p for p in os.listdir("/proc") if p.isdigit() and p not in first]
+    for pid in pids:
+        cmd = _cmdline(pid)
+        if SERVICE_SCRIPT not in cmd or "python" not in cmd:
+            continue
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+            return int(pid), int(status["VmRSS"].split()[0]), int(status["Threads"])
+        except (OSError, KeyError, ValueError, IndexError):
+            continue
+    return None
 
 
 def api_health():
@@ -86,18 +174,249 @@ def api_health():
             headers={"User-Agent": "PiHealthCheck/1.0"},
         )
         with urllib.request.urlopen(req, timeout=5) as resp:
-            import json
             return json.load(resp)
     except Exception as e:
         return {"error": str(e)}
 
 
+# --- Daemon: one record per interval into the ring file ---
+
+class Sampler:
+    """Collects RING_FIELDS values; keeps the state that makes repeated samples cheap."""
+
+    def __init__(self, port=SERIAL_PORT, full_scan_every=6):
+        self.port = port
+        self.full_scan_every = full_scan_every
+        self._cpu = cpu_times()
+        self._n = 0
+        self._serial = (-1, 0)          # (holders, first holder pid)
+        self._svc_pid = None
+
+    def _serial_sample(self):
+        target = os.path.realpath(self.port)
+        if not os.path.exists(target):
+            self._serial = (-1, 0)
+            return self._serial
+        holders, pid = self._serial
+        # Fast path: the last holder still has it open -> skip the full /proc/*/fd walk most rounds.
+        if pid and self._n % self.full_scan_every and _has_open(pid, target):
+            return self._serial
+        procs = serial_usage(self.port) or []
+        self._serial = (len(procs), int(procs[0]["pid"]) if procs else 0)
+        return self._serial
+
+    def sample(self):
+        self._n += 1
+        mem = meminfo()
+        la = [float(x) for x in loadavg()] or [math.nan] * 3
+        cpu = cpu_times()
+        cpu_pct = math.nan
+        if cpu and self._cpu and cpu[1] > self._cpu[1]:
+            cpu_pct = 100.0 * (cpu[0] - self._cpu[0]) / (cpu[1] - self._cpu[1])
+        self._cpu = cpu
+        d = disk_mb("/") or {"used_mb": 0, "avail_mb": 0}
+        temp = cpu_temp_c()
+        holders, serial_pid = self._serial_sample()
+        svc = service_process(self._svc_pid)
+        self._svc_pid = svc[0] if svc else None
+        return (
+            time.time(),
+            mem.get("MemTotal", 0),
+            mem.get("MemAvailable", 0),
+            mem.get("SwapFree", 0),
+            la[0], la[1], la[2],
+            cpu_pct,
+            d["avail_mb"],
+            d["used_mb"],
+            math.nan if temp is None else temp,
+            max(-1, min(127, holders)),
+            serial_pid,
+            svc[0] if svc else 0,
+            svc[1] if svc else 0,
+            min(65535, svc[2]) if svc else 0,
+        )
+
+
+def run_daemon(args):
+    sync_every = args.sync_every or max(1, int(round(30.0 / args.interval)))
+    ring = RingFile(args.ring, RING_FIELDS, args.capacity, sync_every=sync_every)
+    sampler = Sampler(args.port)
+    running = [True]
+
+    def _stop(_sig, _frame):
+        running[0] = False
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    print(f"Sampling every {args.interval:g}s into {args.ring} ({args.capacity} records, "
+          f"{args.capacity * args.interval / 3600.0:.1f} h, {ring.size // 1024} KB)", flush=True)
+    next_t = time.monotonic()
+    while running[0]:
+        try:
+            ring.append(*sampler.sample())
+        except Exception as e:
+            print(f"sample failed: {e}", file=sys.stderr, flush=True)
+        next_t += args.interval
+        delay = next_t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_t = time.monotonic()
+    ring.close()
+    return 0
+
+
+# --- Report: trends and breaches from the ring ---
+
+BREACHES = [
+    # (name, field, test, description)
+    ("low_memory", "mem_avail_kb", lambda v: v / 1024.0 < LOW_MEM_MB, f"available memory < {LOW_MEM_MB} MB"),
+    ("high_load", "load1", lambda v: v > HIGH_LOAD, f"load1 > {HIGH_LOAD:g}"),
+    ("low_disk", "disk_avail_mb", lambda v: v < LOW_DISK_MB, f"disk avail < {LOW_DISK_MB} MB"),
+    ("hot", "temp_c", lambda v: v > HIGH_TEMP_C, f"CPU temperature > {HIGH_TEMP_C:g} C"),
+    ("service_rss", "svc_rss_kb", lambda v: v / 1024.0 > SERVICE_RSS_MB, f"smart-home RSS > {SERVICE_RSS_MB} MB"),
+    ("service_down", "svc_pid", lambda v: v == 0, "smart-home web_server.py not running"),
+    ("serial_shared", "serial_holders", lambda v: v > 1, "serial port open by more than one process"),
+    ("serial_closed", "serial_holders", lambda v: v == 0, "serial port not open by anyone"),
+]
+
+TREND_FIELDS = ["mem_avail_kb", "swap_free_kb", "load1", "cpu_pct", "disk_avail_mb", "temp_c",
+                "svc_rss_kb", "svc_threads"]
+
+
+def _fmt_ts(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+
+
+def _slope_per_hour(xs, ys):
+    n = len(xs)
+    if n < 3:
+        return None
+    mx, my = sum(xs) / n, sum(ys) / n
+    var = sum((x - mx) ** 2 for x in xs)
+    if not var:
+        return None
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var * 3600.0
+
+
+def summarise(records, interval=None):
+    """Stats, breaches and gaps for a list of ring records (oldest first)."""
+    if not records:
+        return {"samples": 0}
+    ts = [r["ts"] for r in records]
+    steps = sorted(b - a for a, b in zip(ts, ts[1:]))
+    interval = interval or (steps[len(steps) // 2] if steps else None)
+    out = {
+        "samples": len(records),
+        "from": _fmt_ts(ts[0]),
+        "to": _fmt_ts(ts[-1]),
+        "interval_sec": round(interval, 1) if interval else None,
+        "metrics": {},
+        "breaches": {},
+        "gaps": [],
+    }
+    for field in TREND_FIELDS:
+        pts = [(r["ts"], r[field]) for r in records
+               if not (isinstance(r[field], float) and math.isnan(r[field]))
+               and not (field.startswith("svc_") and r["svc_pid"] == 0)]
+        if not pts:
+            continue
+        vals = [v for _t, v in pts]
+        slope = _slope_per_hour([t for t, _v in pts], vals)
+        out["metrics"][field] = {
+            "min": round(min(vals), 2),
+            "avg": round(sum(vals) / len(vals), 2),
+            "max": round(max(vals), 2),
+            "last": round(vals[-1], 2),
+            "trend_per_hour": round(slope, 2) if slope is not None else None,
+        }
+    for name, field, test, desc in BREACHES:
+        hits = [r for r in records
+                if not (isinstance(r[field], float) and math.isnan(r[field])) and test(r[field])]
+        if field == "serial_holders":
+            hits = [r for r in hits if r["serial_holders"] >= 0]
+        if hits:
+            out["breaches"][name] = {
+                "what": desc,
+                "samples": len(hits),
+                "pct": round(100.0 * len(hits) / len(records), 1),
+                "first": _fmt_ts(hits[0]["ts"]),
+                "last": _fmt_ts(hits[-1]["ts"]),
+            }
+    if interval:
+        for a, b in zip(records, records[1:]):
+            if b["ts"] - a["ts"] > 3 * interval:
+                out["gaps"].append({
+                    "from": _fmt_ts(a["ts"]),
+                    "to": _fmt_ts(b["ts"]),
+                    "minutes": round((b["ts"] - a["ts"]) / 60.0, 1),
+                    # Memory / load just before the gap: what the Pi looked like when it froze.
+                    "before": {"mem_avail_mb": a["mem_avail_kb"] // 1024, "load1": round(a["load1"], 2),
+                               "svc_rss_mb": a["svc_rss_kb"] // 1024},
+                })
+    return out
+
+
+def run_report(args):
+    try:
+        ring = RingFile.open(args.ring)
+    except FileNotFoundError:
+        print(f"No ring file at {args.ring} (start the sampler with --daemon)", file=sys.stderr)
+        return 1
+    except RingFileError as e:
+        print(f"Unreadable ring file {args.ring}: {e}", file=sys.stderr)
+        return 1
+    records = [r for r in ring.records() if r["ts"] >= time.time() - args.since * 60]
+    corrupt = ring.corrupt
+    ring.close()
+    summary = summarise(records)
+    summary["corrupt_records"] = corrupt
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+    if not records:
+        print(f"No samples in the last {args.since} min")
+        return 0
+    lines = [f"=== Pi health {summary['from']} -> {summary['to']} "
+             f"({summary['samples']} samples every ~{summary['interval_sec']}s) ==="]
+    lines.append(f"{'metric':<16} {'min':>10} {'avg':>10} {'max':>10} {'last':>10} {'trend/h':>10}")
+    for field, m in summary["metrics"].items():
+        trend = "-" if m["trend_per_hour"] is None else f"{m['trend_per_hour']:+.2f}"
+        lines.append(f"{field:<16} {m['min']:>10} {m['avg']:>10} {m['max']:>10} {m['last']:>10} {trend:>10}")
+    if summary["breaches"]:
+        lines.append("--- Threshold breaches ---")
+        for name, b in summary["breaches"].items():
+            lines.append(f"  {b['what']}: {b['samples']} samples ({b['pct']}%), {b['first']} .. {b['last']}")
+    else:
+        lines.append("No threshold breaches")
+    for g in summary["gaps"]:
+        lines.append(f"  GAP {g['from']} -> {g['to']} ({g['minutes']} min, before: {g['before']})")
+    if corrupt:
+        lines.append(f"  {corrupt} torn / corrupt record(s) skipped")
+    print("\n".join(lines))
+    return 0
+
+
 def main():
     ap = argparse.ArgumentParser(description="Pi health check for smart-home + n8n")
     ap.add_argument("--log", metavar="FILE", help="Append report to FILE (for cron)")
     ap.add_argument("--api", action="store_true", help="Also query /api/health?system=true")
+    ap.add_argument("--daemon", action="store_true", help="Sample continuously into the ring file")
+    ap.add_argument("--report", action="store_true", help="Summarise the ring file")
+    ap.add_argument("--ring", default=DEFAULT_RING, help="Ring file (default logs/health_ring.bin)")
+    ap.add_argument("--interval", type=float, default=10.0, help="--daemon: seconds between samples")
+    ap.add_argument("--capacity", type=int, default=8640, help="--daemon: records kept (8640 = 24 h at 10 s)")
+    ap.add_argument("--sync-every", type=int, default=0, help="--daemon: msync every N records (default ~30 s)")
+    ap.add_argument("--port", default=SERIAL_PORT, help="Serial device to look for")
+    ap.add_argument("--since", type=float, default=1440, help="--report: minutes back (default 24 h)")
+    ap.add_argument("--json", action="store_true", help="--report: JSON output")
     args = ap.parse_args()
 
+    if args.daemon:
+        return run_daemon(args)
+    if args.report:
+        return run_report(args)
+
     ts = time.strftime("%Y-%m-%d %H:%M:%S")
     lines = [
         f"=== Pi health @ {ts} ===",
@@ -113,7 +432,7 @@ def main():
         used_mb = total_mb - avail_mb
         pct = (used_mb / total_mb * 100) if total_mb else 0
         lines.append(f"Memory: {used_mb} MB / {total_mb} MB ({pct:.0f}%) available {avail_mb} MB")
-        if avail_mb < 100:
+        if avail_mb < LOW_MEM_MB:
             lines.append("  WARNING: Low memory - can cause Pi freeze or OOM kill")
     else:
         lines.append("Memory: (unable to read)")
@@ -123,7 +442,7 @@ def main():
     if la:
         lines.append(f"Load avg: {la[0]} {la[1]} {la[2]}")
         try:
-            if float(la[0]) > 4.0:
+            if float(la[0]) > HIGH_LOAD:
                 lines.append("  WARNING: High load - Pi may be overloaded (n8n + smart-home + others)")
         except ValueError:
             pass
@@ -134,19 +453,17 @@ def main():
     d = disk_mb("/")
     if d:
         lines.append(f"Disk /: used {d['used_mb']} MB, avail {d['avail_mb']} MB")
-        if d["avail_mb"] < 500:
+        if d["avail_mb"] < LOW_DISK_MB:
             lines.append("  WARNING: Low disk space")
     else:
         lines.append("Disk: (unable to read)")
 
     # Serial port
-    ser = serial_usage()
+    ser = serial_usage(args.port)
     if ser is None:
-        lines.append("Serial /dev/serial0: no process (or not open)")
-    elif isinstance(ser, str):
-        lines.append(f"Serial: {ser}")
+        lines.append(f"Serial {args.port}: no process (or not open)")
     else:
-        lines.append(f"Serial /dev/serial0: {len(ser)} process(es)")
+        lines.append(f"Serial {args.port}: {len(ser)} process(es)")
         for p in ser:
             lines.append(f"  PID {p.get('pid')} {p.get('cmd', '')}")
 
@@ -0,0 +1,224 @@
+"""
+Background Bluetooth presence tracker (phone(s) home / away).
+
+Instead of spawning `l2ping` / `hcitool` on every request, one thread probes
+the configured devices and keeps the answer:
+
+- all devices are probed concurrently; the user is HOME if any device answers,
+- cadence adapts: `interval_sec` when settled, `fast_interval_sec` while a
+  change is being confirmed, before the first answer, inside `fast_windows`
+  (("HH:MM", "HH:MM") pairs) and within `learn_window_min` of the times of day
+  recent transitions happened,
+- hysteresis: HOME after `home_confirm` positive rounds, AWAY only after
+  `away_confirm` negative rounds in a row (a phone in deep sleep misses pings),
+- `on_change(is_home, check)` is called once per confirmed transition.
+
+`probe_now()` (dashboard button) runs one round immediately; its result goes
+through the same hysteresis, so one missed ping never switches to AWAY. When
+the tracker thread is not running (PRESENCE_TRACKING=0) `is_home()` probes on
+every call, as the per-request check used to.
+
+Example:
+    tracker = PresenceTracker(["48:EF:1C:49:6A:E7"], on_change=lambda home, check: ...)
+    tracker.start()
+    tracker.is_home()    # cached state, no subprocess
+    tracker.stats()      # {"state": "HOME", "since": ..., "probes": ..., "suppressed_flaps": ...}
+"""
+import logging
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import thread_registry
+
+logger = logging.getLogger("PiController")
+
+
+def probe_mac(mac, timeout_sec=2):
+    """One device: l2ping, then hcitool name as fallback -> (is_home, method, error)."""
+    errors = []
+    try:
+        subprocess.check_output(["sudo", "l2ping", "-c", "1", "-t", str(int(timeout_sec)), mac],
+                                stderr=subprocess.STDOUT, timeout=timeout_sec + 3)
+        return True, "l2ping", ""
+    except subprocess.CalledProcessError as e:
+        out = (e.output or b"").decode('utf-8', errors='ignore').strip()
+        errors.append(f"l2ping failed: {out or e}")
+    except Exception as e:
+        errors.append(f"l2ping error: {e}")
+    try:
+        name = subprocess.check_output(["hcitool", "name", mac], stderr=subprocess.STDOUT,
+                                       timeout=timeout_sec + 8).strip().decode('utf-8', errors='ignore')
+        if name:
+            return True, "hcitool", ""
+    except Exception as e:
+        errors.append(f"hcitool error: {e}")
+    return False, "fallback_away", "; ".join(errors) if errors else "No presence method succeeded."
+
+
+def _minute_of_day(hhmm):
+    h, m = hhmm.split(":")
+    return int(h) * 60 + int(m)
+
+
+class PresenceTracker:
+    def __init__(self, macs, on_change=None, on_check=None, probe=probe_mac, interval_sec=60,
+                 fast_interval_sec=10, home_confirm=1, away_confirm=3, fast_windows=(), learn_window_min=15):
+        self.macs = list(macs)
+        self.on_change = on_change
+        # on_check(result, method, error) after every round (e.g. controller.last_presence_check).
+        self.on_check = on_check
+        self.probe = probe
+        self.interval_sec = float(interval_sec)
+        self.fast_interval_sec = float(fast_interval_sec)
+        self.home_confirm = max(1, int(home_confirm))
+        self.away_confirm = max(1, int(away_confirm))
+        self.fast_windows = [(_minute_of_day(a), _minute_of_day(b)) for a, b in fast_windows]
+        self.learn_window_min = int(learn_window_min)
+        self.state = None            # True = HOME, False = AWAY, None = not known yet
+        self.since = None
+        self.last_check = {}
+        self._streak = 0             # consecutive rounds disagreeing with `state`
+        self._transition_minutes = deque(maxlen=14)
+        self._lock = threading.Lock()          # one probe round at a time
+        self._pool = ThreadPoolExecutor(max_workers=max(1, min(4, len(self.macs))),
+                                        thread_name_prefix="presence-probe")
+        self._stop = threading.Event()
+        self._thread = None
+        self.next_interval = self.fast_interval_sec
+        self._stats = {"rounds": 0, "probes": 0, "transitions": 0, "suppressed_flaps": 0, "round_ms": 0.0}
+
+    # --- Probing ---
+
+    def _round(self):
+        """Probe every device concurrently -> (is_home, method, error, per-device results)."""
+        t0 = time.monotonic()
+        results = list(self._pool.map(self.probe, self.macs)) if self.macs else []
+        self._stats["rounds"] += 1
+        self._stats["probes"] += len(results)
+        self._stats["round_ms"] = round((time.monotonic() - t0) * 1000.0, 1)
+        devices = {mac: {"home": r[0], "method": r[1], "error": r[2]} for mac, r in zip(self.macs, results)}
+        for is_home, method, error in results:
+            if is_home:
+                return True, method, "", devices
+        errors = "; ".join(r[2] for r in results if r[2]) or "no presence devices configured"
+        return False, "fallback_away", errors, devices
+
+    def _apply(self, observed, method, error, devices):
+        now = time.time()
+        self.last_check = {"result": observed, "method": method, "error": error, "timestamp": now,
+                           "devices": devices}
+        if self.on_check:
+            self.on_check(observed, method, error)
+        if observed == self.state:
+            if self._streak:
+                self._stats["suppressed_flaps"] += 1
+            self._streak = 0
+            return False
+        self._streak += 1
+        needed = self.home_confirm if observed else self.away_confirm
+        if self.state is not None and self._streak < needed:
+            logger.info("Presence: %s seen (%d/%d), not switching yet", "HOME" if observed else "AWAY",
+                        self._streak, needed)
+            return False
+        first = self.state is None
+        self.state, self.since, self._streak = observed, now, 0
+        if first:
+            logger.info("Presence: initial state %s (%s)", "HOME" if observed else "AWAY", method)
+            return True
+        self._stats["transitions"] += 1
+        local = datetime.now()
+        self._transition_minutes.append(local.hour * 60 + local.minute)
+        logger.info("Presence: -> %s (%s)", "HOME" if observed else "AWAY", method)
+        if self.on_change:
+            try:
+                self.on_change(observed, dict(self.last_check))
+            except Exception as e:
+                logger.error("Presence change callback failed: %s", e)
+        return True
+
+    def probe_now(self):
+        """One round right away (hysteresis still applies to a change). Returns is_home."""
+        with self._lock:
+            observed, method, error, devices = self._round()
+            self._apply(observed, method, error, devices)
+            return self.state
+
+    def is_home(self):
+        """Cached state while the tracker runs; otherwise (or before the first answer) probes now."""
+        state = self.state
+        if state is None or not self.running():
+            return self.probe_now()
+        return state
+
+    # --- Cadence ---
+
+    def _in_fast_window(self, now=None):
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end in self.fast_windows:
+            if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+                return True
+        for m in self._transition_minutes:
+            d = abs(minute - m)
+            if min(d, 1440 - d) <= self.learn_window_min:
+                return True
+        return False
+
+    def _interval(self):
+        if self.state is None or self._streak or self._in_fast_window():
+            return self.fast_interval_sec
+        return self.interval_sec
+
+    def _run(self):
+        thread_registry.register(expect_sec=self.interval_sec)
+        while not self._stop.is_set():
+            with self._lock:
+                try:
+                    observed, method, error, devices = self._round()
+                    self._apply(observed, method, error, devices)
+                except Exception as e:
+                    logger.error("Presence round failed: %s", e)
+            self.next_interval = self._interval()
+            thread_registry.beat(self.next_interval)
+            self._stop.wait(self.next_interval)
+        thread_registry.unregister()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="presence-tracker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    # --- Checkpoint / monitoring ---
+
+    def snapshot_checkpoint(self):
+        """Learned transition times survive restarts; the state itself is always re-probed."""
+        return {"transition_minutes": list(self._transition_minutes)}
+
+    def restore_checkpoint(self, data):
+        for m in (data or {}).get("transition_minutes", []):
+            self._transition_minutes.append(int(m) % 1440)
+
+    def stats(self):
+        return dict(
+            self._stats,
+            state=None if self.state is None else ("HOME" if self.state else "AWAY"),
+            since=self.since,
+            pending=self._streak,
+            next_interval_sec=self.next_interval,
+            devices=len(self.macs),
+            learned_transition_minutes=sorted(self._transition_minutes),
+        )
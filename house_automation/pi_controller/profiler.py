@@ -0,0 +1,128 @@
+"""
+On-demand sampling profiler for the running service (/api/debug/profile).
+
+Samples every thread's Python stack with sys._current_frames() at a fixed rate
+for a few seconds and counts identical stacks, grouped by thread name. The
+result is the "collapsed" format flamegraph.pl, speedscope and inferno read:
+
+    serial-reader;reader_thread (controller.py);readline (serialutil.py) 412
+    flask-worker;get_data (web_server.py);jsonify (json/__init__.py) 17
+
+It is wall-clock sampling: a thread blocked in sleep() / select() / a socket
+read shows up with that stack, which is what is wanted for "who is stuck where".
+Nothing is installed in the interpreter (no settrace / setprofile): between
+samples the service runs untouched, and one sample costs a walk over the live
+frames while holding the GIL (tens of microseconds for the ~20 threads here).
+Only one profile runs at a time.
+
+Thread names are normalised so pools aggregate: "Thread-12 (process_request_thread)"
+becomes "flask-worker", "scene-step_3" becomes "scene-step".
+
+Example:
+    prof = profiler.sample(seconds=5, hz=50)
+    print(prof.collapsed())                # "thread;frame;frame count" lines
+    prof.as_dict(top=20)                   # per-thread sample counts + hottest stacks
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_DEPTH = 64
+
+_busy = threading.Lock()
+_labels = {}            # code object -> "func (file.py)" (or with :line)
+
+_POOL_SUFFIX = re.compile(r"[_-]\d+$")
+_ANON = re.compile(r"^Thread-\d+(?: \((.+)\))?$")
+_ALIASES = {"process_request_thread": "flask-worker"}
+
+
+class ProfilerBusy(RuntimeError):
+    """Another profile is already running."""
+
+
+def thread_label(name):
+    """Group name for a thread: strips pool / counter suffixes, names Flask's request threads."""
+    m = _ANON.match(name or "")
+    if m:
+        name = m.group(1) or "thread"
+    name = _POOL_SUFFIX.sub("", name)
+    return _ALIASES.get(name, name)
+
+
+def _frame_label(code, lineno=None):
+    key = code if lineno is None else (code, lineno)
+    label = _labels.get(key)
+    if label is None:
+        label = f"{code.co_name} ({os.path.basename(code.co_filename)}" + (f":{lineno})" if lineno else ")")
+        _labels[key] = label
+    return label
+
+
+class Profile:
+    def __init__(self, seconds, hz, lines):
+        self.seconds = seconds
+        self.hz = hz
+        self.lines = lines
+        self.stacks = Counter()         # "thread;root;...;leaf" -> samples
+        self.samples = 0
+        self.elapsed = 0.0
+        self.overhead = 0.0             # seconds spent taking samples
+
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def as_dict(self, top=20):
+        per_thread = Counter()
+        for stack, n in self.stacks.items():
+            per_thread[stack.split(";", 1)[0]] += n
+        return {
+            "seconds": round(self.elapsed, 2),
+            "hz": self.hz,
+            "samples": self.samples,
+            "overhead_pct": round(100.0 * self.overhead / self.elapsed, 2) if self.elapsed else None,
+            "threads": dict(per_thread.most_common()),
+            "top": [{"stack": s, "count": n} for s, n in self.stacks.most_common(top)],
+        }
+
+
+def sample(seconds=5.0, hz=50, lines=False):
+    """Sample all threads (except the caller) for `seconds`. Raises ProfilerBusy if one is running."""
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        prof = Profile(seconds, hz, lines)
+        me = threading.get_ident()
+        interval = 1.0 / hz
+        t0 = time.perf_counter()
+        end = t0 + seconds
+        next_t = t0
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                parts = []
+                while frame is not None and len(parts) < MAX_DEPTH:
+                    parts.append(_frame_label(frame.f_code, frame.f_lineno if lines else None))
+                    frame = frame.f_back
+                parts.append(thread_label(names.get(ident, f"thread-{ident}")))
+                prof.stacks[";".join(reversed(parts))] += 1
+            prof.samples += 1
+            prof.overhead += time.perf_counter() - now
+            next_t += interval
+            delay = next_t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_t = time.perf_counter()    # fell behind: do not burst to catch up
+        prof.elapsed = time.perf_counter() - t0
+        return prof
+    finally:
+        _busy.release()
@@ -0,0 +1,207 @@
+"""
+Fixed-size ring of fixed-width binary records in a memory-mapped file.
+
+The file never grows: a 512-byte header (magic, record size, capacity and the
+field schema, so any reader can decode it without the writer's code) followed
+by `capacity` slots. Each slot holds a sequence number, the record packed with
+`struct`, and a CRC32 over both:
+
+    | seq u64 | field 1 | field 2 | ... | crc32 u32 |
+
+Appending writes one slot in place (slot = seq % capacity); nothing else is
+updated, so there is no header or index that a crash could leave half written.
+Readers take every slot whose CRC matches, ordered by sequence number; a slot
+torn by a power cut mid-write just fails its CRC and is skipped. The writer
+resumes after the highest valid sequence number when it reopens the file.
+
+Writes land in the page cache; `flush()` (msync) pushes them to the card.
+`sync_every=N` flushes every N appends. The file is created atomically (tmp +
+rename); an existing file with a different schema or capacity is moved to
+`<path>.old` and a fresh one started.
+
+Example:
+    ring = RingFile("logs/health_ring.bin", [("ts", "d"), ("mem_avail_kb", "I"), ("load1", "f")],
+                    capacity=8640, sync_every=6)
+    ring.append(time.time(), 181234, 0.42)
+    ring.records(limit=60)          # [{"seq": 17, "ts": ..., "mem_avail_kb": 181234, "load1": 0.42}, ...]
+
+    RingFile.open("logs/health_ring.bin").records()   # read-only, schema from the header
+"""
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from checkpoint import atomic_write_bytes
+
+MAGIC = b"PIRING01"
+HEADER_SIZE = 512
+_HEADER = struct.Struct("<8sHII H")     # magic, record size, capacity, reserved, schema length
+_SEQ = struct.Struct("<Q")
+_CRC = struct.Struct("<I")
+
+
+class RingFileError(ValueError):
+    """Not a ring file, or a schema that does not fit the header."""
+
+
+def _schema_text(fields):
+    return ",".join(f"{name}:{code}" for name, code in fields)
+
+
+def _parse_schema(text):
+    fields = []
+    for part in text.split(","):
+        name, _, code = part.partition(":")
+        if not name or not code:
+            raise RingFileError(f"bad schema entry {part!r}")
+        fields.append((name, code))
+    return fields
+
+
+def read_header(buf):
+    """(fields, capacity, slot size) from the first HEADER_SIZE bytes. Raises RingFileError."""
+    if len(buf) < HEADER_SIZE:
+        raise RingFileError("file shorter than the header")
+    magic, slot_size, capacity, _reserved, schema_len = _HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise RingFileError("not a ring file (bad magic)")
+    try:
+        schema = bytes(buf[_HEADER.size:_HEADER.size + schema_len]).decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise RingFileError(f"bad schema text: {e}") from None
+    return _parse_schema(schema), capacity, slot_size
+
+
+class RingFile:
+    def __init__(self, path, fields, capacity, sync_every=0, readonly=False):
+        self.path = path
+        self.fields = [(str(n), str(c)) for n, c in fields]
+        self.names = [n for n, _c in self.fields]
+        self.capacity = int(capacity)
+        self.sync_every = int(sync_every)
+        self.readonly = readonly
+        self._record = struct.Struct("<" + "".join(c for _n, c in self.fields))
+        self.slot_size = _SEQ.size + self._record.size + _CRC.size
+        self.size = HEADER_SIZE + self.capacity * self.slot_size
+        self._lock = threading.Lock()
+        self._since_sync = 0
+        self.corrupt = 0             # slots with a bad CRC seen by the last scan
+        if not readonly:
+            self._ensure_file()
+        fd = os.open(path, os.O_RDONLY if readonly else os.O_RDWR)
+        try:
+            self._mm = mmap.mmap(fd, self.size, access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        finally:
+            os.close(fd)
+        self._seq = max((seq for seq, _slot in self._scan()), default=0)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Open an existing ring read-only, schema and capacity taken from its header.
+        Raises RingFileError for anything that is not a complete ring file (bad magic,
+        unknown field codes, truncated).
+        """
+        with open(path, "rb") as f:
+            fields, capacity, slot_size = read_header(f.read(HEADER_SIZE))
+        try:
+            record = struct.Struct("<" + "".join(c for _n, c in fields))
+        except struct.error as e:
+            raise RingFileError(f"unsupported schema: {e}") from None
+        if slot_size != _SEQ.size + record.size + _CRC.size:
+            raise RingFileError("record size in the header does not match the schema")
+        if os.path.getsize(path) < HEADER_SIZE + capacity * slot_size:
+            raise RingFileError("file is truncated")
+        return cls(path, fields, capacity, readonly=True)
+
+    # --- file ---
+
+    def _header_bytes(self):
+        schema = _schema_text(self.fields).encode("utf-8")
+        if _HEADER.size + len(schema) > HEADER_SIZE:
+            raise RingFileError("schema too long for the header")
+        head = _HEADER.pack(MAGIC, self.slot_size, self.capacity, 0, len(schema)) + schema
+        return head.ljust(HEADER_SIZE, b"\0")
+
+    def _ensure_file(self):
+        header = self._header_bytes()
+        try:
+            with open(self.path, "rb") as f:
+                current = f.read(HEADER_SIZE)
+            if current == header and os.path.getsize(self.path) == self.size:
+                return
+            os.replace(self.path, self.path + ".old")    # other schema / capacity: keep it aside
+        except FileNotFoundError:
+            pass
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        atomic_write_bytes(self.path, header + bytes(self.size - HEADER_SIZE))
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                if not self.readonly:
+                    self._mm.flush()
+                self._mm.close()
+                self._mm = None
+
+    def flush(self):
+        """msync: make appended records survive a power cut."""
+        with self._lock:
+            if self._mm is not None and not self.readonly:
+                self._mm.flush()
+                self._since_sync = 0
+
+    # --- records ---
+
+    def append(self, *values):
+        """Write one record (values in field order). Returns its sequence number."""
+        with self._lock:
+            seq = self._seq + 1
+            body = _SEQ.pack(seq) + self._record.pack(*values)
+            off = HEADER_SIZE + (seq % self.capacity) * self.slot_size
+            self._mm[off:off + self.slot_size] = body + _CRC.pack(zlib.crc32(body))
+            self._seq = seq
+            if self.sync_every:
+                self._since_sync += 1
+                if self._since_sync >= self.sync_every:
+                    self._mm.flush()
+                    self._since_sync = 0
+            return seq
+
+    def _scan(self):
+        """[(seq, slot offset)] of valid slots, unordered."""
+        mm = self._mm
+        body_len = self.slot_size - _CRC.size
+        out = []
+        corrupt = 0
+        for i in range(self.capacity):
+            off = HEADER_SIZE + i * self.slot_size
+            seq = _SEQ.unpack_from(mm, off)[0]
+            if seq == 0:
+                continue
+            if zlib.crc32(mm[off:off + body_len]) != _CRC.unpack_from(mm, off + body_len)[0]:
+                corrupt += 1
+                continue
+            out.append((seq, off))
+        self.corrupt = corrupt
+        return out
+
+    def records(self, limit=None, since_seq=0):
+        """Valid records oldest -> newest as dicts (with "seq"); `limit` keeps the newest N."""
+        with self._lock:
+            slots = sorted(s for s in self._scan() if s[0] > since_seq)
+            if limit:
+                slots = slots[-limit:]
+            out = []
+            for seq, off in slots:
+                rec = dict(zip(self.names, self._record.unpack_from(self._mm, off + _SEQ.size)))
+                rec["seq"] = seq
+                out.append(rec)
+            return out
+
+    def last_seq(self):
+        return self._seq
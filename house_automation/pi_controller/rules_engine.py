@@ -0,0 +1,368 @@
+"""
+Declarative automation rules (replaces the hard-coded daily scheduler).
+
+Rules live in a JSON file (config.RULES_PATH, default rules.json) and are
+re-read when the file changes. Each rule has one or more triggers, optional
+conditions (all must hold) and a list of actions:
+
+    {"rules": [
+      {"id": "morning", "trigger": {"type": "time", "at": "10:00"},
+       "conditions": [{"presence": "home"}],
+       "actions": [{"do": "led", "state": "on"}, {"do": "ir", "code": "F7C03F"}]},
+      {"id": "bottle_missing_evening", "trigger": {"type": "hydration", "cmd": "0x50"},
+       "conditions": [{"time_between": ["18:00", "23:00"]}],
+       "actions": [{"do": "aio", "device": "spot", "state": "on"}],
+       "cooldown_sec": 600}
+    ]}
+
+Triggers (`type` + key field; other fields must equal the event's data):
+    time       "at": "HH:MM" or a list         fired on local minute boundaries
+    presence   "to": "home" / "away"           HOME/AWAY transitions
+    hydration  "cmd": 0x50 / "0x52" / 96       slave reports (0x50 missing, 0x52 reminder, 0x60 drink, ...)
+    onocoy     "to": "online" / "offline"      station status changes, "station": "<id>" to narrow
+    Leaving out the key field matches every event of that type.
+
+Conditions: {"presence": "home"}, {"time_between": ["22:00", "06:00"]},
+{"weekdays": ["mon", "fri"]}, {"field": "ml", "gte": 250} (gt/gte/lt/lte/eq on event data).
+Actions are looked up by `do` in the handlers passed to RulesEngine; the engine
+only knows "log". They follow the scenes.py convention: None / True / "ok" /
+"unchanged" is success; False, any other status string or an exception counts
+as an error of the rule (`errors`, `last_error`).
+
+Events go through one queue and one worker thread. Rules are indexed by
+(type, key) when loaded, so an event only evaluates the rules that reference
+it (a hydration report does not walk the time rules). Actions run on the
+worker; time events for minutes that passed while an action blocked it are
+dispatched late rather than dropped. Per-rule stats: fired /
+skipped / errors and the latency from the event to the last action returning.
+
+Example:
+    engine = RulesEngine("rules.json", actions={"led": do_led}, presence=lambda: ctrl.is_phone_home())
+    engine.start()
+    engine.publish("hydration", 0x60, ml=250.0, mac=mac)
+    engine.stats()   # -> {"rules": {"morning": {"fired": 1, "latency_ms": {"p50": ...}}}, ...}
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import thread_registry
+
+logger = logging.getLogger("WebServer")
+
+MAX_CATCH_UP_MIN = 30     # late minutes still dispatched after the worker was busy
+
+OK_RESULTS = ("ok", "unchanged")     # status strings an action may return on success
+
+TRIGGER_KEYS = {"time": "at", "presence": "to", "hydration": "cmd", "onocoy": "to"}
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_OPS = {
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "eq": lambda a, b: a == b,
+}
+
+
+class RuleError(ValueError):
+    """The rules file (or one rule in it) is malformed."""
+
+
+def _percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return None
+    idx = min(len(sorted_vals) - 1, int(round(pct / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+def _hhmm(value):
+    try:
+        h, m = str(value).strip().split(":")
+        h, m = int(h), int(m)
+    except ValueError:
+        raise RuleError(f"bad time {value!r} (want HH:MM)")
+    if not (0 <= h < 24 and 0 <= m < 60):
+        raise RuleError(f"bad time {value!r}")
+    return f"{h:02d}:{m:02d}"
+
+
+def _norm_key(kind, value):
+    """Trigger key as the event publishes it: 'HH:MM', 'HOME'/'AWAY', cmd int, 'online'/'offline'."""
+    if value is None:
+        return None
+    if kind == "time":
+        return _hhmm(value)
+    if kind == "presence":
+        return str(value).upper()
+    if kind == "hydration":
+        return int(value, 0) if isinstance(value, str) else int(value)
+    return str(value).lower()
+
+
+class Rule:
+    __slots__ = ("id", "triggers", "conditions", "actions", "cooldown_sec", "last_fired",
+                 "fired", "skipped", "errors", "last_error", "latency")
+
+    def __init__(self, spec, index):
+        if not isinstance(spec, dict):
+            raise RuleError(f"rule #{index} is not an object")
+        self.id = str(spec.get("id") or f"rule{index}")
+        triggers = spec.get("triggers") or ([spec["trigger"]] if spec.get("trigger") else [])
+        if not triggers:
+            raise RuleError(f"{self.id}: no trigger")
+        self.triggers = []
+        for t in triggers:
+            kind = t.get("type")
+            if kind not in TRIGGER_KEYS:
+                raise RuleError(f"{self.id}: unknown trigger type {kind!r}")
+            key_field = TRIGGER_KEYS[kind]
+            keys = t.get(key_field)
+            keys = keys if isinstance(keys, list) else [keys]
+            filters = {k: v for k, v in t.items() if k not in ("type", key_field)}
+            self.triggers.extend((kind, _norm_key(kind, k), filters) for k in keys)
+        self.conditions = list(spec.get("conditions") or [])
+        for c in self.conditions:
+            if "time_between" in c:
+                c["time_between"] = [_hhmm(v) for v in c["time_between"]]
+            if "weekdays" in c:
+                c["weekdays"] = [str(d)[:3].lower() for d in c["weekdays"]]
+        self.actions = list(spec.get("actions") or [])
+        if not all(isinstance(a, dict) and a.get("do") for a in self.actions):
+            raise RuleError(f"{self.id}: every action needs a 'do'")
+        self.cooldown_sec = float(spec.get("cooldown_sec", 0))
+        self.last_fired = 0.0
+        self.fired = self.skipped = self.errors = 0
+        self.last_error = ""
+        self.latency = deque(maxlen=200)
+
+    def carry_stats(self, old):
+        """Keep counters across a reload when the rule id is unchanged."""
+        self.last_fired, self.fired, self.skipped = old.last_fired, old.fired, old.skipped
+        self.errors, self.last_error, self.latency = old.errors, old.last_error, old.latency
+
+    def stats(self):
+        lat = sorted(self.latency)
+        return {
+            "fired": self.fired,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_fired": self.last_fired or None,
+            "latency_ms": {
+                "p50": _percentile(lat, 50),
+                "p95": _percentile(lat, 95),
+                "max": lat[-1] if lat else None,
+            },
+        }
+
+
+def load_rules(path):
+    """Parse a rules file -> (list of Rule, index {(type, key): [Rule]}). Raises RuleError."""
+    try:
+        with open(path) as f:
+            doc = json.load(f)
+    except json.JSONDecodeError as e:
+        raise RuleError(f"{path}: {e}")
+    specs = doc.get("rules", []) if isinstance(doc, dict) else doc
+    rules = [Rule(spec, i) for i, spec in enumerate(specs) if spec.get("enabled", True)]
+    ids = [r.id for r in rules]
+    dupes = {i for i in ids if ids.count(i) > 1}
+    if dupes:
+        raise RuleError(f"duplicate rule ids: {sorted(dupes)}")
+    index = {}
+    for rule in rules:
+        for kind, key, filters in rule.triggers:
+            index.setdefault((kind, key), []).append((rule, filters))
+    return rules, index
+
+
+class RulesEngine:
+    def __init__(self, path, actions=None, presence=None, reload_check_sec=2.0):
+        self.path = path
+        self.actions = dict(actions or {})
+        self.actions.setdefault("log", lambda action, event: logger.info("Rule: %s", action.get("message", "")))
+        # presence() -> True (home) / False (away); only called when a firing rule asks for it.
+        self.presence = presence
+        self.reload_check_sec = float(reload_check_sec)
+        self._queue = queue.Queue()
+        self._rules = []
+        self._index = {}
+        self._mtime = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._counts = {"events": 0, "evaluated": 0, "reloads": 0, "reload_errors": 0, "action_errors": 0,
+                        "minutes_missed": 0, "minutes_caught_up": 0}
+        self.last_reload_error = ""
+
+    # --- Loading ---
+
+    def reload(self):
+        """Re-read the rules file. On error the previous rules stay active."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            rules, index = load_rules(self.path)
+        except (OSError, RuleError, AttributeError, TypeError, ValueError) as e:
+            self._counts["reload_errors"] += 1
+            self.last_reload_error = str(e)
+            logger.error("Rules: reload of %s failed, keeping %d rules: %s", self.path, len(self._rules), e)
+            self._mtime = self._file_mtime()
+            return False
+        old = {r.id: r for r in self._rules}
+        for r in rules:
+            if r.id in old:
+                r.carry_stats(old[r.id])
+        # Swapped as a pair; only the worker thread evaluates, so no lock is needed.
+        self._rules, self._index = rules, index
+        self._mtime = mtime
+        self._counts["reloads"] += 1
+        self.last_reload_error = ""
+        logger.info("Rules: loaded %d rules from %s", len(rules), self.path)
+        return True
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def _check_reload(self):
+        if self._file_mtime() != self._mtime:
+            self.reload()
+
+    # --- Events ---
+
+    def publish(self, kind, key=None, **data):
+        """Queue an event (non-blocking, safe from any thread)."""
+        self._queue.put((kind, _norm_key(kind, key) if key is not None else None, data, time.monotonic()))
+
+    def _conditions_hold(self, rule, data, now, ctx):
+        for c in rule.conditions:
+            if "presence" in c:
+                if "home" not in ctx:
+                    # One probe per event, however many rules ask.
+                    ctx["home"] = bool(self.presence()) if self.presence else False
+                if ctx["home"] != (str(c["presence"]).lower() == "home"):
+                    return False
+            if "time_between" in c:
+                start, end = c["time_between"]
+                hhmm = now.strftime("%H:%M")
+                inside = start <= hhmm < end if start <= end else (hhmm >= start or hhmm < end)
+                if not inside:
+                    return False
+            if "weekdays" in c and WEEKDAYS[now.weekday()] not in c["weekdays"]:
+                return False
+            if "field" in c:
+                value = data.get(c["field"])
+                for op, ref in c.items():
+                    if op in _OPS and (value is None or not _OPS[op](value, ref)):
+                        return False
+        return True
+
+    def _run_rule(self, rule, kind, data, t_event, ctx):
+        now_wall = time.time()
+        if rule.cooldown_sec and now_wall - rule.last_fired < rule.cooldown_sec:
+            rule.skipped += 1
+            return
+        if not self._conditions_hold(rule, data, ctx["now"], ctx):
+            rule.skipped += 1
+            logger.info("Rule %s: conditions not met (%s)", rule.id, kind)
+            return
+        rule.fired += 1
+        rule.last_fired = now_wall
+        logger.info("Rule %s: firing on %s", rule.id, kind)
+        event = dict(data, type=kind)
+        for action in rule.actions:
+            fn = self.actions.get(action["do"])
+            try:
+                if fn is None:
+                    raise RuleError(f"unknown action {action['do']!r}")
+                rv = fn(action, event)
+                if rv is False or (isinstance(rv, str) and rv not in OK_RESULTS):
+                    raise RuleError("failed" if rv is False else rv)
+            except Exception as e:
+                rule.errors += 1
+                self._counts["action_errors"] += 1
+                rule.last_error = f"{action['do']}: {e}"
+                logger.error("Rule %s: action %s failed: %s", rule.id, action["do"], e)
+        rule.latency.append(round((time.monotonic() - t_event) * 1000.0, 2))
+
+    def dispatch(self, kind, key, data, t_event=None, now=None):
+        """Evaluate the rules indexed under (kind, key) and (kind, any) for one event."""
+        t_event = time.monotonic() if t_event is None else t_event
+        self._counts["events"] += 1
+        ctx = {"now": now or datetime.now()}
+        for index_key in ((kind, key), (kind, None)) if key is not None else ((kind, None),):
+            for rule, filters in self._index.get(index_key, ()):
+                if any(data.get(k) != v for k, v in filters.items()):
+                    continue
+                self._counts["evaluated"] += 1
+                self._run_rule(rule, kind, data, t_event, ctx)
+
+    # --- Worker ---
+
+    def _run(self):
+        thread_registry.register(expect_sec=60)
+        self.reload()
+        next_minute = (datetime.now() + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        next_check = time.monotonic() + self.reload_check_sec
+        while not self._stop.is_set():
+            timeout = min((next_minute - datetime.now()).total_seconds(), next_check - time.monotonic())
+            thread_registry.beat(max(0.0, timeout))
+            try:
+                kind, key, data, t_event = self._queue.get(timeout=max(0.0, timeout))
+                try:
+                    self.dispatch(kind, key, data, t_event)
+                except Exception as e:
+                    logger.exception("Rules: event %s failed: %s", kind, e)
+            except queue.Empty:
+                pass
+            now = datetime.now()
+            if now >= next_minute:
+                # Actions run on this thread (a scene or a spray can take seconds): every minute that passed
+                # while it was busy is still dispatched, in order. Only a gap longer than
+                # MAX_CATCH_UP_MIN (suspend, clock jump) is skipped and counted.
+                last = now.replace(second=0, microsecond=0)
+                first = max(next_minute, last - timedelta(minutes=MAX_CATCH_UP_MIN - 1))
+                self._counts["minutes_missed"] += int((first - next_minute).total_seconds() // 60)
+                self._counts["minutes_caught_up"] += int((last - first).total_seconds() // 60)
+                minute = first
+                while minute <= last:
+                    self.dispatch("time", minute.strftime("%H:%M"), {}, now=minute)
+                    minute += timedelta(minutes=1)
+                next_minute = last + timedelta(minutes=1)
+            if time.monotonic() >= next_check:
+                self._check_reload()
+                next_check = time.monotonic() + self.reload_check_sec
+        thread_registry.unregister()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rules-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def pending(self):
+        """Events queued for the worker."""
+        return self._queue.qsize()
+
+    def stats(self):
+        return dict(
+            self._counts,
+            path=self.path,
+            queue_depth=self._queue.qsize(),
+            last_reload_error=self.last_reload_error,
+            index={f"{k[0]}:{'*' if k[1] is None else k[1]}": len(v) for k, v in self._index.items()},
+            rules={r.id: r.stats() for r in self._rules},
+        )
@@ -0,0 +1,188 @@
+"""
+Named scenes: steps across AIO, IR, LED, ONO and the servo box, run in parallel
+where they can, under one deadline.
+
+A scene (config.SCENES) is a list of steps. Each step names an action (`do`)
+plus its parameters, and may list step ids it has to wait for (`after`).
+Steps without pending dependencies start at once on a shared pool; a step
+whose dependency did not succeed is skipped. When the deadline passes, the
+scene returns: steps still running are reported as `timeout` (they finish in
+the background, nothing is killed), steps never started as `skipped`.
+
+Actions are plain callables `fn(step, ctx)`; `ctx["deadline"]` is the
+scene's time.monotonic() deadline, for actions that wait on something.
+Returning None or True means ok, False means failed, a string is taken as
+the status ("unchanged", ...); an exception is an error.
+
+Example:
+    runner = SceneRunner(config.SCENES, actions={"aio": do_aio, "ir": do_ir, "led": do_led})
+    result = runner.run("all_on")
+    # -> {"scene": "all_on", "ok": True, "elapsed_ms": 212.4,
+    #     "steps": {"neon": {"status": "ok", "ms": 211.9}, "ir": {"status": "ok", "ms": 205.3}, ...}}
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger("WebServer")
+
+OK_STATUSES = ("ok", "unchanged")
+
+
+class SceneError(ValueError):
+    """Unknown scene, or a scene definition that cannot run (bad dependency, cycle)."""
+
+
+def _percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return None
+    idx = min(len(sorted_vals) - 1, int(round(pct / 100.0 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+def _normalise(name, spec):
+    """Scene spec -> (deadline_sec or None, [step dicts with id and after]). Raises SceneError."""
+    if isinstance(spec, list):
+        spec = {"steps": spec}
+    steps = []
+    for i, step in enumerate(spec.get("steps") or []):
+        if not step.get("do"):
+            raise SceneError(f"{name}: step #{i} has no 'do'")
+        step = dict(step)
+        step.setdefault("id", f"{step['do']}{i}")
+        after = step.get("after") or []
+        step["after"] = [after] if isinstance(after, str) else list(after)
+        steps.append(step)
+    ids = [s["id"] for s in steps]
+    if len(set(ids)) != len(ids):
+        raise SceneError(f"{name}: duplicate step ids")
+    for s in steps:
+        missing = [d for d in s["after"] if d not in ids]
+        if missing:
+            raise SceneError(f"{name}: step {s['id']} waits for unknown step(s) {missing}")
+    # Kahn's algorithm: every step must become runnable.
+    remaining = {s["id"]: set(s["after"]) for s in steps}
+    while remaining:
+        ready = [sid for sid, deps in remaining.items() if not deps]
+        if not ready:
+            raise SceneError(f"{name}: dependency cycle between {sorted(remaining)}")
+        for sid in ready:
+            del remaining[sid]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return spec.get("deadline_sec"), steps
+
+
+class SceneRunner:
+    def __init__(self, scenes, actions, max_workers=8, default_deadline_sec=8.0):
+        self.actions = dict(actions)
+        self.default_deadline_sec = float(default_deadline_sec)
+        self.scenes = {name: _normalise(name, spec) for name, spec in scenes.items()}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scene-step")
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def names(self):
+        return sorted(self.scenes)
+
+    def _call(self, step, ctx):
+        t0 = time.monotonic()
+        fn = self.actions.get(step["do"])
+        try:
+            if fn is None:
+                raise SceneError(f"unknown action {step['do']!r}")
+            rv = fn(step, ctx)
+            status = "ok" if rv is None or rv is True else "failed" if rv is False else str(rv)
+            error = ""
+        except Exception as e:
+            status, error = "error", str(e)
+        return {"status": status, "ms": round((time.monotonic() - t0) * 1000.0, 1), "error": error}
+
+    def run(self, name, deadline_sec=None, context=None):
+        """Run a scene and wait for it (at most until its deadline). Returns the per-step report."""
+        if name not in self.scenes:
+            raise SceneError(f"unknown scene {name!r}")
+        scene_deadline, steps = self.scenes[name]
+        budget = float(deadline_sec or scene_deadline or self.default_deadline_sec)
+        t0 = time.monotonic()
+        ctx = dict(context or {}, scene=name, deadline=t0 + budget)
+        by_id = {s["id"]: s for s in steps}
+        results = {}
+        running = {}          # future -> step id
+        waiting = dict((s["id"], set(s["after"])) for s in steps)
+
+        def start_ready():
+            for sid in [sid for sid, deps in waiting.items() if not deps]:
+                del waiting[sid]
+                # Each step runs in a copy of the caller's context (keeps the request's trace).
+                running[self._pool.submit(contextvars.copy_context().run, self._call, by_id[sid], ctx)] = sid
+
+        def settle(sid, result):
+            results[sid] = result
+            ok = result["status"] in OK_STATUSES
+            # Walk dependents: failed / skipped steps take everything behind them down too.
+            for other, deps in list(waiting.items()):
+                if other in waiting and sid in by_id[other]["after"]:
+                    if ok:
+                        deps.discard(sid)
+                    else:
+                        del waiting[other]
+                        settle(other, {"status": "skipped", "ms": 0.0, "error": f"{sid} {result['status']}"})
+
+        start_ready()
+        while running:
+            remaining = ctx["deadline"] - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(list(running), timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                settle(running.pop(fut), fut.result())
+            start_ready()
+        for fut, sid in running.items():
+            results[sid] = {"status": "timeout", "ms": round((time.monotonic() - t0) * 1000.0, 1),
+                            "error": f"still running at the {budget:g}s deadline"}
+        for sid in waiting:
+            results[sid] = {"status": "skipped", "ms": 0.0, "error": "deadline"}
+
+        elapsed_ms = round((time.monotonic() - t0) * 1000.0, 1)
+        ok = all(r["status"] in OK_STATUSES for r in results.values())
+        self._record(name, ok, elapsed_ms)
+        failed = {sid: r["status"] for sid, r in results.items() if r["status"] not in OK_STATUSES}
+        if failed:
+            logger.warning("Scene %s finished in %.0f ms with failures: %s", name, elapsed_ms, failed)
+        else:
+            logger.info("Scene %s finished in %.0f ms", name, elapsed_ms)
+        return {
+            "scene": name,
+            "ok": ok,
+            "elapsed_ms": elapsed_ms,
+            "deadline_sec": budget,
+            "steps": {s["id"]: results[s["id"]] for s in steps},
+        }
+
+    def _record(self, name, ok, elapsed_ms):
+        with self._lock:
+            st = self._stats.get(name)
+            if st is None:
+                st = self._stats[name] = {"runs": 0, "failed": 0, "elapsed_ms": deque(maxlen=100)}
+            st["runs"] += 1
+            st["failed"] += 0 if ok else 1
+            st["elapsed_ms"].append(elapsed_ms)
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for name in self.names():
+                st = self._stats.get(name, {"runs": 0, "failed": 0, "elapsed_ms": ()})
+                lat = sorted(st["elapsed_ms"])
+                out[name] = {
+                    "steps": [s["id"] for s in self.scenes[name][1]],
+                    "runs": st["runs"],
+                    "failed": st["failed"],
+                    "elapsed_ms": {"p50": _percentile(lat, 50), "p95": _percentile(lat, 95),
+                                   "max": lat[-1] if lat else None},
+                }
+            return out
@@ -0,0 +1,193 @@
+"""
+Binary serial framing between the Pi and the master ESP32 (optional, "BIN" in CAPS).
+
+Instead of `TX:<mac>:<hex>\\n` text lines, frames carry raw bytes:
+
+    0x00 | len (2 bytes, LE) | kind | body | crc16 (2 bytes, BE)
+
+- len            bytes that follow the length field (kind + body + crc)
+- kind  1 byte   FRAME_TX / FRAME_TXM (Pi -> master), FRAME_RX / FRAME_DELIVERED /
+                 FRAME_DELIVERY_FAILED (master -> Pi)
+- body           TX, RX: 6-byte MAC + payload; DELIVERED/FAILED: 6-byte MAC;
+                 TXM: count + count * 6-byte MAC + payload
+- crc16          CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over len + kind + body,
+                 big endian, so the CRC over the whole frame after the marker is 0
+
+Text lines (HEARTBEAT, OK:..., CAPS:...) never contain 0x00, so they share the
+stream: outside a frame the reader splits on '\\n' and a 0x00 starts a frame.
+Length prefixing keeps the Pi-side parse to a few slices and one C-level CRC
+call (COBS would need a Python loop per frame). A frame whose CRC does not
+match is dropped; unless another frame follows directly, scanning resumes right
+after its marker, so a corrupted length field costs that frame (its bytes show
+up as one junk text line), not the frames and lines behind it.
+
+Negotiation: the master advertises `BIN` in its CAPS line and always accepts
+binary frames; the Pi then sends `BIN:1` and the master answers `OK:BIN` and
+switches its own output (RX and delivery reports) to frames. A rebooted master
+prints CAPS again and starts in text mode.
+
+Example:
+    frame = serial_framing.encode_tx("C0:CD:D6:85:70:CC", codec.led_mode(37, 5))
+    splitter = serial_framing.StreamSplitter()
+    for is_frame, item in splitter.feed(chunk):
+        if is_frame:                       # CRC already checked
+            kind, mac, payload = serial_framing.parse_frame(item)
+"""
+from binascii import crc_hqx
+
+FRAME_TX = 0x01
+FRAME_TXM = 0x02
+FRAME_RX = 0x81
+FRAME_DELIVERED = 0x82
+FRAME_DELIVERY_FAILED = 0x83
+
+MARKER = 0
+MAC_LEN = 6
+HEADER_LEN = 3          # marker + 2-byte length
+# Longest frame we accept: ESP-NOW payload (250) + kind + TXM MAC list (up to 20 peers) + CRC.
+MAX_FRAME = 512
+MAX_LINE = 1024
+
+
+class FrameError(ValueError):
+    """Frame is malformed (too short, no MAC, failed CRC)."""
+
+
+def crc16(data):
+    return crc_hqx(data, 0xFFFF)
+
+
+_mac_bytes = {}
+_mac_str = {}
+
+
+def mac_bytes(mac):
+    """'C0:CD:D6:85:70:CC' -> 6 raw bytes (cached; the same few MACs are used all day)."""
+    raw = _mac_bytes.get(mac)
+    if raw is None:
+        raw = bytes.fromhex(mac.replace(":", ""))
+        if len(raw) != MAC_LEN:
+            raise ValueError(f"bad MAC: {mac}")
+        if len(_mac_bytes) >= 256:
+            _mac_bytes.clear()
+        _mac_bytes[mac] = raw
+    return raw
+
+
+def mac_str(raw):
+    s = _mac_str.get(raw)
+    if s is None:
+        s = ":".join(f"{b:02X}" for b in raw)
+        if len(_mac_str) >= 256:
+            _mac_str.clear()
+        _mac_str[bytes(raw)] = s
+    return s
+
+
+def encode_frame(kind, body):
+    size = 1 + len(body) + 2
+    if size > MAX_FRAME:
+        raise ValueError(f"frame too long ({size} bytes)")
+    head = size.to_bytes(2, "little") + bytes((kind,)) + body
+    return b"\x00" + head + crc16(head).to_bytes(2, "big")
+
+
+def encode_tx(mac, payload):
+    return encode_frame(FRAME_TX, mac_bytes(mac) + payload)
+
+
+def encode_txm(macs, payload):
+    return encode_frame(FRAME_TXM, bytes((len(macs),)) + b"".join(mac_bytes(m) for m in macs) + payload)
+
+
+def encode_rx(mac, payload):
+    """Master -> Pi report (used by the simulator and benchmarks)."""
+    return encode_frame(FRAME_RX, mac_bytes(mac) + payload)
+
+
+def parse_frame(frame):
+    """
+    A frame from StreamSplitter (length field .. CRC, already CRC-checked) ->
+    (kind, MAC string, rest). For TXM frames MAC is None and rest is the whole body.
+    """
+    kind = frame[2]
+    if kind == FRAME_TXM:
+        return kind, None, frame[3:-2]
+    if len(frame) < 2 + 1 + MAC_LEN + 2:
+        raise FrameError("frame without MAC")
+    return kind, mac_str(frame[3:3 + MAC_LEN]), frame[3 + MAC_LEN:-2]
+
+
+def split_txm(body):
+    """TXM body -> ([MAC strings], payload)."""
+    n = body[0] if body else 0
+    end = 1 + MAC_LEN * n
+    if len(body) < end:
+        raise FrameError("short TXM MAC list")
+    return [mac_str(body[1 + MAC_LEN * i:1 + MAC_LEN * (i + 1)]) for i in range(n)], body[end:]
+
+
+class StreamSplitter:
+    """
+    Splits a mixed serial byte stream into text lines and CRC-checked binary frames.
+    feed(chunk) -> list of (is_frame, bytes): lines without '\\n' / '\\r', frames from
+    the length field through the CRC (see parse_frame).
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.dropped = 0        # oversized lines thrown away
+        self.crc_errors = 0     # frames dropped for a bad length or CRC
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+        out = []
+        pos = 0
+        n = len(buf)
+        # Next '\n' / 0x00 at or after pos (n = none); cached so each is scanned for once per chunk.
+        nl = z = -1
+        while pos < n:
+            if nl < pos:
+                nl = buf.find(b"\n", pos)
+                if nl < 0:
+                    nl = n
+            if z < pos:
+                z = buf.find(MARKER, pos)
+                if z < 0:
+                    z = n
+            if z < nl:
+                if z > pos:
+                    out.append((False, bytes(buf[pos:z]).rstrip(b"\r")))
+                if z + HEADER_LEN > n:
+                    pos = z
+                    break
+                size = buf[z + 1] | (buf[z + 2] << 8)
+                end = z + HEADER_LEN + size
+                if size < 3 or size > MAX_FRAME:
+                    self.crc_errors += 1
+                    pos = z + 1
+                    continue
+                if end > n:
+                    pos = z
+                    break
+                frame = bytes(buf[z + 1:end])
+                if crc16(frame):
+                    self.crc_errors += 1
+                    # Another frame right behind it: the length was fine, skip the whole frame.
+                    # Otherwise the length may be the corrupted part: drop only the marker and rescan.
+                    pos = end if end == n or buf[end] == MARKER else z + 1
+                    continue
+                out.append((True, frame))
+                pos = end
+                continue
+            if nl == n:
+                if n - pos > MAX_LINE:
+                    self.dropped += 1
+                    pos = n
+                break
+            if nl > pos:
+                out.append((False, bytes(buf[pos:nl]).rstrip(b"\r")))
+            pos = nl + 1
+        del buf[:pos]
+        return out
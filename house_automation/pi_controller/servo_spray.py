@@ -10,13 +10,20 @@ When triggered, runs:
 6. Servo axis 3 -> pos 90
 
 Configure SERVO_BASE_URL and AIO_KEY in config.py or environment.
+
+Both hosts sit behind circuit breakers (circuit_breaker.py). A servo timeout
+or 5xx opens the servo breaker at once; the spray steps (2-4) are then skipped,
+so a run against a powered-off servo box fails after one timeout, and later
+runs fail in milliseconds until the breaker half-opens again. A plain HTTP
+error with the breaker still closed does not abort the run, and the
+return-to-rest steps (5-6) are always attempted so the arm is never left in
+spray position.
 """
 import logging
 import time
 from typing import Optional
 
-import requests
-
+import circuit_breaker
 import config
 
 logger = logging.getLogger("PiController")
@@ -28,33 +35,47 @@ def _servo(axis: int, pos: int, base_url: Optional[str] = None) -> bool:
     """Send servo command. Returns True on success."""
     url = (base_url or config.SERVO_BASE_URL).rstrip("/") + "/api/servo"
     try:
-        r = requests.post(
+        r = circuit_breaker.request(
+            "post",
             url,
             headers={"Content-Type": "application/json"},
             json={"axis": axis, "pos": pos},
             timeout=5,
+            **config.BREAKER_SETTINGS['servo'],
         )
         if r.status_code in (200, 201, 204):
             logger.info("Servo axis=%d pos=%d OK", axis, pos)
             return True
         logger.warning("Servo axis=%d pos=%d HTTP %d: %s", axis, pos, r.status_code, r.text[:200])
         return False
+    except circuit_breaker.CircuitOpenError as e:
+        logger.warning("Servo axis=%d pos=%d skipped: %s", axis, pos, e)
+        return False
     except Exception as e:
         logger.error("Servo axis=%d pos=%d failed: %s", axis, pos, e)
         return False
 
 
+def _servo_down(base_url: Optional[str] = None) -> bool:
+    """True while the servo box's breaker is open (known down, calls fail fast)."""
+    url = (base_url or config.SERVO_BASE_URL).rstrip("/") + "/api/servo"
+    breaker = circuit_breaker.for_url(url, **config.BREAKER_SETTINGS['servo'])
+    return breaker.state == circuit_breaker.OPEN
+
+
 def _aio_spray() -> bool:
     """Post SPRAY to Adafruit IO command feed. Returns True on success."""
     if not config.AIO_KEY or config.AIO_KEY == "YOUR_AIO_KEY_HERE":
         logger.error("AIO_KEY not configured")
         return False
     try:
-        r = requests.post(
+        r = circuit_breaker.request(
+            "post",
             config.AIO_FEED_URL,
             headers={"X-AIO-Key": config.AIO_KEY, "Content-Type": "application/json"},
             json={"value": "SPRAY"},
             timeout=5,
+            **config.BREAKER_SETTINGS['aio'],
         )
         if r.status_code in (200, 201, 204):
             logger.info("AIO SPRAY sent OK")
@@ -69,32 +90,54 @@ def _aio_spray() -> bool:
 def run_sequence(base_url: Optional[str] = None) -> dict:
     """
     Run the full servo + spray sequence.
-    Returns dict with status and any error message.
+    Returns dict with status and any error message. `steps` holds True/False
+    per step, or None for spray steps skipped because the servo breaker opened.
+    The return-to-rest steps always run.
     """
     base = base_url or config.SERVO_BASE_URL
     if not base:
         return {"ok": False, "error": "SERVO_BASE_URL not configured"}
 
+    t0 = time.monotonic()
+    # (kind, step, rest): `rest` steps put the arm back and run even after an abort.
+    sequence = [
+        # 1. Servo axis 3, pos 29
+        ("servo", lambda: _servo(3, 29, base), False),
+        # 2. Adafruit IO SPRAY
+        ("aio", _aio_spray, False),
+        # 3. Servo axis 0, pos 130
+        ("servo", lambda: _servo(0, 130, base), False),
+        # 4. Wait 3 sec
+        ("wait", lambda: time.sleep(DELAY_SEC), False),
+        # 5. Servo axis 0, pos 0
+        ("servo", lambda: _servo(0, 0, base), True),
+        # 6. Servo axis 3, pos 90
+        ("servo", lambda: _servo(3, 90, base), True),
+    ]
     steps_ok = []
-    # 1. Servo axis 3, pos 29
-    steps_ok.append(_servo(3, 29, base))
-    # 2. Adafruit IO SPRAY
-    steps_ok.append(_aio_spray())
-    # 3. Servo axis 0, pos 130
-    steps_ok.append(_servo(0, 130, base))
-    # 4. Wait 3 sec
-    time.sleep(DELAY_SEC)
-    # 5. Servo axis 0, pos 0
-    steps_ok.append(_servo(0, 0, base))
-    # 6. Servo axis 3, pos 90
-    steps_ok.append(_servo(3, 90, base))
+    aborted = False
+    for kind, step, rest in sequence:
+        if aborted and not rest:
+            if kind != "wait":
+                steps_ok.append(None)
+            continue
+        result = step()
+        if kind == "wait":
+            continue
+        steps_ok.append(result)
+        # No point spraying or waiting if the servo box is not answering at all.
+        if kind == "servo" and not result and not rest and _servo_down(base):
+            aborted = True
 
     ok = all(steps_ok)
+    elapsed_ms = round((time.monotonic() - t0) * 1000)
     if ok:
         logger.info("Servo spray sequence completed")
+    elif aborted:
+        logger.warning("Servo spray sequence aborted after %d ms: %s", elapsed_ms, steps_ok)
     else:
         logger.warning("Servo spray sequence had failures: %s", steps_ok)
-    return {"ok": ok, "steps": steps_ok}
+    return {"ok": ok, "steps": steps_ok, "aborted": aborted, "elapsed_ms": elapsed_ms}
 
 
 if __name__ == "__main__":
@@ -328,44 +328,63 @@ function renderHydrationMeta(h) {
     }
 }
 
-// --- Data Polling ---
+// --- Data Polling (long poll: the server holds the request until the hydration state changes) ---
+function renderHydration(h) {
+    const weightEl = document.getElementById('hyd-weight');
+    const statusEl = document.getElementById('hyd-status');
+    const lastDrinkEl = document.getElementById('hyd-last-drink');
+    const dailyTotalEl = document.getElementById('hyd-daily-total');
+    latestHydrationData = h;
+
+    if (weightEl) weightEl.innerText = h.weight ?? '--';
+    if (statusEl) {
+        const stale = h.stale || (Date.now() / 1000 - (h.last_update || 0)) > 60;
+        statusEl.style.color = stale ? 'var(--text-muted)' : 'var(--success)';
+        statusEl.innerText = (h.status || 'Unknown') + (stale ? ' (Stale)' : '');
+    }
+    if (lastDrinkEl) {
+        const ml = h.last_drink_ml;
+        lastDrinkEl.innerText = (ml != null && ml > 0) ? ml + ' ml' : (ml === 0 ? '0 ml' : '-- ml');
+    }
+    if (dailyTotalEl) {
+        const ml = h.daily_total_ml;
+        dailyTotalEl.innerText = (ml != null && ml >= 0) ? ml + ' ml' : '-- ml';
+    }
+    appendWeightHistory(Number(h.weight));
+    renderWeightTrend();
+    renderGoal(Number(h.daily_total_ml) || 0);
+    renderHydrationMeta(h);
+}
+
+let dataEtag = null;
 function fetchData() {
-    fetch('/api/data')
-        .then(response => response.json())
+    const headers = dataEtag ? { 'If-None-Match': dataEtag } : {};
+    return fetch('/api/data?wait=25', { headers: headers, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304) return null;
+            if (!response.ok) throw new Error('HTTP ' + response.status);
+            dataEtag = response.headers.get('ETag') || dataEtag;
+            return response.json();
+        })
         .then(data => {
-            if (data.hydration) {
-                const h = data.hydration;
-                const weightEl = document.getElementById('hyd-weight');
-                const statusEl = document.getElementById('hyd-status');
-                const lastDrinkEl = document.getElementById('hyd-last-drink');
-                const dailyTotalEl = document.getElementById('hyd-daily-total');
-                latestHydrationData = h;
-
-                if (weightEl) weightEl.innerText = h.weight ?? '--';
-                if (statusEl) {
-                    const stale = (Date.now() / 1000 - (h.last_update || 0)) > 60;
-                    statusEl.style.color = stale ? 'var(--text-muted)' : 'var(--success)';
-                    statusEl.innerText = (h.status || 'Unknown') + (stale ? ' (Stale)' : '');
-                }
-                if (lastDrinkEl) {
-                    const ml = h.last_drink_ml;
-                    lastDrinkEl.innerText = (ml != null && ml > 0) ? ml + ' ml' : (ml === 0 ? '0 ml' : '-- ml');
-                }
-                if (dailyTotalEl) {
-                    const ml = h.daily_total_ml;
-                    dailyTotalEl.innerText = (ml != null && ml >= 0) ? ml + ' ml' : '-- ml';
-                }
-                appendWeightHistory(Number(h.weight));
-                renderWeightTrend();
-                renderGoal(Number(h.daily_total_ml) || 0);
-                renderHydrationMeta(h);
+            if (data && data.hydration) {
+                renderHydration(data.hydration);
+            } else if (!data && latestHydrationData) {
+                // Unchanged after the wait: re-render so the "(Stale)" marker still ages in.
+                renderHydration(latestHydrationData);
             }
-        })
-        .catch(err => console.error("Poll Error:", err));
+        });
 }
 
-// Run polling every 2 seconds
-setInterval(fetchData, 2000);
+// Next request as soon as the previous one returns; back off 2 s after an error.
+function pollData() {
+    fetchData()
+        .then(() => pollData())
+        .catch(err => {
+            console.error("Poll Error:", err);
+            setTimeout(pollData, 2000);
+        });
+}
 
 // Request daily total from slave so "Today total" updates (on load and every 60s)
 function requestDailyTotal() {
@@ -399,7 +418,7 @@ setInterval(fetchMasterLog, 1500);
 document.addEventListener('DOMContentLoaded', fetchMasterLog);
 
 // Initial Call
-document.addEventListener('DOMContentLoaded', fetchData);
+document.addEventListener('DOMContentLoaded', pollData);
 
 window.adjustHydrationGoal = adjustHydrationGoal;
 
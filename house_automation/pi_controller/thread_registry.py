@@ -0,0 +1,244 @@
+"""
+Registry of the service's long-running threads: heartbeats, per-thread CPU, stall detection.
+
+A service thread registers itself when it starts and beats once per loop,
+saying when the next beat is due at the latest (normally its own sleep /
+wait timeout). A thread whose beat is more than the grace period late is
+flagged `stalled` (stuck in a request, a lock, a serial read ...); a
+registered thread that is gone without unregistering is flagged `dead`
+(its loop raised). Threads that only wait for work (e.g. a burst scheduler
+with nothing queued) beat without a deadline and are only checked for
+being alive.
+
+CPU time comes from /proc/self/task/<tid>/stat (utime + stime) for every
+thread, registered or not; unregistered threads (Flask workers, pools) are
+summed per thread name (profiler.thread_label). `cpu_pct` is measured by the
+monitor over its own interval and cached, so it means the same thing however
+often snapshot() is called.
+
+The monitor thread ("thread-monitor") runs check() every few seconds and
+logs stalls, recoveries and deaths once per transition. check() may also be
+called from anywhere else (flight recorder, /api/health); state changes are
+made under the registry lock, so each transition is counted and logged once.
+
+Example:
+    def _run(self):
+        thread_registry.register(expect_sec=60)
+        while not self._stop.is_set():
+            ...
+            thread_registry.beat(60)
+            self._stop.wait(60)
+        thread_registry.unregister()
+
+    thread_registry.snapshot()
+    # -> {"threads": {"onocoy-poller": {"state": "ok", "beat_age_sec": 12.1, "cpu_sec": 3.2, ...}},
+    #     "stalled": [], "dead": [], "other": {"flask-worker": {"count": 4, "cpu_sec": 1.9}}, ...}
+"""
+import logging
+import os
+import threading
+import time
+
+from profiler import thread_label
+
+logger = logging.getLogger("PiController")
+
+DEFAULT_GRACE_SEC = 30.0
+
+_lock = threading.Lock()
+_entries = {}           # thread ident -> _Entry
+_cpu_prev = {}          # native tid -> (cpu ticks, monotonic) of the monitor's previous sample
+_cpu_pct = {}           # native tid -> CPU % over the last monitor interval
+_monitor = None
+_monitor_interval = None
+grace_sec = DEFAULT_GRACE_SEC
+
+try:
+    _CLK_TCK = os.sysconf("SC_CLK_TCK")
+except (ValueError, OSError, AttributeError):
+    _CLK_TCK = 100
+
+
+class _Entry:
+    __slots__ = ("thread", "expect_sec", "started", "last_beat", "deadline", "beats", "state", "stalls")
+
+    def __init__(self, thread, expect_sec):
+        now = time.monotonic()
+        self.thread = thread
+        self.expect_sec = expect_sec
+        self.started = now
+        self.last_beat = now
+        self.deadline = now + expect_sec + grace_sec if expect_sec is not None else None
+        self.beats = 0
+        self.state = "ok"           # ok | stalled | dead
+        self.stalls = 0
+
+
+def register(expect_sec=None):
+    """Register the calling thread (under its name). `expect_sec`: default max gap between beats."""
+    t = threading.current_thread()
+    with _lock:
+        # A restarted thread replaces the dead one of the same name.
+        for ident in [i for i, e in _entries.items() if e.thread.name == t.name and not e.thread.is_alive()]:
+            del _entries[ident]
+        _entries[t.ident] = _Entry(t, expect_sec)
+
+
+def unregister():
+    """The calling thread is ending on purpose (stop(), job done)."""
+    with _lock:
+        _entries.pop(threading.get_ident(), None)
+
+
+def beat(expect_sec=None):
+    """
+    Heartbeat from the calling thread: the next beat is due within `expect_sec`
+    (default: the value given at register; None there too means no deadline).
+    """
+    e = _entries.get(threading.get_ident())
+    if e is None:
+        return
+    now = time.monotonic()
+    expect = expect_sec if expect_sec is not None else e.expect_sec
+    e.last_beat = now
+    e.deadline = now + expect + grace_sec if expect is not None else None
+    e.beats += 1
+
+
+def _task_cpu():
+    """native tid -> CPU ticks (utime + stime) for every thread of this process."""
+    out = {}
+    try:
+        tids = os.listdir("/proc/self/task")
+    except OSError:
+        return out
+    for tid in tids:
+        try:
+            with open(f"/proc/self/task/{tid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            out[int(tid)] = int(fields[11]) + int(fields[12])
+        except (OSError, ValueError, IndexError):
+            continue
+    return out
+
+
+def _cpu(tid, ticks):
+    """Total CPU seconds of one thread from a _task_cpu() read, or None."""
+    t = ticks.get(tid)
+    return round(t / _CLK_TCK, 2) if t is not None else None
+
+
+def sample_cpu():
+    """Per-thread CPU % since the previous call (run by the monitor once per interval)."""
+    now = time.monotonic()
+    ticks = _task_cpu()
+    with _lock:
+        for tid, t in ticks.items():
+            prev = _cpu_prev.get(tid)
+            if prev is not None and now > prev[1]:
+                _cpu_pct[tid] = round(100.0 * (t - prev[0]) / _CLK_TCK / (now - prev[1]), 1)
+            _cpu_prev[tid] = (t, now)
+        for tid in [tid for tid in _cpu_prev if tid not in ticks]:
+            del _cpu_prev[tid]
+            _cpu_pct.pop(tid, None)
+
+
+def check():
+    """Update stalled / dead flags and log transitions. Returns (stalled names, dead names)."""
+    now = time.monotonic()
+    stalled, dead, changes = [], [], []
+    with _lock:
+        for e in _entries.values():
+            if not e.thread.is_alive():
+                state = "dead"
+            elif e.deadline is not None and now > e.deadline:
+                state = "stalled"
+            else:
+                state = "ok"
+            if state != e.state:
+                if state == "stalled":
+                    e.stalls += 1
+                e.state = state
+                changes.append((e.thread.name, state, now - e.last_beat))
+            if state == "stalled":
+                stalled.append(e.thread.name)
+            elif state == "dead":
+                dead.append(e.thread.name)
+    for name, state, age in changes:
+        if state == "stalled":
+            logger.warning("Thread %s stalled: no heartbeat for %.0fs", name, age)
+        elif state == "dead":
+            logger.error("Thread %s died (ended without unregistering)", name)
+        else:
+            logger.info("Thread %s recovered after %.0fs", name, age)
+    return stalled, dead
+
+
+def snapshot():
+    """Registered threads with heartbeat + CPU, stalled / dead lists, and CPU of everything else."""
+    stalled, dead = check()
+    now = time.monotonic()
+    ticks = _task_cpu()
+    with _lock:
+        entries = dict(_entries)
+        registered = set(entries)
+        threads = {}
+        for e in entries.values():
+            tid = e.thread.native_id
+            cpu_sec, cpu_pct = _cpu(tid, ticks), _cpu_pct.get(tid)
+            threads[e.thread.name] = {
+                "state": e.state,
+                "alive": e.thread.is_alive(),
+                "tid": tid,
+                "beats": e.beats,
+                "beat_age_sec": round(now - e.last_beat, 1),
+                "deadline_in_sec": round(e.deadline - now, 1) if e.deadline is not None else None,
+                "stalls": e.stalls,
+                "uptime_sec": round(now - e.started),
+                "cpu_sec": cpu_sec,
+                "cpu_pct": cpu_pct,
+            }
+        other = {}
+        for t in threading.enumerate():
+            if t.ident in registered:
+                continue
+            cpu_sec, cpu_pct = _cpu(t.native_id, ticks), _cpu_pct.get(t.native_id)
+            d = other.setdefault(thread_label(t.name), {"count": 0, "cpu_sec": 0.0, "cpu_pct": 0.0})
+            d["count"] += 1
+            d["cpu_sec"] = round(d["cpu_sec"] + (cpu_sec or 0.0), 2)
+            d["cpu_pct"] = round(d["cpu_pct"] + (cpu_pct or 0.0), 1)
+    return {
+        "threads": threads,
+        "stalled": stalled,
+        "dead": dead,
+        "other": other,
+        "process": {
+            "threads": len(ticks) or threading.active_count(),
+            "cpu_sec": round(sum(ticks.values()) / _CLK_TCK, 2) if ticks else None,
+        },
+        "grace_sec": grace_sec,
+        "cpu_interval_sec": _monitor_interval,
+    }
+
+
+def _monitor_loop(interval_sec):
+    register(expect_sec=interval_sec)
+    while True:
+        try:
+            check()
+            sample_cpu()
+        except Exception as e:
+            logger.error("Thread monitor check failed: %s", e)
+        beat()
+        time.sleep(interval_sec)
+
+
+def start_monitor(interval_sec=10.0):
+    """Start the background checker (idempotent)."""
+    global _monitor, _monitor_interval
+    with _lock:
+        if _monitor is not None and _monitor.is_alive():
+            return
+        _monitor_interval = interval_sec
+        _monitor = threading.Thread(target=_monitor_loop, args=(interval_sec,), name="thread-monitor", daemon=True)
+        _monitor.start()
@@ -0,0 +1,304 @@
+"""
+Command latency tracing: HTTP request -> handler -> serial write -> master ACK -> radio ACK.
+
+Each API request gets a trace (started in a Flask before_request hook, carried
+in a contextvar, so it follows the request into handlers, the IR burst
+scheduler and scene steps). Every frame `send_command` / `send_group` writes
+while a trace is active becomes a TX span:
+
+    handler_ms       request start -> send_command called      (Flask + handler)
+    serial_write_ms  send_command called -> bytes written      (shadow check, encoding, UART write)
+    master_ack_ms    bytes written -> OK:Sent / OK:SentM / ERR: (master parsed it, esp_now_send returned)
+    radio_ack_ms     bytes written -> OK:Delivered / ERR:Delivery (peer ACKed over the air, needs DLV)
+
+The controller matches ACK lines to writes in order, untraced writes
+included, so background sends never shift the matching. In binary framing the
+master does not echo successful sends: master_ack stays empty there.
+
+Finished traces live in a bounded in-memory buffer; `snapshot()` serves
+/api/debug/traces with recent traces and p50/p95/p99 per route and device.
+
+Example:
+    token = tracing.start("/api/led", "POST")
+    ...                                   # handler -> controller.send_command(...)
+    tracing.finish(token, 200)
+    tracing.snapshot(limit=20)            # {"routes": {"/api/led": {"count": 1, "http_ms": {...}}}, ...}
+"""
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+
+_current = contextvars.ContextVar("trace", default=None)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+MAX_TRACES = 300        # traces that sent something (kept apart so dashboard polling cannot evict them)
+MAX_ROUTE_SAMPLES = 200
+ACK_TIMEOUT_SEC = 3.0
+
+_with_tx = deque(maxlen=MAX_TRACES)
+_route_ms = {}          # route -> deque of http_ms (every traced request)
+enabled = True
+
+
+def _percentiles(vals):
+    if not vals:
+        return None
+    vals = sorted(vals)
+    n = len(vals) - 1
+    return {
+        "count": len(vals),
+        "p50": vals[int(round(0.50 * n))],
+        "p95": vals[int(round(0.95 * n))],
+        "p99": vals[int(round(0.99 * n))],
+        "max": vals[-1],
+    }
+
+
+def _ms(t0, t1):
+    return round((t1 - t0) * 1000.0, 2)
+
+
+class Span:
+    """One frame written to the master while a trace was active."""
+
+    __slots__ = ("trace", "mac", "group", "t_call", "t_written", "master_ack_ms", "master_status",
+                 "radio_ack_ms", "radio_status")
+
+    def __init__(self, trace, mac, group, t_call, t_written):
+        self.trace = trace
+        self.mac = mac
+        self.group = group
+        self.t_call = t_call
+        self.t_written = t_written
+        self.master_ack_ms = None
+        self.master_status = None
+        self.radio_ack_ms = None
+        self.radio_status = None
+
+    def master_ack(self, status, now=None):
+        if self.master_status is None:
+            self.master_status = status
+            if status != "no_ack":
+                self.master_ack_ms = _ms(self.t_written, now or time.perf_counter())
+
+    def radio_ack(self, ok, now=None):
+        if self.radio_status is None:
+            self.radio_status = "delivered" if ok else "failed"
+            self.radio_ack_ms = _ms(self.t_written, now or time.perf_counter())
+
+    def as_dict(self):
+        return {
+            "mac": self.mac,
+            "group": self.group,
+            "handler_ms": _ms(self.trace.t0, self.t_call),
+            "serial_write_ms": _ms(self.t_call, self.t_written),
+            "master_ack_ms": self.master_ack_ms,
+            "master_status": self.master_status,
+            "radio_ack_ms": self.radio_ack_ms,
+            "radio_status": self.radio_status,
+        }
+
+
+class Trace:
+    __slots__ = ("id", "route", "method", "t0", "wall", "http_ms", "status", "spans")
+
+    def __init__(self, route, method):
+        self.id = f"{next(_ids):x}"
+        self.route = route
+        self.method = method
+        self.t0 = time.perf_counter()
+        self.wall = time.time()
+        self.http_ms = None
+        self.status = None
+        self.spans = []
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "route": self.route,
+            "method": self.method,
+            "ts": self.wall,
+            "status": self.status,
+            "http_ms": self.http_ms,
+            "tx": [s.as_dict() for s in self.spans],
+        }
+
+
+def current():
+    return _current.get()
+
+
+def start(route, method="GET"):
+    """Begin a trace in the current context. Returns a token for finish()."""
+    if not enabled:
+        return None
+    trace = Trace(route, method)
+    return trace, _current.set(trace)
+
+
+def finish(token, status=None):
+    """End the trace started with `token` and file it. Returns the trace (or None)."""
+    if token is None:
+        return None
+    trace, ctx_token = token
+    try:
+        _current.reset(ctx_token)
+    except ValueError:
+        _current.set(None)   # finished from another context; just detach
+    trace.http_ms = _ms(trace.t0, time.perf_counter())
+    trace.status = status
+    with _lock:
+        q = _route_ms.get(trace.route)
+        if q is None:
+            q = _route_ms[trace.route] = deque(maxlen=MAX_ROUTE_SAMPLES)
+        q.append(trace.http_ms)
+        if trace.spans:
+            _with_tx.append(trace)
+    return trace
+
+
+def record_tx(macs, t_call, t_written, group=None):
+    """Spans for frames just written (one per MAC), or None when no trace is active."""
+    trace = _current.get()
+    if trace is None:
+        return None
+    spans = [Span(trace, mac, group, t_call, t_written) for mac in macs]
+    trace.spans.extend(spans)
+    return spans
+
+
+class _AckSlot:
+    __slots__ = ("t", "spans", "ack")
+
+    def __init__(self, t):
+        self.t = t
+        self.spans = None
+        self.ack = None         # (status, time) of an answer that arrived before fill()
+
+
+class MasterAckMatcher:
+    """
+    FIFO of writes waiting for the master's per-line answer (text framing only).
+    One slot per TX / TXM line, traced or not, reserved *before* the line is
+    written (under the controller's send lock, so slots are in write order and
+    a fast OK:Sent always finds its slot); the spans are attached by fill()
+    after the write, and cancel() drops the slots of a failed write. Slots
+    older than the timeout are dropped as `no_ack` so a lost line cannot shift
+    every later match.
+    """
+
+    def __init__(self, timeout_sec=ACK_TIMEOUT_SEC):
+        self.timeout_sec = timeout_sec
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_ack_line(line):
+        return (line == "OK:Sent" or line.startswith("OK:SentM:")
+                or line in ("ERR:PeerAdd", "ERR:Send Failed", "ERR:Format"))
+
+    def _expire(self, now):
+        while self._pending and now - self._pending[0].t > self.timeout_sec:
+            slot = self._pending.popleft()
+            for s in slot.spans or ():
+                s.master_ack("no_ack")
+
+    def reserve(self, lines=1):
+        """Queue `lines` slots for lines about to be written. Returns them for fill() / cancel()."""
+        now = time.perf_counter()
+        slots = [_AckSlot(now) for _ in range(lines)]
+        with self._lock:
+            self._expire(now)
+            self._pending.extend(slots)
+        return slots
+
+    def fill(self, slots, t_written, spans_per_slot):
+        """Attach the written lines' spans; applies an answer that already arrived."""
+        done = []
+        with self._lock:
+            for slot, spans in zip(slots, spans_per_slot):
+                slot.t = t_written
+                slot.spans = spans
+                if slot.ack is not None and spans:
+                    done.append((spans, slot.ack))
+        for spans, (status, t) in done:
+            for s in spans:
+                s.master_ack(status, t)
+
+    def cancel(self, slots):
+        """The write failed: nothing will answer these slots."""
+        with self._lock:
+            for slot in slots:
+                try:
+                    self._pending.remove(slot)
+                except ValueError:
+                    pass
+
+    def match(self, line):
+        """Close the oldest pending write with this ACK line. Returns True if one was waiting."""
+        now = time.perf_counter()
+        status = "ok" if line.startswith("OK:") else line[4:].strip().lower().replace(" ", "_")
+        with self._lock:
+            self._expire(now)
+            if not self._pending:
+                return False
+            slot = self._pending.popleft()
+            spans = slot.spans
+            if spans is None:
+                slot.ack = (status, now)     # written but not filled yet: fill() applies it
+        for s in spans or ():
+            s.master_ack(status, now)
+        return True
+
+    def pending(self):
+        return len(self._pending)
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+
+def snapshot(limit=50, route=None):
+    """Recent traces with TX plus p50/p95/p99 per route (and per stage) and per device."""
+    with _lock:
+        traces = [t for t in _with_tx if route is None or t.route == route]
+        route_ms = {r: list(q) for r, q in _route_ms.items() if route is None or r == route}
+    stages = ("handler_ms", "serial_write_ms", "master_ack_ms", "radio_ack_ms")
+    per_route = {}
+    per_device = {}
+    for t in traces:
+        r = per_route.setdefault(t.route, {s: [] for s in stages})
+        for span in t.spans:
+            d = span.as_dict()
+            dev = per_device.setdefault(span.mac, dict({s: [] for s in stages[1:]}, failed=0, no_ack=0))
+            for s in stages:
+                if d[s] is not None:
+                    r[s].append(d[s])
+                    if s in dev:
+                        dev[s].append(d[s])
+            dev["failed"] += d["radio_status"] == "failed"
+            dev["no_ack"] += d["master_status"] == "no_ack"
+    routes = {}
+    for r, samples in route_ms.items():
+        routes[r] = {"http_ms": _percentiles(samples)}
+        for s, vals in per_route.get(r, {}).items():
+            routes[r][s] = _percentiles(vals)
+    devices = {
+        mac: {k: (_percentiles(v) if isinstance(v, list) else v) for k, v in d.items()}
+        for mac, d in per_device.items()
+    }
+    return {
+        "enabled": enabled,
+        "routes": routes,
+        "devices": devices,
+        "recent": [t.as_dict() for t in traces[-limit:]][::-1] if limit else [],
+    }
+
+
+def reset():
+    with _lock:
+        _with_tx.clear()
+        _route_ms.clear()
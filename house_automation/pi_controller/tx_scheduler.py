@@ -0,0 +1,171 @@
+"""
+Burst scheduler: runs multi-frame transmissions (e.g. the 3x IR NEC burst) on one
+background thread so callers (HTTP routes, the serial reader) never sleep.
+
+Each job is a list of frame callables sent `spacing_sec` apart. Jobs that share
+a key (usually the target MAC) run strictly one after another, so bursts of
+back-to-back codes are never interleaved; jobs for different keys are
+independent. `submit()` returns a TxJob handle immediately. Frames run in the
+submitter's contextvars context (so a request's trace follows its burst).
+
+Example:
+    sched = BurstScheduler(name="ir-tx")
+    job = sched.submit(mac, [send_first, send_repeat, send_repeat], spacing_sec=0.1, description="IR F7C03F")
+    job.wait(1.0)   # optional; job.status -> 'done' / 'skipped' / 'failed' / 'cancelled'
+
+A frame returning False means "nothing to send" (the first frame: the job is
+`skipped`); a frame that raises fails the job with the exception as `error`.
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+import thread_registry
+
+logger = logging.getLogger("PiController")
+
+
+class TxJob:
+    """Handle for a scheduled burst. Finished when `done` is set."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, key, frames, spacing_sec, description=""):
+        self.id = next(self._ids)
+        self.key = key
+        self.frames = list(frames)
+        self.spacing_sec = float(spacing_sec)
+        self.description = description
+        self.status = "queued"        # queued | running | done | skipped | failed | cancelled
+        self.sent = 0
+        self.error = ""
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+        self._next = 0
+        self._context = contextvars.copy_context()
+
+    def wait(self, timeout=None):
+        """Block until the job finished. Returns True if it did within `timeout`."""
+        return self.done.wait(timeout)
+
+    def cancel(self):
+        """Cancel remaining frames (frames already sent stay sent)."""
+        if not self.done.is_set():
+            self.status = "cancelled"
+
+    def _finish(self, status):
+        if self.status != "cancelled":
+            self.status = status
+        self.finished_at = time.time()
+        self.done.set()
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "sent": self.sent,
+            "frames": len(self.frames),
+            "error": self.error,
+        }
+
+
+class BurstScheduler:
+    def __init__(self, name="tx-scheduler", gap_sec=None):
+        self.name = name
+        # Pause between consecutive jobs on the same key (defaults to the job's own spacing).
+        self.gap_sec = gap_sec
+        self._cond = threading.Condition()
+        self._queues = {}     # key -> deque[TxJob]
+        self._ready = []      # heap of (due_time, seq, key); one entry per active key
+        self._seq = itertools.count()
+        self._thread = None
+        self.stats = {"jobs": 0, "frames": 0, "skipped": 0, "failed": 0, "max_queue": 0}
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, key, frames, spacing_sec=0.1, description=""):
+        """Queue a burst. Each frame is a callable returning truthy on send; a falsy
+        first frame means 'nothing to do' and skips the rest of the job."""
+        job = TxJob(key, frames, spacing_sec, description)
+        with self._cond:
+            q = self._queues.get(key)
+            if q is None:
+                q = self._queues[key] = deque()
+                heapq.heappush(self._ready, (time.monotonic(), next(self._seq), key))
+            q.append(job)
+            self.stats["jobs"] += 1
+            self.stats["max_queue"] = max(self.stats["max_queue"], len(q))
+            self._ensure_thread()
+            self._cond.notify()
+        return job
+
+    def pending(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    def _run(self):
+        logger.info("Burst scheduler '%s' started", self.name)
+        thread_registry.register()
+        while True:
+            with self._cond:
+                while True:
+                    if self._ready:
+                        wait = self._ready[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        thread_registry.beat(wait)
+                        self._cond.wait(timeout=wait)
+                    else:
+                        thread_registry.beat()     # idle: nothing due, no deadline
+                        self._cond.wait()
+                _due, _seq, key = heapq.heappop(self._ready)
+                job = self._queues[key][0]
+
+            thread_registry.beat(5.0)
+            delay = self._step(job)
+
+            with self._cond:
+                q = self._queues[key]
+                if job.done.is_set():
+                    q.popleft()
+                    gap = self.gap_sec if self.gap_sec is not None else job.spacing_sec
+                    delay = gap if job.sent else 0.0
+                if q:
+                    heapq.heappush(self._ready, (time.monotonic() + delay, next(self._seq), key))
+                else:
+                    del self._queues[key]
+
+    def _step(self, job):
+        """Send the job's next frame. Returns the delay before its following frame."""
+        if job.status == "cancelled":
+            job._finish("cancelled")
+            return 0.0
+        job.status = "running"
+        idx = job._next
+        try:
+            ok = job._context.run(job.frames[idx])
+        except Exception as e:
+            ok = False
+            job.error = str(e)
+            logger.error("Burst '%s' frame %d failed: %s", job.description, idx + 1, e)
+        job._next += 1
+        if ok:
+            job.sent += 1
+            self.stats["frames"] += 1
+        elif idx == 0:
+            self.stats["skipped" if not job.error else "failed"] += 1
+            job._finish("skipped" if not job.error else "failed")
+            return 0.0
+        if job._next >= len(job.frames):
+            job._finish("done" if job.sent == len(job.frames) else "failed")
+            return 0.0
+        return job.spacing_sec
@@ -1,11 +1,11 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, g
+import atexit
+import signal
 import threading
 import time
 import logging
 import sys
 import os
-import requests
-import json
 from datetime import datetime
 
 # Setup logging first: rotating file (recent logs only) + console
@@ -16,15 +16,50 @@ LOG_DIR = setup_logging()
 from controller import SerialController
 import config
 from onocoy_station_store import OnocoyStationStore
+from onocoy_poller import OnocoyPoller, info_url_tmpl
+from onocoy_history import OnocoyHistory
+from checkpoint import Checkpointer
+import circuit_breaker
+import codec
+import tracing
+import profiler
+import thread_registry
+from rules_engine import RulesEngine
+from scenes import SceneRunner, SceneError, OK_STATUSES
+from flight_recorder import FlightRecorder
 
 logger = logging.getLogger("WebServer")
 
 app = Flask(__name__, static_url_path='', static_folder='static', template_folder='static')
+tracing.enabled = config.TRACING_ENABLED
 
 # Global Controller Instance
 controller = None
 onocoy_store = None
+onocoy_poller = None
+onocoy_history = None
 onocoy_poll_wakeup_event = threading.Event()
+checkpointer = None
+rules = None
+scenes = None
+flight_recorder = None
+
+
+@app.before_request
+def _start_trace():
+    # API routes only (static files are not interesting); see tracing.py.
+    if request.path.startswith('/api/') and not request.path.startswith(('/api/debug/traces', '/api/debug/profile')):
+        rule = request.url_rule.rule if request.url_rule else request.path
+        g.trace = tracing.start(rule, request.method)
+
+
+@app.after_request
+def _finish_trace(response):
+    token = g.pop('trace', None)
+    if token is not None:
+        trace = tracing.finish(token, response.status_code)
+        response.headers['X-Trace-Id'] = trace.id
+    return response
 
 
 def _local_epoch_now():
@@ -36,8 +71,8 @@ def _local_epoch_now():
 
 
 def _presence_probe():
-    """Run presence check and return (is_home, metadata dict)."""
-    is_home = controller.is_phone_home()
+    """Run presence check now and return (is_home, metadata dict)."""
+    is_home = controller.check_presence_now()
     meta = getattr(controller, 'last_presence_check', {}) or {}
     return is_home, meta
 
@@ -50,16 +85,17 @@ def _repo_root() -> str:
     return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 
 
-def start_onocoy_poller():
+def start_onocoy_poller(data_dir=None):
     """
     Start background Onocoy polling exactly once and fill `onocoy_store`.
     Dashboard requests read cached data (fast + reliable on the Pi).
+    `data_dir` overrides where the JSON files live (benchmarks use a temp dir).
     """
-    global onocoy_store
+    global onocoy_store, onocoy_poller, onocoy_history
     if onocoy_store is not None:
-        return
+        return onocoy_poller
 
-    repo_root = _repo_root()
+    repo_root = data_dir or _repo_root()
     stations_path = os.path.join(repo_root, "onocoy_stations.json")
     settings_path = os.path.join(repo_root, "onocoy_settings.json")
 
@@ -69,51 +105,35 @@ def start_onocoy_poller():
         min_poll_interval_sec=5,
         default_poll_interval_sec=60,
     )
+    # Write-behind persistence: only real changes, at most once per interval.
+    onocoy_store.start_flusher(config.ONOCOY_MIN_FLUSH_INTERVAL_SEC)
+    # Status transitions only (append-only log) -> uptime / outage / flapping queries.
+    onocoy_history = OnocoyHistory(
+        os.path.join(repo_root, "onocoy_history.log"),
+        retention_days=config.ONOCOY_HISTORY_RETENTION_DAYS,
+    )
 
-    url_tmpl = "https://api.onocoy.com/api/v1/explorer/server/{station_id}/info"
+    # Stations are fetched concurrently (bounded pool) so one slow station
+    # no longer delays the rest of the cycle.
+    onocoy_poller = OnocoyPoller(
+        onocoy_store,
+        url_tmpl=info_url_tmpl(config.ONOCOY_API_BASE_URL),
+        max_workers=config.ONOCOY_POLL_CONCURRENCY,
+        connect_timeout_sec=config.ONOCOY_CONNECT_TIMEOUT_SEC,
+        read_timeout_sec=config.ONOCOY_READ_TIMEOUT_SEC,
+        jitter_sec=config.ONOCOY_POLL_JITTER_SEC,
+        wakeup_event=onocoy_poll_wakeup_event,
+        history=onocoy_history,
+        breaker_settings=config.BREAKER_SETTINGS['onocoy'],
+        on_status_change=_onocoy_status_changed,
+    )
+    onocoy_poller.start()
+    return onocoy_poller
 
-    def _poll_loop():
-        session = requests.Session()
-        while True:
-            try:
-                snapshot = onocoy_store.get_snapshot()
-                station_ids = list(snapshot.keys())
-                interval = onocoy_store.get_polling_interval()
-                # Single lightweight log per cycle so we can verify polling is alive
-                # and includes newly added stations.
-                logger.info(
-                    "Onocoy poller cycle: interval=%ss stations=%s",
-                    interval,
-                    ",".join(station_ids),
-                )
-
-                for station_id in station_ids:
-                    url = url_tmpl.format(station_id=station_id)
-                    try:
-                        r = session.get(url, timeout=10)
-                        if r.status_code == 200:
-                            info = r.json()
-                        else:
-                            info = {"status": {"is_up": False, "since": None}}
-                    except Exception:
-                        info = {"status": {"is_up": False, "since": None}}
-
-                    onocoy_store.update_station_from_onocoy_info(
-                        station_id=station_id,
-                        info=info,
-                    )
-
-                # Persist updated station status so it survives Pi restarts.
-                onocoy_store.save_stations()
-                # Sleep, but allow immediate wake-up when pool time or stations change.
-                onocoy_poll_wakeup_event.wait(timeout=interval)
-                onocoy_poll_wakeup_event.clear()
-            except Exception as e:
-                logger.error("Onocoy poller error: %s", e)
-                onocoy_poll_wakeup_event.wait(timeout=10)
-                onocoy_poll_wakeup_event.clear()
 
-    threading.Thread(target=_poll_loop, daemon=True).start()
+def _onocoy_status_changed(station_id, is_up):
+    if rules:
+        rules.publish("onocoy", "online" if is_up else "offline", station=station_id)
 
 @app.route('/')
 def index():
@@ -132,8 +152,15 @@ def ir_send():
         return jsonify({"error": "Missing code"}), 400
     
     if controller and 'ir' in controller.handlers:
-        controller.handlers['ir'].send_nec(code)
-        return jsonify({"status": "sent", "code": code})
+        # Returns immediately; the burst runs on the IR scheduler thread.
+        job = controller.handlers['ir'].send_nec(code, force=True)
+        if job is None:
+            return jsonify({"error": "Invalid code or IR not configured"}), 400
+        if data.get('wait'):
+            # Optional: wait for the whole burst (~0.2 s) and report its outcome:
+            # done / skipped (shadow: already sent) / failed (error "serial_down" when the link is down).
+            job.wait(timeout=2)
+        return jsonify({"status": job.status, "code": code, "job": job.as_dict()})
     return jsonify({"error": "Controller not ready"}), 503
 
 # --- API: LED Control ---
@@ -147,26 +174,22 @@ def led_cmd():
 
     if controller and 'led' in controller.handlers:
         handler = controller.handlers['led']
-        import struct
 
+        # Dashboard clicks are explicit: always send, even if the shadow says it's already set.
         if cmd == 'on':
-            handler.send_cmd("02100000803F", "ON")
+            handler.send_cmd(codec.LED_ON, "ON", force=True)
         elif cmd == 'off':
-            handler.send_cmd("021000000000", "OFF")
+            handler.send_cmd(codec.LED_OFF, "OFF", force=True)
         elif cmd == 'rgb':
             # Static color: val = color ID (1-8)
             if val is not None:
-                float_hex = struct.pack('<f', int(val)).hex()
-                payload = "0212" + float_hex
-                handler.send_cmd(payload, f"Color {val}")
+                handler.send_cmd(codec.led_rgb(int(val)), f"Color {val}", force=True)
         elif cmd == 'mode' or cmd == 'effect':
             # Effect/mode: mode number (e.g. 37=Rainbow), speed 1-100
             m = int(mode) if mode is not None else int(val) if val is not None else None
             if m is not None and 1 <= m <= 255:
                 sp = max(1, min(100, int(speed)))
-                val_u32 = (m << 8) | sp
-                payload = "0213" + struct.pack('<I', val_u32).hex()
-                handler.send_cmd(payload, f"Mode {m} Speed {sp}")
+                handler.send_cmd(codec.led_mode(m, sp), f"Mode {m} Speed {sp}", force=True)
             else:
                 return jsonify({"error": "Invalid mode (1-255)"}), 400
         else:
@@ -184,7 +207,7 @@ def ono_text():
     if not text:
         return jsonify({"error": "Missing text"}), 400
     if controller and 'ono' in controller.handlers:
-        controller.handlers['ono'].send_text(text, duration)
+        controller.handlers['ono'].send_text(text, duration, force=True)
         return jsonify({"status": "ok", "text": text[:50], "duration": duration})
     return jsonify({"error": "Controller not ready"}), 503
 
@@ -194,7 +217,7 @@ def ono_rainbow():
     data = request.json or {}
     duration = max(1, min(300, int(data.get('duration', 10))))
     if controller and 'ono' in controller.handlers:
-        controller.handlers['ono'].send_rainbow(duration)
+        controller.handlers['ono'].send_rainbow(duration, force=True)
         return jsonify({"status": "ok", "duration": duration})
     return jsonify({"error": "Controller not ready"}), 503
 
@@ -207,7 +230,7 @@ def ono_color():
     b = max(0, min(255, int(data.get('b', 0))))
     duration = max(1, min(300, int(data.get('duration', 10))))
     if controller and 'ono' in controller.handlers:
-        controller.handlers['ono'].send_color(r, g, b, duration)
+        controller.handlers['ono'].send_color(r, g, b, duration, force=True)
         return jsonify({"status": "ok", "r": r, "g": g, "b": b, "duration": duration})
     return jsonify({"error": "Controller not ready"}), 503
 
@@ -219,7 +242,7 @@ def led_raw():
     if not hex_payload or not all(c in '0123456789ABCDEFabcdef' for c in hex_payload) or len(hex_payload) % 2 != 0:
         return jsonify({"error": "Invalid hex payload"}), 400
     if controller and 'led' in controller.handlers:
-        controller.handlers['led'].send_cmd(hex_payload, "RAW")
+        controller.handlers['led'].send_cmd(hex_payload, "RAW", force=True)
         return jsonify({"status": "sent", "hex": hex_payload})
     return jsonify({"error": "Controller not ready"}), 503
 
@@ -238,28 +261,26 @@ def hydration_cmd():
 
     # Handle Named Commands
     if cmd == 'tare':
-        controller.send_command(mac, "012200000000")
+        controller.send_command(mac, codec.HYD_TARE_MSG)
         return jsonify({"status": "tare_sent"})
     if cmd == 'led_on':
-        controller.send_command(mac, "0110" + "0000803F")  # CMD_SET_LED, float 1.0
+        controller.send_command(mac, codec.hydration(codec.HYD_SET_LED, 1.0))
         return jsonify({"status": "led_on"})
     if cmd == 'led_off':
-        controller.send_command(mac, "0110" + "00000000")  # CMD_SET_LED, float 0.0
+        controller.send_command(mac, codec.hydration(codec.HYD_SET_LED, 0.0))
         return jsonify({"status": "led_off"})
     if cmd == 'buzzer_on':
-        controller.send_command(mac, "0111" + "0000803F")  # CMD_SET_BUZZER, float 1.0
+        controller.send_command(mac, codec.hydration(codec.HYD_SET_BUZZER, 1.0))
         return jsonify({"status": "buzzer_on"})
     if cmd == 'buzzer_off':
-        controller.send_command(mac, "0111" + "00000000")  # CMD_SET_BUZZER, float 0.0
+        controller.send_command(mac, codec.hydration(codec.HYD_SET_BUZZER, 0.0))
         return jsonify({"status": "buzzer_off"})
     if cmd == 'sync_time':
-        import struct
-        controller.send_command(mac, "0131" + struct.pack('<I', _local_epoch_now()).hex())
+        controller.send_command(mac, codec.hydration_time(_local_epoch_now()))
         return jsonify({"status": "sync_time_sent"})
     if cmd == 'ping_presence':
         is_home, meta = _presence_probe()
-        payload = "0000803F" if is_home else "00000000"
-        controller.send_command(mac, "0141" + payload)
+        controller.send_command(mac, codec.hydration_presence(is_home))
         return jsonify({
             "status": "ping_presence_sent",
             "presence": "home" if is_home else "away",
@@ -268,20 +289,18 @@ def hydration_cmd():
             "checked_at": meta.get("timestamp", time.time()),
         })
     if cmd == 'request_daily_total':
-        import struct
-        controller.send_command(mac, "0123" + struct.pack('<f', 0.0).hex())
+        controller.send_command(mac, codec.hydration(codec.HYD_REQUEST_DAILY_TOTAL))
         return jsonify({"status": "request_daily_total_sent"})
 
     # Handle Raw/Generic Commands (cmd as hex or int)
     try:
         cmd_id = int(cmd) if isinstance(cmd, int) else int(cmd, 16) if isinstance(cmd, str) and cmd.startswith('0x') else int(cmd)
-        import struct
-        val_bytes = struct.pack('<f', float(val)).hex()
-        payload = f"01{cmd_id:02X}{val_bytes}"
-        controller.send_command(mac, payload)
+        msg = codec.hydration(cmd_id, val)
+        payload = msg.hex().upper()
+        controller.send_command(mac, msg)
         logger.info(f"Sent Generic Hydration CMD: {payload}")
         return jsonify({"status": "sent", "payload": payload})
-    except (ValueError, TypeError):
+    except (ValueError, TypeError, codec.error):
         pass
 
     if cmd == 'test_alert':
@@ -308,7 +327,9 @@ def aio_cmd():
                 'Content-Type': 'application/json'
             }
             payload = {'value': value}
-            response = requests.post(config.AIO_FEED_URL, headers=headers, json=payload, timeout=5)
+            response = circuit_breaker.request(
+                "post", config.AIO_FEED_URL, headers=headers, json=payload, timeout=5,
+                **config.BREAKER_SETTINGS['aio'])
             
             if response.status_code == 200:
                 logger.info(f"AIO Success: {device} -> {action}")
@@ -316,7 +337,10 @@ def aio_cmd():
             else:
                 logger.error(f"AIO Fail: {response.text}")
                 return jsonify({"error": "AIO Error", "details": response.text}), 502
-                
+
+        except circuit_breaker.CircuitOpenError as e:
+            logger.warning(f"AIO skipped: {e}")
+            return jsonify({"error": "AIO unavailable", "details": str(e), "retry_in_sec": round(e.retry_in_sec)}), 503
         except Exception as e:
             logger.error(f"AIO Request Failed: {e}")
             return jsonify({"error": str(e)}), 500
@@ -338,7 +362,7 @@ def servo_spray():
                 run_sequence(base_url)
             except Exception as e:
                 logger.error("Servo spray sequence error: %s", e)
-        threading.Thread(target=_run, daemon=True).start()
+        threading.Thread(target=_run, name="servo-spray", daemon=True).start()
         return jsonify({"status": "started", "message": "Sequence running in background"})
     result = run_sequence(base_url)
     return jsonify(result)
@@ -368,6 +392,46 @@ def onocoy_status():
     )
 
 
+@app.route('/api/debug/onocoy_poller', methods=['GET'])
+def debug_onocoy_poller():
+    """
+    Poller internals: per-station schedule, backoff, breaker, detection latency.
+    Kept off /api/onocoy/status, which every dashboard tab polls and which must stay an O(1) snapshot read.
+    """
+    if not onocoy_poller:
+        return jsonify({"error": "Onocoy poller not started"}), 503
+    return jsonify(onocoy_poller.stats())
+
+
+@app.route('/api/onocoy/history', methods=['GET'])
+def onocoy_history_api():
+    """
+    Uptime %, outages and flapping score per station from recorded transitions.
+    Query: ?days=7 (or ?start=<epoch>&end=<epoch>), optional &station_id=<id> for the outage list.
+    """
+    if not onocoy_store or not onocoy_history:
+        return jsonify({"error": "Onocoy store not ready"}), 503
+    now = time.time()
+    try:
+        end = float(request.args.get("end", now))
+        if "start" in request.args:
+            start = float(request.args["start"])
+        else:
+            start = end - max(0.01, float(request.args.get("days", 7))) * 86400
+    except ValueError:
+        return jsonify({"error": "start/end/days must be numbers"}), 400
+    if start >= end:
+        return jsonify({"error": "start must be before end"}), 400
+
+    station_id = (request.args.get("station_id") or "").strip()
+    snapshot = onocoy_store.get_snapshot()
+    station_ids = [station_id] if station_id else list(snapshot.keys())
+    stations = onocoy_history.summary(station_ids, start, end, include_outages=bool(station_id))
+    for sid, entry in stations.items():
+        entry["nickname"] = (snapshot.get(sid) or {}).get("nickname", sid)
+    return jsonify({"start": start, "end": end, "stations": stations})
+
+
 @app.route('/api/onocoy/manage-station', methods=['POST'])
 def onocoy_manage_station():
     if not onocoy_store:
@@ -383,12 +447,27 @@ def onocoy_manage_station():
     if not station_id:
         return jsonify({"error": "Missing station_id"}), 400
 
+    # Optional fixed interval for this station (null/0 = adaptive schedule); checked before anything changes.
+    poll_interval = data.get("poll_interval")
+    if action == "add" and poll_interval is not None:
+        try:
+            if isinstance(poll_interval, bool) or (isinstance(poll_interval, float) and not poll_interval.is_integer()):
+                raise ValueError(poll_interval)
+            poll_interval = int(poll_interval)
+        except (TypeError, ValueError):
+            return jsonify({"error": "poll_interval must be an integer"}), 400
+        if poll_interval < 0:
+            return jsonify({"error": "poll_interval must not be negative"}), 400
+
     if action == "add":
         onocoy_store.add_station(station_id, nickname=nickname or station_id)
+        if "poll_interval" in data:
+            onocoy_store.set_station_poll_interval(station_id, poll_interval)
     else:
         onocoy_store.remove_station(station_id)
 
-    onocoy_store.save_stations()
+    # User edits are rare: persist right away instead of waiting for the flusher.
+    onocoy_store.flush()
     logger.info("Onocoy manage-station: action=%s station_id=%s", action, station_id)
     # Wake poller so newly added/removed stations are polled quickly.
     onocoy_poll_wakeup_event.set()
@@ -434,6 +513,28 @@ def health():
             out["serial"] = controller.health()
         except Exception as e:
             out["serial"] = {"error": str(e)}
+        if 'ir' in controller.handlers:
+            sched = controller.handlers['ir'].scheduler
+            out["ir_tx"] = dict(sched.stats, pending=sched.pending())
+        if 'ono' in controller.handlers:
+            out["ono_price"] = controller.handlers['ono'].price_push_stats()
+    if checkpointer:
+        out["checkpoint"] = checkpointer.health()
+    if onocoy_store:
+        out["onocoy_store"] = onocoy_store.write_stats()
+    # Per-host breakers (closed / open / half_open) for CoinGecko, Onocoy, Adafruit IO, servo.
+    out["breakers"] = circuit_breaker.snapshot()
+    # Service threads: heartbeat state (stalled / dead) and CPU per thread.
+    out["threads"] = thread_registry.snapshot()
+    if out["threads"]["stalled"] or out["threads"]["dead"]:
+        out["ok"] = False
+    if rules:
+        st = rules.stats()
+        out["rules"] = {k: st[k] for k in ("events", "evaluated", "action_errors", "reloads", "reload_errors",
+                                      "last_reload_error")}
+        # Rules with failed actions (e.g. a scene whose steps timed out), with the most recent error.
+        out["rules"]["rule_errors"] = {rid: {"errors": r["errors"], "last_error": r["last_error"]}
+                                       for rid, r in st["rules"].items() if r["errors"]}
     if include_system:
         try:
             import subprocess
@@ -460,6 +561,60 @@ def health():
     return jsonify(out)
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text format: per-thread CPU / heartbeat / stall state, process RSS and threads."""
+    snap = thread_registry.snapshot()
+    lines = [
+        "# HELP pi_thread_cpu_seconds_total CPU time (user + system) per service thread.",
+        "# TYPE pi_thread_cpu_seconds_total counter",
+    ]
+    for name, t in sorted(snap["threads"].items()):
+        if t["cpu_sec"] is not None:
+            lines.append(f'pi_thread_cpu_seconds_total{{thread="{name}"}} {t["cpu_sec"]}')
+    for label, o in sorted(snap["other"].items()):
+        lines.append(f'pi_thread_cpu_seconds_total{{thread="{label}",registered="false"}} {o["cpu_sec"]}')
+    lines += [
+        "# HELP pi_thread_heartbeat_age_seconds Seconds since the thread's last heartbeat.",
+        "# TYPE pi_thread_heartbeat_age_seconds gauge",
+    ]
+    lines += [f'pi_thread_heartbeat_age_seconds{{thread="{n}"}} {t["beat_age_sec"]}'
+              for n, t in sorted(snap["threads"].items())]
+    lines += [
+        "# HELP pi_thread_stalled 1 if the thread missed its heartbeat deadline or died.",
+        "# TYPE pi_thread_stalled gauge",
+    ]
+    lines += [f'pi_thread_stalled{{thread="{n}",state="{t["state"]}"}} {0 if t["state"] == "ok" else 1}'
+              for n, t in sorted(snap["threads"].items())]
+    lines += [
+        "# HELP pi_thread_stalls_total Times the thread was flagged stalled.",
+        "# TYPE pi_thread_stalls_total counter",
+    ]
+    lines += [f'pi_thread_stalls_total{{thread="{n}"}} {t["stalls"]}' for n, t in sorted(snap["threads"].items())]
+    lines += [
+        "# HELP pi_process_threads OS threads in the service process.",
+        "# TYPE pi_process_threads gauge",
+        f'pi_process_threads {snap["process"]["threads"]}',
+    ]
+    if snap["process"]["cpu_sec"] is not None:
+        lines += [
+            "# HELP pi_process_cpu_seconds_total CPU time of the service process.",
+            "# TYPE pi_process_cpu_seconds_total counter",
+            f'pi_process_cpu_seconds_total {snap["process"]["cpu_sec"]}',
+        ]
+    try:
+        with open("/proc/self/status") as f:
+            rss_kb = int(next(line for line in f if line.startswith("VmRSS:")).split()[1])
+        lines += [
+            "# HELP pi_process_resident_memory_bytes Resident memory of the service process.",
+            "# TYPE pi_process_resident_memory_bytes gauge",
+            f"pi_process_resident_memory_bytes {rss_kb * 1024}",
+        ]
+    except (OSError, StopIteration, ValueError):
+        pass
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 def _parse_meminfo(content, key):
     for line in content.splitlines():
         if line.startswith(key + ":"):
@@ -470,15 +625,21 @@ def _parse_meminfo(content, key):
 # --- API: Debug / crash investigation ---
 @app.route('/api/debug/last_health', methods=['GET'])
 def debug_last_health():
-    """Return last health snapshot (written every 60s). Use after reboot to see pre-crash state."""
-    path = os.path.join(LOG_DIR, "last_health.json")
+    """
+    Flight recorder records (one per second) from the last ?minutes=10 of a session:
+    ?session=previous (default: the run before this process, i.e. before the crash / reboot),
+    current, or an index into "sessions". ?records=0 returns the summary only.
+    """
+    if not flight_recorder:
+        return jsonify({"error": "Flight recorder not running"}), 503
+    minutes = min(config.FLIGHT_RECORDER_MINUTES, max(0.1, request.args.get('minutes', 10.0, type=float)))
     try:
-        with open(path) as f:
-            return jsonify(json.load(f))
-    except FileNotFoundError:
-        return jsonify({"error": "No snapshot yet"}), 404
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        out = flight_recorder.window(minutes, session=request.args.get('session', 'previous'))
+    except (ValueError, IndexError):
+        return jsonify({"error": "Invalid session"}), 400
+    if request.args.get('records') == '0':
+        out.pop("records", None)
+    return jsonify(out)
 
 
 @app.route('/api/debug/log', methods=['GET'])
@@ -500,6 +661,10 @@ def debug_log():
 # --- API: System Status (Polling) ---
 @app.route('/api/data', methods=['GET'])
 def get_data():
+    """
+    Hydration snapshot with a version ETag. With If-None-Match and ?wait=N (long poll, capped at
+    DATA_LONG_POLL_MAX_SEC) an unchanged state blocks until the next version instead of answering 304 at once.
+    """
     if not controller:
         return jsonify({"error": "Controller off"}), 503
     
@@ -510,152 +675,209 @@ def get_data():
         }
     }
     
-    # Hydration Data
+    # Hydration Data (one immutable snapshot -> fields are always consistent)
+    etag = None
     if 'hydration' in controller.handlers:
-        h_data = controller.handlers['hydration'].current_data
+        cell = controller.handlers['hydration'].state
+        h_state = cell.get()
+        # Version-based ETag: unchanged state -> 304 without rebuilding the JSON.
+        etag = f"h{h_state.version}"
+        if request.if_none_match.contains(etag):
+            wait = min(config.DATA_LONG_POLL_MAX_SEC, max(0.0, request.args.get('wait', 0.0, type=float)))
+            newer = cell.wait_for_change(h_state.version, timeout=wait) if wait else None
+            if newer is None:
+                return "", 304, {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+            h_state = newer
+            etag = f"h{h_state.version}"
         response['hydration'] = {
-            "weight": round(h_data.get('weight', 0), 1),
-            "status": h_data.get('status', 'Unknown'),
-            "last_update": h_data.get('last_update', 0),
-            "last_drink_ml": round(h_data.get('last_drink_ml', 0), 1),
-            "last_drink_time": h_data.get('last_drink_time', 0),
-            "daily_total_ml": round(h_data.get('daily_total_ml', 0), 1),
-            "presence_last_state": h_data.get('presence_last_state', 'UNKNOWN'),
-            "presence_last_checked": h_data.get('presence_last_checked', 0),
-            "presence_last_method": h_data.get('presence_last_method', 'none'),
-            "presence_last_error": h_data.get('presence_last_error', ''),
+            "weight": round(h_state.weight, 1),
+            "status": h_state.status,
+            "last_update": h_state.last_update,
+            "last_drink_ml": round(h_state.last_drink_ml, 1),
+            "last_drink_time": h_state.last_drink_time,
+            "daily_total_ml": round(h_state.daily_total_ml, 1),
+            "presence_last_state": h_state.presence_last_state,
+            "presence_last_checked": h_state.presence_last_checked,
+            "presence_last_method": h_state.presence_last_method,
+            "presence_last_error": h_state.presence_last_error,
+            "version": h_state.version,
+            "stale": h_state.stale,
         }
-        
-    return jsonify(response)
+
+    resp = jsonify(response)
+    if etag:
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 # --- API: Master Control ---
 @app.route('/api/master/cmd', methods=['POST'])
 def master_cmd():
-    data = request.json
+    """All lights + LED + IR on/off as one scene (all_on / all_off); returns per-step outcomes."""
+    data = request.json or {}
     action = data.get('action') # 'on', 'off'
     
     if action not in ['on', 'off']:
         return jsonify({"error": "Invalid Action"}), 400
-        
+    if not scenes:
+        return jsonify({"error": "Controller not ready"}), 503
+
     logger.info(f"MASTER CONTROL: Turning ALL {action.upper()}")
-    
-    # 1. Room Lights (AIO) - Run in Parallel Threads
-    def send_aio(val):
-        headers = {'X-AIO-Key': config.AIO_KEY, 'Content-Type': 'application/json'}
-        try: requests.post(config.AIO_FEED_URL, headers=headers, json={'value': val}, timeout=2)
-        except: pass
+    result = scenes.run(f"all_{action}")
+    return jsonify(dict(result, status="master_sequence_done" if result["ok"] else "master_sequence_partial"))
 
-    # Neon Thread
-    neon_val = config.LIGHT_CMDS['neon'][action]
-    threading.Thread(target=send_aio, args=(neon_val,)).start()
 
-    # Spot Thread
-    spot_val = config.LIGHT_CMDS['spot'][action]
-    threading.Thread(target=send_aio, args=(spot_val,)).start()
+# --- API: Scenes ---
+@app.route('/api/scenes', methods=['GET'])
+def scenes_list():
+    if not scenes:
+        return jsonify({"error": "Controller not ready"}), 503
+    return jsonify(scenes.stats())
 
-    # 2. Local Devices (IR, LED)
-    if controller:
-        # IR Power (Assuming Toggle, but ideally we have discrete ON/OFF)
-        # User only gave 'F7F00F' (Smooth/Power?). If it is a toggle, syncing is hard.
-        # Assuming F7F00F is POWER toggle.
-        if action == 'off':
-             # Send IR OFF
-             if 'ir' in controller.handlers:
-                 controller.handlers['ir'].send_nec('F740BF')
-             # LED OFF
-             if 'led' in controller.handlers:
-                 controller.handlers['led'].send_cmd("021000000000", "OFF")
-        
-        elif action == 'on':
-             # Send IR ON
-             if 'ir' in controller.handlers:
-                 controller.handlers['ir'].send_nec('F7C03F')
-             # LED ON (White default?)
-             if 'led' in controller.handlers:
-                 controller.handlers['led'].send_cmd("02100000803F", "ON")
-
-    return jsonify({"status": "master_sequence_started"})
-
-def _write_health_snapshot():
-    """Write last-known health to a file so after crash/reboot we can inspect it."""
-    path = os.path.join(LOG_DIR, "last_health.json")
+
+@app.route('/api/scene/<name>', methods=['POST'])
+def scene_run(name):
+    """Run a scene from config.SCENES; optional {"deadline_sec": N} overrides its deadline."""
+    if not scenes:
+        return jsonify({"error": "Controller not ready"}), 503
+    data = request.get_json(silent=True) or {}
     try:
-        data = {"ts": time.time()}
-        # Memory
-        try:
-            with open("/proc/meminfo") as f:
-                c = f.read()
-            for line in c.splitlines():
-                if line.startswith("MemAvailable:"):
-                    data["mem_available_kb"] = int(line.split()[1])
-                elif line.startswith("MemTotal:"):
-                    data["mem_total_kb"] = int(line.split()[1])
-        except Exception:
-            pass
-        # Load
-        try:
-            with open("/proc/loadavg") as f:
-                data["load_avg"] = f.read().strip().split()[:3]
-        except Exception:
-            pass
-        # Serial
-        if controller:
-            try:
-                data["serial"] = controller.health()
-            except Exception:
-                data["serial"] = "error"
-        with open(path, "w") as f:
-            json.dump(data, f, indent=0)
-    except Exception as e:
-        logger.debug("Health snapshot failed: %s", e)
+        deadline = data.get('deadline_sec')
+        result = scenes.run(name, deadline_sec=float(deadline) if deadline else None)
+    except SceneError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError:
+        return jsonify({"error": "Invalid deadline_sec"}), 400
+    return jsonify(result)
 
 
-def _health_snapshot_loop():
-    """Daemon: write health snapshot every 60s for post-crash debug."""
-    while True:
-        time.sleep(60)
-        _write_health_snapshot()
+@app.route('/api/debug/traces', methods=['GET'])
+def debug_traces():
+    """
+    Command latency per route / device: handler, serial write, master ACK and radio ACK
+    (p50/p95/p99/max), plus the most recent traces that sent frames.
+    Query: ?limit=50 (recent traces), ?route=/api/led (one route only).
+    """
+    limit = min(300, max(0, request.args.get('limit', 50, type=int)))
+    return jsonify(tracing.snapshot(limit=limit, route=request.args.get('route') or None))
+
+
+@app.route('/api/debug/profile', methods=['GET'])
+def debug_profile():
+    """
+    Sample every thread's stack for ?seconds=N (default 5) at ?hz= (default PROFILER_DEFAULT_HZ)
+    and return collapsed stacks per thread name (flamegraph.pl / speedscope input).
+    ?format=json gives per-thread counts and the hottest stacks instead; ?lines=1 keeps line numbers.
+    Disabled unless PROFILER_ENABLED.
+    """
+    if not config.PROFILER_ENABLED:
+        return jsonify({"error": "Profiler disabled (set PROFILER_ENABLED=1)"}), 403
+    seconds = min(config.PROFILER_MAX_SEC, max(0.1, request.args.get('seconds', 5.0, type=float)))
+    hz = min(config.PROFILER_MAX_HZ, max(1, request.args.get('hz', config.PROFILER_DEFAULT_HZ, type=int)))
+    try:
+        prof = profiler.sample(seconds, hz, lines=request.args.get('lines') == '1')
+    except profiler.ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    logger.info("Profile taken: %.1fs at %d Hz, %d samples", prof.elapsed, hz, prof.samples)
+    if request.args.get('format') == 'json':
+        return jsonify(prof.as_dict(top=request.args.get('top', 20, type=int)))
+    return prof.collapsed(), 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
+# --- API: Automation rules ---
+@app.route('/api/rules', methods=['GET'])
+def rules_status():
+    """Loaded rules, trigger index and per-rule fired/skipped/error counts and latency."""
+    if not rules:
+        return jsonify({"error": "Rules engine not running"}), 503
+    return jsonify(rules.stats())
+
+
+@app.route('/api/rules/reload', methods=['POST'])
+def rules_reload():
+    if not rules:
+        return jsonify({"error": "Rules engine not running"}), 503
+    ok = rules.reload()
+    return jsonify({"status": "ok" if ok else "error", "error": rules.last_reload_error}), (200 if ok else 400)
+
+def _flight_probe():
+    """Service side of a flight recorder record (see flight_recorder.FIELDS)."""
+    stalled, dead = thread_registry.check()
+    out = {"stalled": len(stalled) + len(dead)}
+    c = controller
+    if c is None:
+        return out
+    out["serial_up"] = 1 if _serial_up() else 0
+    if c.last_rx_time is not None:
+        out["rx_age_ms"] = int((time.monotonic() - c.last_rx_time) * 1000)
+    out["send_queue"] = c.send_queue.qsize()
+    out["dlv_pending"] = c.delivery.pending()
+    out["ack_pending"] = c.master_acks.pending()
+    if 'ir' in c.handlers:
+        out["ir_queue"] = c.handlers['ir'].scheduler.pending()
+    if rules:
+        out["rules_queue"] = rules.pending()
+    return out
+
+
+def _start_flight_recorder():
+    global flight_recorder
+    try:
+        flight_recorder = FlightRecorder(
+            config.FLIGHT_RECORDER_PATH,
+            probe=_flight_probe,
+            interval_sec=config.FLIGHT_RECORDER_INTERVAL_SEC,
+            minutes=config.FLIGHT_RECORDER_MINUTES,
+            sync_sec=config.FLIGHT_RECORDER_SYNC_SEC,
+        )
+        flight_recorder.start()
+    except Exception as e:
+        flight_recorder = None
+        logger.error("Flight recorder not started: %s", e)
 
 
 ONO_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price?ids=onocoy-token&vs_currencies=usd,inr&include_24hr_change=true"
 ONO_PRICE_INTERVAL_SEC = 60   # Fetch from CoinGecko every 60s (rate limit)
-ONO_PUSH_INTERVAL_SEC = 15   # Re-send last price every 15s (displays get packet soon after boot)
 
 def _ono_price_loop():
-    """Fetch ONO price every 60s. Re-push last price every 15s so new boots see data within ~15s."""
-    logger.info("ONO price fetcher started (fetch %ds, push %ds)", ONO_PRICE_INTERVAL_SEC, ONO_PUSH_INTERVAL_SEC)
+    """
+    Fetch ONO price every 60s. Displays only get it when it moved past the
+    thresholds or the safety refresh is due; freshly booted displays ask for it
+    with a hello packet (OledHandler handles that immediately).
+    """
+    logger.info("ONO price fetcher started (fetch %ds, refresh %ds)", ONO_PRICE_INTERVAL_SEC, config.ONO_PRICE_REFRESH_SEC)
     time.sleep(5)  # Wait for controller
-    last_price, last_change = None, 0.0
-    last_fetch = -999.0  # Force first fetch immediately
+    thread_registry.register(expect_sec=ONO_PRICE_INTERVAL_SEC + 10)   # + fetch timeout
     while True:
-        now = time.time()
+        thread_registry.beat()
         if controller and 'ono' in controller.handlers:
-            # Fetch from CoinGecko every 60s
-            if now - last_fetch >= ONO_PRICE_INTERVAL_SEC:
-                try:
-                    r = requests.get(ONO_PRICE_URL, timeout=10)
-                    if r.status_code == 200:
-                        data = r.json()
-                        ono = data.get("onocoy-token")
-                        if ono:
-                            p = ono.get("usd")
-                            c = ono.get("usd_24h_change")
-                            if p is not None:
-                                last_price, last_change = p, (c if c is not None else 0.0)
-                    elif r.status_code == 429:
-                        logger.warning("ONO price API: rate limited (429)")
-                except Exception as e:
-                    logger.debug("ONO price fetch failed: %s", e)
-                last_fetch = now
-            # Send to displays every 15s (fresh or last known price)
-            if last_price is not None:
-                controller.handlers['ono'].send_price(last_price, last_change)
-        time.sleep(ONO_PUSH_INTERVAL_SEC)
+            ono_handler = controller.handlers['ono']
+            price, change = None, None
+            try:
+                # Behind a breaker: a 429 pauses fetching for the server's Retry-After.
+                r = circuit_breaker.request("get", ONO_PRICE_URL, timeout=10, **config.BREAKER_SETTINGS['coingecko'])
+                if r.status_code == 200:
+                    data = r.json()
+                    ono = data.get("onocoy-token")
+                    if ono:
+                        p = ono.get("usd")
+                        c = ono.get("usd_24h_change")
+                        if p is not None:
+                            price, change = p, (c if c is not None else 0.0)
+                elif r.status_code == 429:
+                    logger.warning("ONO price API: rate limited (429), Retry-After=%s",
+                                   r.headers.get("Retry-After"))
+            except circuit_breaker.CircuitOpenError as e:
+                logger.debug("ONO price fetch skipped: %s", e)
+            except Exception as e:
+                logger.debug("ONO price fetch failed: %s", e)
+            # Fresh price, or just the last known one (safety refresh keeps the displays' watchdog fed).
+            ono_handler.update_price(price, change)
+        time.sleep(ONO_PRICE_INTERVAL_SEC)
 
 
 def _hydration_time_push_loop():
     """Push local-epoch time to hydration slave every 5s for 60s after start."""
-    import struct
     time.sleep(2)  # Let serial/controller settle
     duration_sec = 60
     interval_sec = 5
@@ -663,22 +885,54 @@ def _hydration_time_push_loop():
     if mac == '00:00:00:00:00:00':
         return
     start = time.time()
+    thread_registry.register(expect_sec=interval_sec)
     while time.time() - start < duration_sec:
-        if controller and getattr(controller, 'serial_conn', None) and controller.serial_conn.is_open:
+        thread_registry.beat()
+        if controller and controller.serial_up():
             try:
-                time_hex = struct.pack('<I', _local_epoch_now()).hex()
-                controller.send_command(mac, "0131" + time_hex)
+                controller.send_command(mac, codec.hydration_time(_local_epoch_now()))
                 logger.info("Time push to hydration slave (startup sync)")
             except Exception as e:
                 logger.debug("Time push failed: %s", e)
         time.sleep(interval_sec)
+    thread_registry.unregister()
+
+
+def _start_checkpointer():
+    """Warm-restart: restore last controller state, then keep a write-behind checkpoint."""
+    global checkpointer
+    checkpointer = Checkpointer(
+        os.path.join(LOG_DIR, "checkpoint.json"),
+        debounce_sec=config.CHECKPOINT_DEBOUNCE_SEC,
+        min_interval_sec=config.CHECKPOINT_MIN_INTERVAL_SEC,
+    )
+    if 'hydration' in controller.handlers:
+        hydration = controller.handlers['hydration']
+        checkpointer.register("hydration", hydration.snapshot_checkpoint, hydration.restore_checkpoint)
+    checkpointer.register("serial_log", controller.snapshot_log_tail, controller.restore_log_tail)
+    checkpointer.register("shadow", controller.shadow.snapshot_checkpoint, controller.shadow.restore_checkpoint)
+    checkpointer.register("presence", controller.presence.snapshot_checkpoint,
+                          controller.presence.restore_checkpoint)
+    checkpointer.restore()
+    if 'hydration' in controller.handlers:
+        controller.handlers['hydration'].state.subscribe(checkpointer.mark_dirty)
+    checkpointer.start()
+    # Final flush on shutdown (SIGTERM from systemd is turned into SystemExit in __main__).
+    atexit.register(checkpointer.stop)
 
 
 def start_controller():
     global controller
     port = config.SERIAL_PORT
+    thread_registry.grace_sec = config.THREAD_STALL_GRACE_SEC
+    thread_registry.start_monitor(config.THREAD_MONITOR_INTERVAL_SEC)
+    _start_flight_recorder()   # before the controller: also records a serial port that never opens
     try:
         controller = SerialController(port, 115200)
+        try:
+            _start_checkpointer()
+        except Exception as e:
+            logger.error("Checkpoint setup failed (cold start): %s", e)
         controller.start(headless=True)
         logger.info("Controller Background Thread Started")
     except Exception as e:
@@ -692,60 +946,118 @@ def start_controller():
     except Exception as e:
         logger.error("Failed to start Onocoy poller: %s", e)
 
-    threading.Thread(target=_hydration_time_push_loop, daemon=True).start()
-    threading.Thread(target=daily_scheduler, daemon=True).start()
-    threading.Thread(target=_ono_price_loop, daemon=True).start()
-    _write_health_snapshot()  # once at start
-    threading.Thread(target=_health_snapshot_loop, daemon=True).start()
+    threading.Thread(target=_hydration_time_push_loop, name="hydration-time-push", daemon=True).start()
+    _start_scenes()
+    _start_rules_engine()
+    threading.Thread(target=_ono_price_loop, name="ono-price", daemon=True).start()
 
-def send_aio_global(device, action):
-    if device in config.LIGHT_CMDS and action in config.LIGHT_CMDS[device]:
-        val = config.LIGHT_CMDS[device][action]
-        headers = {'X-AIO-Key': config.AIO_KEY, 'Content-Type': 'application/json'}
-        try:
-            requests.post(config.AIO_FEED_URL, headers=headers, json={'value': val}, timeout=5)
-            logger.info(f"Scheduler: {device} turned {action}")
-        except Exception as e:
-            logger.error(f"Scheduler AIO Error: {e}")
+def _serial_up():
+    return bool(controller and controller.serial_up())
 
-def daily_scheduler():
-    logger.info("Daily Scheduler Started")
-    from datetime import datetime
-    while True:
-        now = datetime.now()
-        # Sleep until the start of the next minute to align checks
-        # But simple sleep 60 is fine for now
-
-        # Morning Routine: 10:00 AM
-        if now.hour == 10 and now.minute == 0:
-            logger.info("Scheduler: Checking Morning Routine...")
-            if controller and controller.is_phone_home():
-                logger.info("User Home! Executing Morning Routine.")
-                # LED ON
-                if 'led' in controller.handlers:
-                    controller.handlers['led'].send_cmd("02100000803F", "ON")
-                # IR ON
-                if 'ir' in controller.handlers:
-                    controller.handlers['ir'].send_nec('F7C03F')
-            else:
-                logger.info("User Away. Skipping Morning Routine.")
-            time.sleep(60) # Prevent multiple executions
-
-        # Evening Routine: 5:00 PM (17:00)
-        elif now.hour == 17 and now.minute == 0:
-            logger.info("Scheduler: Checking Evening Routine...")
-            if controller and controller.is_phone_home():
-                logger.info("User Home! Executing Evening Routine.")
-                # Neon & Spot ON
-                threading.Thread(target=send_aio_global, args=('neon', 'on')).start()
-                threading.Thread(target=send_aio_global, args=('spot', 'on')).start()
-            else:
-                logger.info("User Away. Skipping Evening Routine.")
-            time.sleep(60)
 
-        time.sleep(10) # check 
+def _sent_status(sent):
+    """Outcome of a serial send: written, skipped because the device already has it (shadow), or no link."""
+    if sent:
+        return "ok"
+    return "unchanged" if _serial_up() else "failed"
+
+
+def _time_left(ctx, default=2.0):
+    deadline = ctx.get("deadline")
+    return max(0.1, deadline - time.monotonic()) if deadline else default
+
+
+def _aio_post(device, action, timeout=5):
+    """Send a LIGHT_CMDS command to Adafruit IO. Raises on unknown device/action and HTTP errors."""
+    if device not in config.LIGHT_CMDS or action not in config.LIGHT_CMDS[device]:
+        raise ValueError(f"unknown light command {device}/{action}")
+    headers = {'X-AIO-Key': config.AIO_KEY, 'Content-Type': 'application/json'}
+    r = circuit_breaker.request("post", config.AIO_FEED_URL, headers=headers,
+                                json={'value': config.LIGHT_CMDS[device][action]}, timeout=timeout,
+                                **config.BREAKER_SETTINGS['aio'])
+    if r.status_code not in (200, 201):
+        raise RuntimeError(f"AIO HTTP {r.status_code}")
+    logger.info(f"AIO: {device} turned {action}")
+
+
+def _actions():
+    """
+    Step actions for scenes (config.SCENES) and rules (rules.json): fn(step, ctx) -> status.
+    See scenes.SceneRunner for the return convention.
+    """
+    def led(step, ctx):
+        handler = controller.handlers['led']
+        if 'mode' in step:
+            payload, desc = codec.led_mode(step['mode'], step.get('speed', 5)), f"Mode {step['mode']}"
+        else:
+            on = str(step.get("state", "on")).lower() == "on"
+            payload, desc = (codec.LED_ON, "ON") if on else (codec.LED_OFF, "OFF")
+        return _sent_status(handler.send_cmd(payload, desc, force=step.get("force", False)))
+
+    def ir(step, ctx):
+        job = controller.handlers['ir'].send_nec(step["code"], force=step.get("force", False))
+        if job is None:
+            raise ValueError(f"IR code {step['code']} not sent")
+        # The burst is spaced by the IR scheduler; wait for its last frame (within the deadline).
+        if not job.wait(_time_left(ctx)):
+            return "timeout"
+        return {"done": "ok", "skipped": "unchanged"}.get(job.status, job.status)
+
+    def aio(step, ctx):
+        _aio_post(step["device"], step.get("state", "on"), timeout=min(5, _time_left(ctx, 5)))
+
+    def ono(step, ctx):
+        handler = controller.handlers['ono']
+        force = step.get("force", False)
+        if "text" in step:
+            sent = handler.send_text(str(step["text"]).format(**ctx), step.get("duration", 5), force=force)
+        elif "color" in step:
+            r, g, b = step["color"]
+            sent = handler.send_color(r, g, b, step.get("duration", 10), force=force)
+        else:
+            sent = handler.send_rainbow(step.get("rainbow", step.get("duration", 10)), force=force)
+        return _sent_status(sent)
+
+    def servo_spray(step, ctx):
+        from servo_spray import run_sequence
+        return bool(run_sequence(step.get("base_url")).get("ok"))
+
+    return {"led": led, "ir": ir, "aio": aio, "ono": ono, "servo_spray": servo_spray}
+
+
+def _start_scenes():
+    global scenes
+    scenes = SceneRunner(config.SCENES, _actions(), default_deadline_sec=config.SCENE_DEFAULT_DEADLINE_SEC)
+
+
+def _start_rules_engine():
+    global rules
+    actions = _actions()
+    # Rules can run whole scenes: {"do": "scene", "name": "morning"}. Failed steps become the rule's last_error.
+    def scene(step, event):
+        report = scenes.run(step["name"], context=event)
+        failed = [f"{sid}={r['status']}" for sid, r in report["steps"].items() if r["status"] not in OK_STATUSES]
+        return f"scene {step['name']} failed: {', '.join(failed)}" if failed else "ok"
+
+    actions["scene"] = scene
+    rules = RulesEngine(
+        config.RULES_PATH,
+        actions=actions,
+        presence=lambda: controller.is_phone_home(),
+        reload_check_sec=config.RULES_RELOAD_CHECK_SEC,
+    )
+    controller.event_sink = rules.publish
+    rules.start()
+
+
+def _exit_on_sigterm(signum, frame):
+    """systemctl stop / restart: exit normally so atexit hooks (final checkpoint) run."""
+    logger.info("SIGTERM received, shutting down")
+    sys.exit(0)
+
 
 if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
     start_controller()
     # If controller failed to start, app still runs; /api/health and /api/data will report not ready
-    app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
+    app.run(host='0.0.0.0', port=config.WEB_PORT, debug=False, use_reloader=False)
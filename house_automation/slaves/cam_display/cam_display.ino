@@ -2,7 +2,8 @@
  * CAM Display - ESP32-CAM + 0.91" I2C OLED + RGB LED
  *
  * Same protocol as oled_test: Pi sends price (0x70), text (0x60), rainbow (0x50), color (0x51).
- * Pi health: no packet for 90s -> "PI down" + rainbow.
+ * Pi health: no packet for NO_DATA_MS -> "PI down" + rainbow.
+ * On boot: sends a hello (03 01) to the master so the Pi pushes the price at once.
  *
  * Board: ESP32-CAM (AI-Thinker) or ESP32 Dev Module (if PSRAM boot loop)
  *
@@ -36,9 +37,10 @@
 #define CHANGE_DISPLAY_MS 1000
 #define RGB_DIM_LEVEL     20
 #define RGB_RAINBOW_LEVEL 25   // Dim rainbow to save power
-#define NO_DATA_MS        90000
+#define NO_DATA_MS        420000  // No packet from Pi this long -> PI down (Pi refreshes price every 150 s)
 #define MAX_TEXT_LEN      81
 #define SCROLL_SPEED_MS   120
+#define HELLO_RETRY_MS    30000   // Re-send hello until the first price arrives
 
 Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, OLED_RESET);
 
@@ -103,6 +105,17 @@ void OnEspNowRecv(const esp_now_recv_info_t* info, const uint8_t* data, int len)
   }
 }
 
+// Master gateway MAC (same as hydration slave Config.h). Hello tells the Pi we (re)booted,
+// so it pushes the price right away instead of us waiting for the next change.
+uint8_t masterMAC[] = {0xF0, 0x24, 0xF9, 0x0D, 0x90, 0xA4};
+unsigned long lastHelloAt = 0;
+
+void sendHello() {
+  uint8_t pkt[6] = {3, 0x01, 0, 0, 0, 0};   // Type 3, Cmd 0x01 (hello), float 0
+  esp_now_send(masterMAC, pkt, sizeof(pkt));
+  lastHelloAt = millis();
+}
+
 void setup() {
   Serial.begin(115200);
   delay(500);
@@ -132,7 +145,15 @@ void setup() {
     Serial.println("ESP-NOW init failed");
   } else {
     esp_now_register_recv_cb(OnEspNowRecv);
+    esp_now_peer_info_t peerInfo = {};
+    memcpy(peerInfo.peer_addr, masterMAC, 6);
+    peerInfo.channel = 0;
+    peerInfo.encrypt = false;
+    if (esp_now_add_peer(&peerInfo) != ESP_OK) {
+      Serial.println("Failed to add master peer");
+    }
     Serial.println("ESP-NOW ready");
+    sendHello();
   }
 
   Serial.print("MAC: ");
@@ -260,6 +281,10 @@ void showPiText(const char* txt) {
 }
 
 void loop() {
+  if (!dataValid && millis() - lastHelloAt >= HELLO_RETRY_MS) {
+    sendHello();
+  }
+
   if (overrideUntil > millis()) {
     if (overrideTextMode) {
       rgbOff();